@@ -0,0 +1,246 @@
+"""
+Address Autocomplete Index for Beacon
+
+Prefix search over normalized property addresses and zip codes, used by
+property_api.py's autocomplete endpoint. Addresses are normalized so that
+abbreviated and spelled-out forms ("W 12th St", "West 12 Street") share a
+key, and each property is indexed under its full address, its street
+without the house number, and its five-digit zip. Keys live in one sorted
+array, so every prefix is a contiguous slice found with a binary search.
+The sorted keys are saved in the columnar snapshot and memory-mapped, so
+only the first build normalizes every address.
+"""
+
+import re
+import numpy as np
+
+# Abbreviations expanded during normalization
+ABBREVIATIONS = {
+    'n': 'north', 's': 'south', 'e': 'east', 'w': 'west',
+    'st': 'street', 'ave': 'avenue', 'av': 'avenue', 'blvd': 'boulevard',
+    'pl': 'place', 'rd': 'road', 'dr': 'drive', 'ct': 'court', 'ln': 'lane',
+    'pkwy': 'parkway', 'ter': 'terrace', 'sq': 'square', 'hwy': 'highway',
+    'plz': 'plaza', 'cir': 'circle', 'expy': 'expressway', 'bch': 'beach',
+    'ft': 'fort', 'mt': 'mount', 'hts': 'heights', 'pk': 'park'
+}
+
+# Spelled-out forms as they are abbreviated in the source data
+CONTRACTIONS = {
+    'north': 'N', 'south': 'S', 'east': 'E', 'west': 'W', 'street': 'St', 'avenue': 'Ave',
+    'boulevard': 'Blvd', 'place': 'Pl', 'road': 'Rd', 'drive': 'Dr', 'court': 'Ct',
+    'lane': 'Ln', 'parkway': 'Pkwy', 'terrace': 'Ter', 'square': 'Sq', 'heights': 'Hts'
+}
+
+ORDINAL = re.compile(r'^(\d+)(st|nd|rd|th)$')
+# A partly typed ordinal suffix at the end of a query ("12t")
+PARTIAL_ORDINAL = re.compile(r'^(\d+)(s|n|r|t)$')
+NON_WORD = re.compile(r'[^a-z0-9]+')
+
+# Arrays saved with a columnar snapshot, in AddressIndex constructor order
+SAVED_ARRAYS = ('address_keys', 'address_rows', 'address_positions')
+
+# Matches spanning at least this many keys are found by walking properties
+# in rank order instead of ranking every match
+WALK_THRESHOLD = 4096
+
+
+def tokenize(text):
+    """Lower-case words of an address, punctuation dropped"""
+    return NON_WORD.sub(' ', str(text).lower()).split()
+
+
+def normalize_tokens(tokens, expand_last=True):
+    """
+    Canonical form of address tokens.
+
+    Ordinal suffixes are dropped ("12th" -> "12") and abbreviations expanded.
+    "st" before a street name means Saint ("St Marks Pl"), anywhere else Street.
+    With expand_last false the final token is kept as typed, since it may be
+    an unfinished word ("s" on the way to "street").
+    """
+    normalized = []
+    for position, token in enumerate(tokens):
+        last = position == len(tokens) - 1
+        match = ORDINAL.match(token)
+        if match:
+            token = match.group(1)
+        elif last and not expand_last:
+            partial = PARTIAL_ORDINAL.match(token)
+            token = partial.group(1) if partial else token
+        elif token == 'st' and not last and tokens[position + 1].isalpha() and tokens[position + 1] not in ABBREVIATIONS:
+            token = 'saint'
+        else:
+            token = ABBREVIATIONS.get(token, token)
+        normalized.append(token)
+    return ' '.join(normalized)
+
+
+def normalize_address(text):
+    """Canonical form of a complete address"""
+    return normalize_tokens(tokenize(text))
+
+
+def contract_address(text):
+    """Rewrite spelled-out words in the abbreviated style of the source data"""
+    words = str(text).split()
+    return ' '.join(CONTRACTIONS.get(word.lower(), word) for word in words)
+
+
+class AddressIndex:
+    """Sorted-prefix index over the addresses and zip codes of a PropertyStore"""
+
+    # Key slots per property: full address, street without house number, zip
+    SLOTS = 3
+
+    def __init__(self, store, keys=None, rows=None, positions=None):
+        self.store = store
+        if keys is None:
+            keys, rows, positions = self._build()
+        self.keys = keys
+        self.rows = rows
+        self.positions = positions
+
+        self.rank_order = self._rank_order()
+        self.value_rank = np.empty(store.size, dtype=np.intp)
+        self.value_rank[self.rank_order] = np.arange(store.size)
+        self.borough_orders = {}
+        if 'borough' in store.codes:
+            codes = store.codes['borough'][self.rank_order]
+            for code in range(len(store.dictionaries['borough'])):
+                self.borough_orders[code] = self.rank_order[codes == code]
+
+    @classmethod
+    def load(cls, store):
+        """The index saved with a snapshot-loaded store, or a new one built from it"""
+        if all(name in store.extras for name in SAVED_ARRAYS):
+            return cls(store, *(store.extras[name] for name in SAVED_ARRAYS))
+        return cls(store)
+
+    def arrays(self):
+        """Arrays that save the index with a columnar snapshot (see PropertyStore.save)"""
+        return dict(zip(SAVED_ARRAYS, (self.keys, self.rows, self.positions)))
+
+    def _build(self):
+        """Sorted keys, their rows, and each row's key positions by slot"""
+        store = self.store
+        keys = []
+        rows = []
+        slots = []
+        addresses = store.objects.get('property_address')
+        zips = store.objects.get('property_zip')
+
+        for row in range(store.size):
+            if addresses is not None and addresses[row]:
+                full = normalize_address(addresses[row])
+                keys.append(full)
+                rows.append(row)
+                slots.append(0)
+                # Street without the house number, so "west 84" finds "35 W 84th St"
+                number, _, street = full.partition(' ')
+                if street and any(c.isdigit() for c in number):
+                    keys.append(street)
+                    rows.append(row)
+                    slots.append(1)
+            if zips is not None and zips[row]:
+                keys.append(str(zips[row])[:5])
+                rows.append(row)
+                slots.append(2)
+
+        keys = np.array(keys, dtype=str)
+        order = np.argsort(keys, kind='stable')
+        rows = np.asarray(rows, dtype=np.intp)[order]
+
+        # Where each property's keys sit in the sorted array (-1 if absent)
+        positions = np.full((store.size, self.SLOTS), -1, dtype=np.intp)
+        positions[rows, np.asarray(slots, dtype=np.intp)[order]] = np.arange(len(keys))
+        return keys[order], rows, positions
+
+    def __len__(self):
+        return len(self.keys)
+
+    def _rank_order(self):
+        """Rows ordered by estimated value, highest first, missing values last"""
+        if 'estimated_value' not in self.store.numeric:
+            return np.arange(self.store.size)
+        values = self.store.numeric['estimated_value']
+        return np.lexsort((np.arange(self.store.size), -values, self.store.nulls['estimated_value']))
+
+    def prefix_range(self, prefix):
+        """(start, end) of the keys starting with prefix"""
+        start = np.searchsorted(self.keys, prefix, side='left')
+        end = np.searchsorted(self.keys, prefix + '\U0010ffff', side='right')
+        return int(start), int(end)
+
+    def matches(self, rows, ranges):
+        """Mask of the rows with a key inside any of the (start, end) ranges"""
+        positions = self.positions[rows]
+        mask = np.zeros(len(rows), dtype=bool)
+        for start, end in ranges:
+            mask |= ((positions >= start) & (positions < end)).any(axis=1)
+        return mask
+
+    def search(self, query, limit=10, borough=None):
+        """
+        Rows whose address or zip starts with query, best first.
+
+        Properties in borough (when given) rank first, then higher estimated
+        values. The query's last word is matched both expanded and as typed,
+        so "W 12th S" finds "W 12th St".
+        """
+        tokens = tokenize(query)
+        if not tokens or limit <= 0:
+            return np.empty(0, dtype=np.intp)
+
+        prefixes = {normalize_tokens(tokens), normalize_tokens(tokens, expand_last=False)}
+        ranges = [self.prefix_range(prefix) for prefix in prefixes]
+        code = None
+        if borough and 'borough' in self.store.codes:
+            dictionary = self.store.dictionaries['borough']
+            code = dictionary.index(borough) if borough in dictionary else -1
+
+        matched = sum(end - start for start, end in ranges)
+        if matched >= WALK_THRESHOLD:
+            found = self._walk(ranges, limit, code, budget=matched)
+            if found is not None:
+                return found
+
+        candidates = np.concatenate([self.rows[start:end] for start, end in ranges])
+        score = self.value_rank[candidates]
+        if code is not None:
+            score = score + (self.store.codes['borough'][candidates] != code) * self.store.size
+        # A property can match through several keys; keep enough for the duplicates
+        keep = limit * self.SLOTS * len(ranges)
+        if len(candidates) > keep:
+            top = np.argpartition(score, keep - 1)[:keep]
+            candidates, score = candidates[top], score[top]
+        candidates = candidates[np.argsort(score, kind='stable')]
+        _, first = np.unique(candidates, return_index=True)
+        return candidates[np.sort(first)][:limit]
+
+    def _walk(self, ranges, limit, code, budget):
+        """
+        Top matches for a broad prefix: scan properties in rank order, in
+        growing chunks, until limit of them match. A prefix matching a large
+        share of keys fills the limit within the first chunk or two; when the
+        matches cluster at the bottom of the ranking, the walk gives up after
+        budget rows and returns None so the caller ranks the matches directly.
+        """
+        passes = [(self.rank_order, None)]
+        if code is not None:
+            passes = [(self.borough_orders.get(code, self.rank_order[:0]), None), (self.rank_order, code)]
+
+        found = []
+        for order, skip_code in passes:
+            start, chunk = 0, max(64, limit * 8)
+            while start < len(order) and len(found) < limit:
+                if budget <= 0:
+                    return None
+                rows = order[start:start + chunk]
+                budget -= len(rows)
+                mask = self.matches(rows, ranges)
+                if skip_code is not None:
+                    mask &= self.store.codes['borough'][rows] != skip_code
+                found.extend(rows[mask][:limit - len(found)].tolist())
+                start += chunk
+                chunk *= 4
+        return np.asarray(found, dtype=np.intp)
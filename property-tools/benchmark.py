@@ -0,0 +1,320 @@
+"""
+Benchmarks for Beacon's Property API
+
+Replays filter, sort, property detail and natural-language (MCP)
+workloads against property_api.py's local-data endpoints over synthetic
+datasets (see synthetic_data.py) of several sizes, and reports
+throughput, latency percentiles, startup time and peak memory as JSON
+so runs before and after a change can be compared.
+
+Each dataset size runs in its own process, so peak RSS is per size. The
+dataset is saved as a columnar snapshot with its indexes, as
+clean_re_data.py does, and loaded with property_api.build_snapshot(), as
+it is when serving; startup_seconds is the time that takes. Requests go through the Flask test client, which covers
+parameter parsing, the query engine, similarity lookups and
+serialization without network noise. The query result cache is off
+unless --cache is given, so every request does the work.
+
+    python benchmark.py                                  # 10k, 100k, 1M and 5M rows
+    python benchmark.py --rows 10000,100000 --requests 500 --output before.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlencode
+import numpy as np
+
+DEFAULT_ROWS = [10000, 100000, 1000000, 5000000]
+DEFAULT_REQUESTS = 1000
+WARMUP_REQUESTS = 50
+
+# Share of each workload in the mixed replay
+WORKLOAD_MIX = {'filter': 0.4, 'sort': 0.2, 'detail': 0.3, 'mcp': 0.1}
+
+# The precomputed similar-properties table is built up to this size; larger
+# datasets answer detail requests from the nearest-neighbour index alone
+SIMILAR_TABLE_MAX_ROWS = 100000
+
+SORT_COLUMNS = ['estimated_value', 'year_built', 'total_building_area_square_feet', 'bedroom_count',
+                'property_address']
+PRICE_STEPS = [500000, 750000, 1000000, 1500000, 2000000, 3000000, 5000000, 10000000]
+
+# Natural-language query templates for the MCP workload
+MCP_QUERIES = [
+    "{beds} bedroom {kind} in {area} under {price}",
+    "{kind} in {area} around {price}",
+    "show me {area} properties with at least {baths} bathrooms",
+    "prewar {kind} in {area}",
+    "{beds} bed {baths} bath between {low} and {price}",
+    "looking for a {kind} under {price} in {borough}"
+]
+MCP_KINDS = ['condo', 'co-op', 'townhouse', 'duplex', 'apartment building', 'triplex']
+MCP_AREAS = ['upper west side', 'park slope', 'bushwick', 'harlem', 'chelsea', 'williamsburg', 'ridgewood',
+             'tribeca', 'manhattan', 'brooklyn']
+MCP_PRICES = ['800k', '1.2 million', '2m', '$3,500,000', '5 million']
+
+
+def log(message):
+    """Progress output; stdout is reserved for the JSON result"""
+    print(message, file=sys.stderr, flush=True)
+
+
+def current_rss_mb():
+    """Resident set size of this process right now, in MB (None where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process, in MB"""
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(latencies, seconds):
+    """Throughput and latency percentiles, in requests per second and milliseconds"""
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "seconds": round(seconds, 3),
+        "throughput_rps": round(len(latencies) / seconds, 1) if seconds else None,
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3)
+    }
+
+
+# Workloads: lists of (method, url, json body)
+def filter_requests(store, count, rng):
+    """Searches combining borough, price, bedroom, zip and type filters"""
+    boroughs = store.dictionaries.get('borough', [])
+    types = store.dictionaries.get('property_type_detail', [])
+    requests = []
+    for _ in range(count):
+        args = [('limit', rng.choice([10, 20, 50]))]
+        if rng.random() < 0.6:
+            args.append(('borough', rng.choice(boroughs)))
+        if rng.random() < 0.6:
+            low = rng.choice(PRICE_STEPS[:-2])
+            args.append(('min_price', low))
+            if rng.random() < 0.5:
+                args.append(('max_price', rng.choice([p for p in PRICE_STEPS if p > low])))
+        if rng.random() < 0.3:
+            args.append(('min_bedrooms', rng.choice([1, 2, 3, 4])))
+        if rng.random() < 0.2 and store.zip_dictionary:
+            args.append(('zip_code', rng.choice(store.zip_dictionary)))
+        if rng.random() < 0.2 and types:
+            args.append(('property_type', rng.choice(types)))
+        if rng.random() < 0.1:
+            args.append(('facets', 'all'))
+        requests.append(('GET', '/api/properties?' + urlencode(args), None))
+    return requests
+
+
+def sort_requests(store, count, rng):
+    """Sorted listings, a third of them fetching the second page with a cursor"""
+    from property_api import encode_cursor
+    requests = []
+    for _ in range(count):
+        sort_by = rng.choice(SORT_COLUMNS)
+        direction = rng.choice(['asc', 'desc'])
+        args = [('sort_by', sort_by), ('sort_direction', direction), ('limit', 20)]
+        params = {'sort_by': sort_by, 'sort_direction': direction, 'limit': 20}
+        if rng.random() < 0.3:
+            borough = rng.choice(store.dictionaries.get('borough', ['']))
+            args.append(('borough', borough))
+            params['borough'] = [borough]
+        if rng.random() < 0.33:
+            page = store.query(params)
+            if len(page) == 20:
+                last = page[-1]
+                args.append(('cursor', encode_cursor(sort_by, direction, last.get(sort_by), last.get('property_id'))))
+        requests.append(('GET', '/api/properties?' + urlencode(args), None))
+    return requests
+
+
+def detail_requests(store, count, rng):
+    """Single-property lookups with similar properties"""
+    return [('GET', f"/api/properties/{rng.randint(1, store.size)}", None) for _ in range(count)]
+
+
+def mcp_requests(store, count, rng):
+    """Natural-language queries through the rule-based parser"""
+    requests = []
+    for _ in range(count):
+        query = rng.choice(MCP_QUERIES).format(
+            beds=rng.randint(1, 5), baths=rng.randint(1, 3), kind=rng.choice(MCP_KINDS),
+            area=rng.choice(MCP_AREAS), price=rng.choice(MCP_PRICES), low='500k',
+            borough=rng.choice(['manhattan', 'brooklyn']))
+        requests.append(('POST', '/api/mcp/property-query', {'query': query}))
+    return requests
+
+
+WORKLOADS = {
+    'filter': filter_requests,
+    'sort': sort_requests,
+    'detail': detail_requests,
+    'mcp': mcp_requests
+}
+
+
+def replay(client, requests):
+    """Send requests in order; returns (per-request latencies in seconds, total seconds)"""
+    latencies = []
+    started = time.perf_counter()
+    for method, url, body in requests:
+        request_started = time.perf_counter()
+        response = client.open(url, method=method, json=body)
+        response.get_data()
+        latencies.append(time.perf_counter() - request_started)
+        if response.status_code >= 500:
+            raise RuntimeError(f"{method} {url} failed with {response.status_code}")
+    return latencies, time.perf_counter() - started
+
+
+def generate_snapshot(rows, seed, path):
+    """
+    Generate a dataset and save it as a columnar snapshot with its indexes;
+    returns (generate, index and save) seconds
+    """
+    from property_store import PropertyStore
+    from synthetic_data import generate_properties
+    from snapshot import save_local_snapshot
+
+    started = time.perf_counter()
+    store = PropertyStore.from_columns(generate_properties(rows, seed))
+    generated = time.perf_counter() - started
+    started = time.perf_counter()
+    save_local_snapshot(store, path, build_table=rows <= SIMILAR_TABLE_MAX_ROWS)
+    return generated, time.perf_counter() - started
+
+
+def run_size(rows, requests, seed, cache):
+    """Generate a dataset of rows properties, load it like the server does and replay every workload"""
+    result = {"rows": rows}
+    workdir = tempfile.mkdtemp(prefix='beacon-benchmark-')
+    os.environ['USE_LOCAL_DATA'] = 'true'
+    os.environ['LOCAL_DATA_DIR'] = workdir
+    os.environ['SNAPSHOT_POLL_SECONDS'] = '0'
+    if not cache:
+        os.environ['QUERY_CACHE_SIZE'] = '0'
+    import property_api
+
+    try:
+        # Generate in a separate process so its garbage doesn't count towards this one's RSS
+        log(f"[{rows}] generating data")
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            generated, saved = pool.submit(generate_snapshot, rows, seed, property_api.LOCAL_COLUMNS_DIR).result()
+        result["generate_seconds"] = round(generated, 3)
+        result["save_seconds"] = round(saved, 3)
+        result["similar_table"] = rows <= SIMILAR_TABLE_MAX_ROWS
+
+        # The server's startup path: build_snapshot() times itself
+        log(f"[{rows}] starting up")
+        current = property_api.reload_local_data(strict=True)
+        store = current.store
+        result["startup_seconds"] = round(current.load_seconds, 3)
+        rss = current_rss_mb()
+        result["rss_after_startup_mb"] = round(rss, 1) if rss is not None else None
+
+        client = property_api.app.test_client()
+        rng = random.Random(seed)
+        planned = {name: build(store, requests, rng) for name, build in WORKLOADS.items()}
+        mixed = [request for name, share in WORKLOAD_MIX.items()
+                 for request in rng.sample(planned[name], int(requests * share))]
+        rng.shuffle(mixed)
+        planned['mixed'] = mixed
+
+        replay(client, rng.sample(mixed, min(WARMUP_REQUESTS, len(mixed))))
+        result["workloads"] = {}
+        for name, workload in planned.items():
+            log(f"[{rows}] replaying {name} ({len(workload)} requests)")
+            result["workloads"][name] = summarize(*replay(client, workload))
+        result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        log(f"[{rows}] startup {result['startup_seconds']}s, peak RSS {result['peak_rss_mb']} MB")
+        return result
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def git_commit():
+    """Current commit of the repository, if any"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark property_api.py on synthetic datasets")
+    parser.add_argument('--rows', default=','.join(str(r) for r in DEFAULT_ROWS),
+                        help="comma-separated dataset sizes")
+    parser.add_argument('--requests', type=int, default=DEFAULT_REQUESTS, help="requests per workload")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--cache', action='store_true', help="keep the query result cache on")
+    parser.add_argument('--output', help="write results here instead of stdout")
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child process: one dataset size, result as JSON on stdout
+    if args.single:
+        print(json.dumps(run_size(args.single, args.requests, args.seed, args.cache)))
+        return
+
+    results = []
+    for rows in [int(r) for r in args.rows.split(',')]:
+        command = [sys.executable, os.path.abspath(__file__), '--single', str(rows),
+                   '--requests', str(args.requests), '--seed', str(args.seed)]
+        if args.cache:
+            command.append('--cache')
+        completed = subprocess.run(command, stdout=subprocess.PIPE, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        if completed.returncode != 0:
+            log(f"[{rows}] benchmark failed with exit code {completed.returncode}")
+            results.append({"rows": rows, "error": f"exit code {completed.returncode}"})
+            continue
+        results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "requests_per_workload": args.requests,
+            "seed": args.seed,
+            "cache": args.cache
+        },
+        "results": results
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+        log(f"Results written to {args.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,6 +2,8 @@ import pandas as pd
 import numpy as np
 import json
 import os
+from snapshot import save_local_snapshot
+from property_store import PropertyStore
 
 # Create output directory if it doesn't exist
 os.makedirs('cleaned_data', exist_ok=True)
@@ -107,6 +109,16 @@ brooklyn_cleaned.to_json('cleaned_data/brooklyn_properties.json', orient='record
 all_properties.to_csv('cleaned_data/all_properties.csv', index=False)
 all_properties.to_json('cleaned_data/all_properties.json', orient='records')
 
+# Built from the exported JSON exactly as the API reads it
+with open('cleaned_data/all_properties.json', 'r') as f:
+    store = PropertyStore.from_records(json.load(f))
+
+# Columnar copy that property_api.py memory-maps at startup instead of parsing the JSON,
+# saved with the address index and similar-property lists (only changed neighbourhoods
+# of the previous snapshot's lists are recomputed)
+print("Writing columnar snapshot and similar-properties table...")
+save_local_snapshot(store, 'cleaned_data/all_properties.columns')
+
 # Print summary statistics
 print("\nData Cleaning Complete!")
 print(f"Manhattan properties: {len(manhattan_cleaned)}")
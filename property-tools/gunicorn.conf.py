@@ -0,0 +1,58 @@
+"""
+Gunicorn Settings for Beacon's Property API
+
+Preforking multi-process serving for property_api.py; see wsgi.py.
+Every setting can be overridden from the environment.
+"""
+
+import os
+import signal
+import multiprocessing
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# One process per core; threads within a worker overlap Supabase round trips
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Load the dataset once in the master; workers inherit it when they fork
+preload_app = True
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+# Recycle workers now and then to bound any slow memory growth
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+
+def when_ready(server):
+    """
+    Watch the local data from the master. The watcher thread only sends
+    SIGHUP when the data changes; the reload happens in on_reload.
+    """
+    import property_api
+    property_api.start_snapshot_watcher(changed=lambda: os.kill(server.pid, signal.SIGHUP))
+
+
+def on_reload(server):
+    """
+    Load changed data on SIGHUP, on the master's main thread and before
+    gunicorn forks fresh workers, which inherit the new snapshot while the
+    old workers shut down gracefully.
+    """
+    import gc
+    import property_api
+    try:
+        if property_api.reload_shared_data():
+            # Keep the new snapshot's objects out of collections, as wsgi.py does at startup
+            gc.freeze()
+    except Exception as e:
+        print(f"Error reloading local data, workers keep the current snapshot: {e}")
+
+
+def post_fork(server, worker):
+    """Start this worker's profiler; the master's threads don't survive the fork"""
+    from utils.profiling import start_continuous_profiler
+    start_continuous_profiler()
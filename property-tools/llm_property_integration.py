@@ -40,6 +40,18 @@ def get_property_by_id(property_id):
         print(response.text)
         return None
 
+def get_properties_by_ids(property_ids, similar=3):
+    """Get several properties, each with up to `similar` similar properties, in one request"""
+    url = f"{API_BASE_URL}/api/properties/batch"
+    response = requests.post(url, json={"property_ids": property_ids, "similar": similar})
+    
+    if response.status_code == 200:
+        return response.json()
+    else:
+        print(f"Error getting properties: {response.status_code}")
+        print(response.text)
+        return None
+
 def process_nl_query(query):
     """Process a natural language query"""
     url = f"{API_BASE_URL}/api/mcp/property-query"
@@ -135,14 +147,19 @@ def handle_property_conversation():
                     "conversation_memory": nl_response.get("conversation_memory", {})
                 }
         elif "details" in user_input.lower() and mcp_data and "properties" in mcp_data.get("property_context", {}):
-            # User wants details about a specific property
+            # User wants details about the properties in the current results
             properties = mcp_data["property_context"]["properties"]
             if properties and len(properties) > 0:
-                # Get details for the first property
-                property_id = properties[0]["property_id"]
-                property_detail = get_property_by_id(property_id)
-                if property_detail:
-                    mcp_data = property_detail
+                # Get details and similar properties for all of them in one request
+                property_ids = [p["property_id"] for p in properties]
+                property_details = get_properties_by_ids(property_ids)
+                if property_details:
+                    mcp_data = {
+                        "property_context": {
+                            "properties": property_details.get("properties", []),
+                            "similar_properties": property_details.get("similar_properties", {})
+                        }
+                    }
         
         # Add the user message to conversation history
         conversation_history.append({"role": "user", "content": user_input})
@@ -1,10 +1,28 @@
 import os
+import sys
 import json
-from flask import Flask, request, jsonify
+import base64
+from flask import Flask, request, jsonify, Response, stream_with_context
 from dotenv import load_dotenv
 from supabase import create_client
 import random
+import threading
+import time
 from datetime import datetime
+from functools import wraps
+from concurrent.futures import ThreadPoolExecutor
+from property_store import PropertyStore, GROUP_COLUMNS, FACETS, BEDROOM_BUCKETS, as_list
+from similarity import load_similarity
+from address_index import AddressIndex, contract_address
+from query_cache import QueryCache, canonical_params
+from query_parser import parse_property_query, parse_cache_info
+from snapshot import PropertySnapshot, SnapshotWatcher, file_signature, timed, load_previous_store, save_local_snapshot
+
+# Add parent directory to path so we can import from the project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.metrics import instrument_app, register_cache, stage, observe_stage
+from utils.profiling import instrument_profiling, start_continuous_profiler
+from utils.auth import token_matches
 
 # Load environment variables
 load_dotenv()
@@ -12,13 +30,41 @@ load_dotenv()
 # Initialize Flask app
 app = Flask(__name__)
 
+# Per-route and per-stage latency histograms, served at /metrics
+instrument_app(app, 'property_api')
+# Per-request profiles for requests sent with X-Profile, listed at /api/admin/profiles
+instrument_profiling(app)
+
 # Create Supabase client
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
 # If Supabase credentials are not set, we'll use local JSON file as a fallback
 USE_LOCAL_DATA = not (SUPABASE_URL and SUPABASE_KEY) or os.getenv('USE_LOCAL_DATA', 'false').lower() == 'true'
-LOCAL_DATA_FILE = 'cleaned_data/all_properties.json'
+# Directory of the cleaned data; benchmark.py points it at generated data
+LOCAL_DATA_DIR = os.getenv('LOCAL_DATA_DIR', 'cleaned_data')
+LOCAL_DATA_FILE = os.path.join(LOCAL_DATA_DIR, 'all_properties.json')
+# Columnar snapshot written by clean_re_data.py; memory-mapped instead of parsing the JSON when current
+LOCAL_COLUMNS_DIR = os.path.join(LOCAL_DATA_DIR, 'all_properties.columns')
+LOCAL_COLUMNS_MANIFEST = os.path.join(LOCAL_COLUMNS_DIR, 'manifest.json')
+
+# Seconds between checks of the local data for a new snapshot (0 disables hot reload)
+SNAPSHOT_POLL_SECONDS = float(os.getenv('SNAPSHOT_POLL_SECONDS', '5'))
+
+# Rows fetched per page when streaming large result sets
+STREAM_BATCH_SIZE = int(os.getenv('STREAM_BATCH_SIZE', '1000'))
+
+# Token the /api/admin endpoints require in X-Admin-Token; unset disables them
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+
+# Query result cache settings
+QUERY_CACHE_SIZE = int(os.getenv('QUERY_CACHE_SIZE', '1024'))
+QUERY_CACHE_TTL = float(os.getenv('QUERY_CACHE_TTL', '300'))
+
+def execute(query):
+    """Execute a Supabase request, timing the round trip"""
+    with stage('supabase'):
+        return query.execute()
 
 def get_supabase_client():
     """Get Supabase client if credentials are available"""
@@ -30,18 +76,134 @@ def get_supabase_client():
             return None
     return None
 
+# One long-lived client is shared by all requests so its HTTP connections stay alive
 supabase = get_supabase_client()
 
-def load_local_data():
-    """Load property data from local JSON file"""
+# Thread pool for issuing independent Supabase round trips concurrently
+SUPABASE_MAX_CONCURRENCY = int(os.getenv('SUPABASE_MAX_CONCURRENCY', '8'))
+supabase_executor = ThreadPoolExecutor(max_workers=SUPABASE_MAX_CONCURRENCY) if supabase else None
+
+def load_local_data(strict=False):
+    """Load property data from local JSON file; with strict, errors are raised instead of returning no data"""
     try:
         with open(LOCAL_DATA_FILE, 'r') as f:
             return json.load(f)
     except Exception as e:
+        if strict:
+            raise
         print(f"Error loading local data: {e}")
         return []
 
-local_properties = load_local_data() if USE_LOCAL_DATA else None
+def local_data_source():
+    """
+    (path, signature) of the local data to load: the columnar snapshot when
+    it is at least as new as the JSON file, otherwise the JSON file
+    """
+    columns = file_signature(LOCAL_COLUMNS_MANIFEST)
+    data = file_signature(LOCAL_DATA_FILE)
+    if columns and (not data or columns[0] >= data[0]):
+        return LOCAL_COLUMNS_DIR, columns
+    return LOCAL_DATA_FILE, data
+
+def load_local_store(source, strict=False):
+    """Memory-map the columnar snapshot, or build the store from the JSON file"""
+    if source == LOCAL_COLUMNS_DIR:
+        try:
+            return PropertyStore.load(LOCAL_COLUMNS_DIR)
+        except Exception as e:
+            if strict:
+                raise
+            print(f"Error loading columnar snapshot, falling back to JSON: {e}")
+    return PropertyStore.from_records(load_local_data(strict))
+
+def build_snapshot(version, strict=False):
+    """
+    Load the local data with its indexes and similar properties. A columnar
+    snapshot saved with them maps them; from the JSON file they are built,
+    refreshing the similar-properties table of the older columnar snapshot.
+    """
+    source, signature = local_data_source()
+    
+    def load():
+        store = load_local_store(source, strict)
+        previous = load_previous_store(LOCAL_COLUMNS_DIR) if source == LOCAL_DATA_FILE else None
+        similarity_index, similar_table = load_similarity(store, previous)
+        return store, similarity_index, similar_table, AddressIndex.load(store)
+    
+    (store, similarity_index, similar_table, address_index), seconds = timed(load)
+    return PropertySnapshot(version, source, signature, store, similarity_index, similar_table,
+                            address_index, seconds)
+
+query_cache = QueryCache(QUERY_CACHE_SIZE, QUERY_CACHE_TTL)
+register_cache('query', lambda: (query_cache.hits, query_cache.misses))
+register_cache('parser', lambda: tuple(parse_cache_info()[k] for k in ('hits', 'misses')))
+
+# Current local snapshot; requests read it once and use that version throughout
+snapshot = None
+snapshot_lock = threading.Lock()
+snapshot_watcher = None
+# Signatures of the data files as they were when the current snapshot was loaded
+loaded_signatures = None
+register_cache('fragments', lambda: (snapshot.fragments.hits, snapshot.fragments.misses) if snapshot else (0, 0))
+
+def local_data_signatures():
+    """Signatures of the JSON file and the columnar snapshot's manifest, which the watcher polls"""
+    return (file_signature(LOCAL_DATA_FILE), file_signature(LOCAL_COLUMNS_MANIFEST))
+
+def reload_local_data(strict=False):
+    """Build a new snapshot off to the side, then swap it in atomically"""
+    global snapshot, loaded_signatures
+    with snapshot_lock:
+        # Read first, so a file written during the build is seen as a change
+        signatures = local_data_signatures()
+        new_snapshot = build_snapshot(snapshot.version + 1 if snapshot else 1, strict)
+        snapshot = new_snapshot
+        loaded_signatures = signatures
+    query_cache.invalidate()
+    return new_snapshot
+
+def share_local_data():
+    """
+    Make sure the local data will load from a current columnar snapshot,
+    converting the JSON file when it is newer. A memory-mapped store lives
+    in the page cache, so forked workers share one copy of it.
+    """
+    source, _ = local_data_source()
+    if source != LOCAL_DATA_FILE or not os.path.exists(LOCAL_DATA_FILE):
+        return
+    try:
+        save_local_snapshot(PropertyStore.from_records(load_local_data(strict=True)), LOCAL_COLUMNS_DIR)
+    except Exception as e:
+        print(f"Error writing columnar snapshot, the JSON file will be loaded instead: {e}")
+
+def reload_shared_data():
+    """
+    Reload in the master of a preforking server, before it forks new
+    workers: convert a newer JSON file to a columnar snapshot and load it.
+    Does nothing when the data files have not changed since the last load.
+    """
+    if not USE_LOCAL_DATA or local_data_signatures() == loaded_signatures:
+        return None
+    share_local_data()
+    return reload_local_data(strict=True)
+
+def start_snapshot_watcher(changed=None):
+    """
+    Start polling the JSON file and the columnar snapshot for changes, once
+    per process. A change to either reloads from whichever is newer.
+
+    With changed, the watcher only calls changed() instead of reloading. A
+    preforking master uses that to reload on its main thread (see
+    reload_shared_data), so no worker is forked while the watcher thread
+    holds the snapshot or cache locks.
+    """
+    global snapshot_watcher
+    if snapshot is None or snapshot_watcher is not None or SNAPSHOT_POLL_SECONDS <= 0:
+        return
+    # clean_re_data.py writes the manifest last, so a changed manifest means a complete snapshot
+    snapshot_watcher = SnapshotWatcher([LOCAL_DATA_FILE, LOCAL_COLUMNS_MANIFEST], lambda: loaded_signatures,
+                                       changed or (lambda: reload_local_data(strict=True)), SNAPSHOT_POLL_SECONDS)
+    snapshot_watcher.start()
 
 # Utility functions
 def format_property_for_mcp(property_data):
@@ -75,10 +237,83 @@ def format_property_summary(property_data):
         "bathrooms": property_data.get('bathroom_count')
     }
 
-def query_properties_from_supabase(params):
-    """Query properties from Supabase based on parameters"""
-    query = supabase.table('properties').select('*')
+# Output shapes for property records
+PROPERTY_VIEWS = {
+    'full': format_property_for_mcp,
+    'summary': format_property_summary
+}
+
+# Fields that can be projected with ?fields=
+PROPERTY_FIELDS = list(format_property_for_mcp({}).keys())
+
+def parse_projection(args, default_fields=None):
+    """Read view= and fields= from a request; raises ValueError on unknown values"""
+    view = args.get('view', 'full')
+    if view not in PROPERTY_VIEWS:
+        raise ValueError(f"Unknown view '{view}', expected one of: {', '.join(PROPERTY_VIEWS)}")
+    
+    fields = [f.strip() for value in args.getlist('fields') for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in PROPERTY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
     
+    return view, tuple(fields) or default_fields
+
+def encode_json(value):
+    """Compact JSON bytes with sorted keys, matching jsonify's output"""
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode()
+
+def format_property(property_data, view='full', fields=None):
+    """Format a property in the given view, keeping only the projected fields if any"""
+    if fields:
+        formatted = format_property_for_mcp(property_data)
+        return {f: formatted[f] for f in fields}
+    return PROPERTY_VIEWS[view](property_data)
+
+def serialize_property(property_data, view='full', fields=None, current=None):
+    """JSON bytes for one property, serialized once per snapshot and then reused"""
+    build = lambda: encode_json(format_property(property_data, view, fields))
+    if current is None:
+        return build()
+    return current.fragments.get_or_build((view, fields), str(property_data.get('property_id')), build)
+
+def serialize_properties(properties, view='full', fields=None, current=None):
+    """JSON array bytes assembled from per-property fragments"""
+    return b'[' + b','.join(serialize_property(p, view, fields, current) for p in properties) + b']'
+
+def json_object(members):
+    """JSON object bytes from (key, pre-serialized value) pairs, in sorted key order"""
+    return b'{' + b','.join(encode_json(key) + b':' + value for key, value in sorted(members)) + b'}'
+
+def json_bytes_response(body, status=200):
+    """Response for an already-serialized JSON body"""
+    return Response(body, status=status, mimetype='application/json')
+
+def postgrest_value(value):
+    """Format a value for use inside a PostgREST or=() filter"""
+    if isinstance(value, str):
+        escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+        return f'"{escaped}"'
+    return str(value)
+
+def apply_supabase_cursor(query, after, sort_by, descending):
+    """Restrict a Supabase query to rows after (sort value, property_id) in sort order"""
+    value, property_id = after
+    last_id = postgrest_value(property_id)
+    
+    # Postgres puts nulls first when descending and last when ascending
+    if value is None:
+        if descending:
+            return query.or_(f"and({sort_by}.is.null,property_id.gt.{last_id}),{sort_by}.not.is.null")
+        return query.is_(sort_by, 'null').gt('property_id', property_id)
+    
+    value = postgrest_value(value)
+    if descending:
+        return query.or_(f"{sort_by}.lt.{value},and({sort_by}.eq.{value},property_id.gt.{last_id})")
+    return query.or_(f"{sort_by}.gt.{value},and({sort_by}.eq.{value},property_id.gt.{last_id}),{sort_by}.is.null")
+
+def apply_supabase_params(query, params):
+    """Apply the filters, sort order, limit and cursor in params to a properties select (sync or async client)"""
     # Apply filters
     if params.get('borough'):
         boroughs = params['borough'] if isinstance(params['borough'], list) else [params['borough']]
@@ -100,9 +335,23 @@ def query_properties_from_supabase(params):
         property_types = params['property_type'] if isinstance(params['property_type'], list) else [params['property_type']]
         query = query.in_('property_type_detail', property_types)
     
+    if params.get('zoning_code'):
+        query = query.in_('zoning_code', as_list(params['zoning_code']))
+    
+    if params.get('mls_status'):
+        query = query.in_('mls_status', as_list(params['mls_status']))
+    
+    # property_zip mixes ZIP and ZIP+4, so match on the five-digit prefix
+    if params.get('zip_code'):
+        patterns = ','.join(f"{str(z)[:5]}*" for z in as_list(params['zip_code']))
+        query = query.filter('property_zip', 'like(any)', f"{{{patterns}}}")
+    
     if params.get('min_sqft'):
         query = query.gte('total_building_area_square_feet', params['min_sqft'])
     
+    if params.get('max_sqft'):
+        query = query.lte('total_building_area_square_feet', params['max_sqft'])
+    
     if params.get('max_year_built'):
         query = query.lte('year_built', params['max_year_built'])
     
@@ -118,83 +367,298 @@ def query_properties_from_supabase(params):
     else:
         query = query.order(sort_by)
     
+    # Break ties by property_id so keyset pagination has a stable order
+    query = query.order('property_id')
+    
+    # Seek past the cursor instead of using an offset
+    if params.get('after'):
+        query = apply_supabase_cursor(query, params['after'], sort_by, sort_direction.lower() == 'desc')
+    
+    return query
+
+def query_properties_from_supabase(params):
+    """Query properties from Supabase based on parameters"""
+    query = apply_supabase_params(supabase.table('properties').select('*'), params)
+    
     # Execute query
     try:
-        response = query.execute()
+        response = execute(query)
         return response.data
     except Exception as e:
         print(f"Error querying Supabase: {e}")
         return []
 
-def query_properties_from_local(params):
-    """Query properties from local data based on parameters"""
-    if not local_properties:
+def query_properties_from_local(params, current=None):
+    """Query properties from local data based on parameters, optionally against a pinned snapshot"""
+    current = current or snapshot
+    if not current or not current.store:
         return []
     
-    # Start with all properties
-    filtered_properties = local_properties.copy()
-    
-    # Apply filters
-    if params.get('borough'):
-        boroughs = params['borough'] if isinstance(params['borough'], list) else [params['borough']]
-        filtered_properties = [p for p in filtered_properties if p.get('borough') in boroughs]
-    
-    if params.get('min_price'):
-        filtered_properties = [p for p in filtered_properties if p.get('estimated_value') is not None and p.get('estimated_value') >= params['min_price']]
-    
-    if params.get('max_price'):
-        filtered_properties = [p for p in filtered_properties if p.get('estimated_value') is not None and p.get('estimated_value') <= params['max_price']]
+    # The trace splits the time into filtering and the top-k sort; walking
+    # the sort index does both at once and counts as filtering
+    trace = {}
+    started = time.perf_counter()
+    properties = current.store.query(params, trace)
+    sort_seconds = trace['sort']['ms'] / 1000 if 'sort' in trace else 0.0
+    observe_stage('filter', time.perf_counter() - started - sort_seconds)
+    if 'sort' in trace:
+        observe_stage('sort', sort_seconds)
+    return properties
+
+def query_facets_from_local(params, facets, current=None):
+    """Query local data and count facet values over all matches, optionally against a pinned snapshot"""
+    current = current or snapshot
+    if not current or not current.store:
+        return [], {facet: {} for facet in facets}
+    with stage('filter'):
+        return current.store.query_with_facets(params, facets)
+
+def explain_query(params, current=None):
+    """
+    Run a query uncached and report how it ran.
+
+    Locally the plan lists each filter stage in execution order with its
+    estimated and actual row counts and timings; against Supabase the
+    filtering happens in Postgres, so only the round trip is timed.
+    """
+    started = time.perf_counter()
+    if USE_LOCAL_DATA:
+        current = current or snapshot
+        if not current or not current.store:
+            return [], {"backend": "local", "error": "Local data not loaded"}
+        plan = {"backend": "local", "rows_total": len(current.store)}
+        properties = current.store.query(params, plan)
+    else:
+        plan = {"backend": "supabase", "strategy": "postgrest"}
+        properties = query_properties_from_supabase(params)
+    plan["rows_returned"] = len(properties)
+    plan["total_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    return properties, plan
+
+def query_cache_key(params, current=None):
+    """
+    Cache key for a query. Local results are also keyed by the version of
+    the snapshot they came from, so a request pinned to one snapshot never
+    reads, or stores, rows of another.
+    """
+    key = canonical_params(params)
+    return (current.version, key) if current else key
+
+def query_properties(params, current=None):
+    """Query properties from the active data source, serving repeats from the cache; local queries use the pinned snapshot"""
+    if USE_LOCAL_DATA:
+        current = current or snapshot
+    key = query_cache_key(params, current)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return list(cached)
     
-    if params.get('min_bedrooms'):
-        filtered_properties = [p for p in filtered_properties if p.get('bedroom_count') is not None and p.get('bedroom_count') >= params['min_bedrooms']]
+    generation = query_cache.generation
+    if USE_LOCAL_DATA:
+        properties = query_properties_from_local(params, current)
+    else:
+        properties = query_properties_from_supabase(params)
     
-    if params.get('min_bathrooms'):
-        filtered_properties = [p for p in filtered_properties if p.get('bathroom_count') is not None and p.get('bathroom_count') >= params['min_bathrooms']]
+    query_cache.put(key, properties, generation)
+    return list(properties)
+
+def facet_counts_from_supabase(params, facets):
+    """Facet counts via the property_facets RPC, in the same shape as PropertyStore.facet_values"""
+    response = execute(supabase.rpc('property_facets', rpc_filter_args(params)))
+    return facet_counts_from_rows(response.data or [], facets)
+
+def facet_counts_from_rows(rows, facets):
+    """Facet counts from property_facets RPC rows"""
+    counts = {facet: {} for facet in facets}
+    for row in rows:
+        if row['facet'] not in counts:
+            continue
+        value = row['value']
+        if row['facet'] == 'bedrooms' and int(value) == BEDROOM_BUCKETS:
+            value = f"{BEDROOM_BUCKETS}+"
+        counts[row['facet']][value] = row['count']
+    if 'bedrooms' in counts:
+        labels = [str(n) for n in range(BEDROOM_BUCKETS)] + [f"{BEDROOM_BUCKETS}+"]
+        counts['bedrooms'] = {label: counts['bedrooms'].get(label, 0) for label in labels}
+    return counts
+
+def query_properties_with_facets(params, facets, current=None):
+    """Query properties and count facet values over all matches, serving repeats from the cache; local queries use the pinned snapshot"""
+    if USE_LOCAL_DATA:
+        current = current or snapshot
+    key = query_cache_key(dict(params, facets=facets), current)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return list(cached[0]), cached[1]
     
-    if params.get('property_type'):
-        property_types = params['property_type'] if isinstance(params['property_type'], list) else [params['property_type']]
-        filtered_properties = [p for p in filtered_properties if p.get('property_type_detail') in property_types]
+    generation = query_cache.generation
+    if USE_LOCAL_DATA:
+        properties, counts = query_facets_from_local(params, facets, current)
+    else:
+        counts_future = supabase_executor.submit(facet_counts_from_supabase, params, facets)
+        properties = query_properties_from_supabase(params)
+        try:
+            counts = counts_future.result()
+        except Exception as e:
+            print(f"Error counting facets in Supabase: {e}")
+            return properties, {facet: {} for facet in facets}
     
-    if params.get('min_sqft'):
-        filtered_properties = [p for p in filtered_properties if p.get('total_building_area_square_feet') is not None and p.get('total_building_area_square_feet') >= params['min_sqft']]
+    query_cache.put(key, (properties, counts), generation)
+    return list(properties), counts
+
+def parse_facets(args):
+    """Facets requested with ?facets=borough,bedrooms (or ?facets=all); raises ValueError on bad input"""
+    facets = [f for value in args.getlist('facets') for f in value.split(',') if f]
+    if 'all' in facets:
+        return list(FACETS)
+    unknown = [f for f in facets if f not in FACETS]
+    if unknown:
+        raise ValueError(f"Unsupported facets: {', '.join(unknown)}")
+    return list(dict.fromkeys(facets))
+
+# Batch lookups
+MAX_BATCH_SIZE = 500
+MAX_SIMILAR_PROPERTIES = 10
+
+# Address autocomplete
+AUTOCOMPLETE_FIELDS = ('property_id', 'address', 'zip', 'borough', 'estimated_value')
+AUTOCOMPLETE_MAX_LIMIT = 50
+
+def autocomplete_from_supabase(query, limit, borough=None):
+    """
+    Address and zip prefix matches from Supabase, highest value first.
+
+    The query is rewritten in the data's abbreviated style ("West 84th
+    Street" -> "W 84th St") and matched with ILIKE; unlike the local index
+    it can't match a house number or ordinal typed differently from the data.
+    """
+    pattern = ''.join(c for c in contract_address(query) if c not in ',()*%')
     
-    if params.get('max_year_built'):
-        filtered_properties = [p for p in filtered_properties if p.get('year_built') is not None and p.get('year_built') <= params['max_year_built']]
+    def search(in_borough):
+        q = supabase.table('properties').select('*').or_(f"property_address.ilike.{pattern}*,property_zip.like.{pattern}*")
+        if in_borough:
+            q = q.eq('borough', borough)
+        return execute(q.order('estimated_value', desc=True, nullsfirst=False).order('property_id').limit(limit)).data or []
     
-    # Apply sorting
+    # Properties in the preferred borough first, then the best of the rest
+    if not borough:
+        return search(False)
+    preferred = supabase_executor.submit(search, True)
+    others = search(False)
+    properties = preferred.result()
+    seen = {str(p.get('property_id')) for p in properties}
+    properties += [p for p in others if str(p.get('property_id')) not in seen]
+    return properties[:limit]
+
+def fetch_property_from_supabase(property_id):
+    """Fetch a single property row from Supabase"""
+    response = execute(supabase.table('properties').select('*').eq('property_id', property_id).limit(1))
+    return response.data[0] if response.data else None
+
+def fetch_similar_from_supabase(property_id, limit=3):
+    """Similar properties via the similar_properties RPC, which resolves the target server-side"""
+    response = execute(supabase.rpc('similar_properties', {'target_id': int(property_id), 'max_results': limit}))
+    return response.data or []
+
+def iter_properties(params, current=None):
+    """
+    Yield every matching property, one keyset page at a time.
+
+    Only one page is held in memory, so large exports stay flat. A limit
+    in params caps the total; without one everything is streamed. Local
+    queries stay on the given snapshot, or the one current when streaming started.
+    """
+    current = current or snapshot
+    remaining = params.get('limit')
     sort_by = params.get('sort_by', 'estimated_value')
-    sort_direction = params.get('sort_direction', 'desc')
-    
-    reverse = sort_direction.lower() == 'desc'
-    
-    # Handle None values for sorting
-    filtered_properties = sorted(
-        filtered_properties,
-        key=lambda x: (x.get(sort_by) is None, x.get(sort_by)),
-        reverse=reverse
-    )
+    page_params = dict(params)
     
-    # Apply limit
-    limit = params.get('limit', 10)
-    return filtered_properties[:limit]
+    while remaining is None or remaining > 0:
+        page_size = STREAM_BATCH_SIZE if remaining is None else min(STREAM_BATCH_SIZE, remaining)
+        page_params['limit'] = page_size
+        if USE_LOCAL_DATA:
+            page = query_properties_from_local(page_params, current)
+        else:
+            page = query_properties_from_supabase(page_params)
+        
+        yield from page
+        
+        if len(page) < page_size:
+            return
+        if remaining is not None:
+            remaining -= len(page)
+        last = page[-1]
+        page_params['after'] = (last.get(sort_by), last.get('property_id'))
 
-def find_similar_properties(property_id, limit=3):
-    """Find similar properties to the given property"""
-    # Get the target property
-    target_property = None
-    
+def find_similar_in_snapshot(current, property_id, limit=3):
+    """Similar properties from the precomputed table, falling back to the nearest-neighbour index"""
+    row = current.store.find_row(property_id) if current else None
+    if row is None:
+        return []
+    similar_rows = current.similar_table.lookup(row, limit)
+    if similar_rows is None or len(similar_rows) < limit:
+        similar_rows = current.similarity_index.neighbours([row], limit)[0]
+    return current.store.rows(similar_rows)
+
+def find_similar_batch_in_snapshot(current, property_ids, limit=3):
+    """Similar properties for several ids; ids missing from the precomputed table share one neighbour search"""
+    similar = {}
+    unlisted = []
+    for property_id in property_ids:
+        similar_rows = current.similar_table.lookup(current.store.find_row(property_id), limit)
+        if similar_rows is None or len(similar_rows) < limit:
+            unlisted.append(property_id)
+        else:
+            similar[property_id] = current.store.rows(similar_rows)
+    for property_id, rows in current.similarity_index.neighbours_for_ids(unlisted, limit).items():
+        similar[property_id] = current.store.rows(rows)
+    return similar
+
+def fetch_properties_from_supabase(property_ids):
+    """Fetch several property rows from Supabase with one in_ query"""
+    response = execute(supabase.table('properties').select('*').in_('property_id', property_ids))
+    return response.data or []
+
+def fetch_similar_batch_from_supabase(properties, limit=3):
+    """Similar properties for several targets via the similar_properties_batch RPC"""
+    property_ids = [str(p.get('property_id')) for p in properties]
+    try:
+        response = execute(supabase.rpc('similar_properties_batch', {
+            'target_ids': [int(property_id) for property_id in property_ids],
+            'max_results': limit
+        }))
+        return {str(row['target_id']): row['similar'] or [] for row in response.data or []}
+    except Exception as e:
+        # RPC not installed (see sql/similar_properties.sql); search per target concurrently
+        print(f"Error calling similar_properties_batch RPC: {e}")
+        futures = {property_id: supabase_executor.submit(find_similar_properties, property_id, limit, p)
+                   for property_id, p in zip(property_ids, properties)}
+        return {property_id: future.result() for property_id, future in futures.items()}
+
+def find_similar_properties(property_id, limit=3, target_property=None):
+    """Find similar properties to the given property; pass target_property to skip refetching it"""
     if USE_LOCAL_DATA:
-        target_property = next((p for p in local_properties if str(p.get('property_id')) == str(property_id)), None)
-    else:
-        response = supabase.table('properties').select('*').eq('property_id', property_id).execute()
-        if response.data:
-            target_property = response.data[0]
+        return find_similar_in_snapshot(snapshot, property_id, limit)
+    
+    # Get the target property unless the caller already has it
+    if target_property is None:
+        target_property = fetch_property_from_supabase(property_id)
     
     if not target_property:
         return []
     
-    # Define criteria for similarity
-    similarity_params = {
+    # Query similar properties
+    similar = query_properties_from_supabase(similarity_params(target_property, limit))
+    
+    # Remove the target property from results
+    similar = [p for p in similar if str(p.get('property_id')) != str(property_id)]
+    
+    # Return limited results
+    return similar[:limit]
+
+def similarity_params(target_property, limit=3):
+    """Query params for properties resembling target_property, used when the similarity RPC is missing"""
+    return {
         'borough': target_property.get('borough'),
         'min_bedrooms': max(0, (target_property.get('bedroom_count') or 0) - 1),
         'min_bathrooms': max(0, (target_property.get('bathroom_count') or 0) - 1),
@@ -202,96 +666,389 @@ def find_similar_properties(property_id, limit=3):
         'max_price': (target_property.get('estimated_value') or 0) * 1.3,
         'limit': limit + 1  # Get one extra to filter out the original property
     }
+
+# Aggregate statistics
+STATS_COLUMNS = [
+    'estimated_value', 'bedroom_count', 'bathroom_count', 'total_building_area_square_feet',
+    'lot_size_square_feet', 'year_built', 'last_sale_price', 'total_assessed_value', 'mls_listing_amount'
+]
+DEFAULT_PERCENTILES = [10, 25, 50, 75, 90]
+MAX_HISTOGRAM_BINS = 100
+
+def parse_stats_params(args):
+    """Columns, grouping, percentiles and histogram bins for the stats endpoint; raises ValueError on bad input"""
+    columns = [c for value in args.getlist('columns') for c in value.split(',') if c] or ['estimated_value']
+    unknown = [c for c in columns if c not in STATS_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unsupported stats columns: {', '.join(unknown)}")
     
-    # Query similar properties
-    if USE_LOCAL_DATA:
-        similar = query_properties_from_local(similarity_params)
-    else:
-        similar = query_properties_from_supabase(similarity_params)
+    group_by = args.get('group_by') or None
+    if group_by and group_by not in GROUP_COLUMNS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUP_COLUMNS)}")
     
-    # Remove the target property from results
-    similar = [p for p in similar if str(p.get('property_id')) != str(property_id)]
+    percentiles = [float(p) for value in args.getlist('percentiles') for p in value.split(',') if p] or DEFAULT_PERCENTILES
+    if any(p < 0 or p > 100 for p in percentiles):
+        raise ValueError("percentiles must be between 0 and 100")
+    percentiles = [int(p) if p == int(p) else p for p in percentiles]
     
-    # Return limited results
-    return similar[:limit]
+    bins = int(args.get('bins', 10))
+    if not 1 <= bins <= MAX_HISTOGRAM_BINS:
+        raise ValueError(f"bins must be between 1 and {MAX_HISTOGRAM_BINS}")
+    
+    return list(dict.fromkeys(columns)), group_by, percentiles, bins
+
+def rpc_filter_args(params):
+    """Filter arguments shared by the property_stats and property_facets RPCs"""
+    return {
+        'boroughs': as_list(params['borough']) if params.get('borough') else None,
+        'property_types': as_list(params['property_type']) if params.get('property_type') else None,
+        'zoning_codes': as_list(params['zoning_code']) if params.get('zoning_code') else None,
+        'mls_statuses': as_list(params['mls_status']) if params.get('mls_status') else None,
+        'zip_codes': [str(z)[:5] for z in as_list(params['zip_code'])] if params.get('zip_code') else None,
+        'min_price': params.get('min_price') or None,
+        'max_price': params.get('max_price') or None,
+        'min_bedrooms': params.get('min_bedrooms') or None,
+        'min_bathrooms': params.get('min_bathrooms') or None,
+        'min_sqft': params.get('min_sqft') or None,
+        'max_sqft': params.get('max_sqft') or None,
+        'max_year_built': params.get('max_year_built') or None
+    }
+
+def stats_rpc_args(params, column, group_by, percentiles, bins):
+    """Arguments for the property_stats RPC from query params"""
+    return {
+        'stat_column': column,
+        'group_column': group_by,
+        'percentiles': [p / 100 for p in percentiles],
+        'bins': bins,
+        **rpc_filter_args(params)
+    }
+
+def stats_from_rpc(row, percentiles, bins):
+    """Convert one property_stats RPC result into the local stats format"""
+    if not row or not row.get('count'):
+        return {"count": 0, "min": None, "max": None, "mean": None, "median": None,
+                "percentiles": {str(p): None for p in percentiles}, "histogram": None}
+    
+    low, high = float(row['min']), float(row['max'])
+    width = (high - low) / bins if high > low else 0.0
+    # np.histogram widens a zero-width range by 0.5 either side; mirror its edges
+    if width == 0.0:
+        low, width = low - 0.5, 1.0 / bins
+    histogram = row.get('histogram') or {}
+    return {
+        "count": row['count'],
+        "min": float(row['min']),
+        "max": float(row['max']),
+        "mean": float(row['mean']),
+        "median": float(row['median']),
+        "percentiles": {str(p): float(q) for p, q in zip(percentiles, row.get('percentiles') or [])},
+        "histogram": {
+            "edges": [low + width * i for i in range(bins + 1)],
+            "counts": [histogram.get(str(i + 1), 0) for i in range(bins)]
+        }
+    }
+
+def property_stats_from_supabase(params, columns, group_by, percentiles, bins):
+    """Aggregate statistics via the property_stats RPC, one call per column and grouping, run concurrently"""
+    def call(column, group):
+        response = execute(supabase.rpc('property_stats', stats_rpc_args(params, column, group, percentiles, bins)))
+        return response.data or []
+    
+    overall = {c: supabase_executor.submit(call, c, None) for c in columns}
+    grouped = {c: supabase_executor.submit(call, c, group_by) for c in columns} if group_by else {}
+    
+    stats = {c: stats_from_rpc((future.result() or [None])[0], percentiles, bins) for c, future in overall.items()}
+    # The RPC only counts non-null values; the best-covered column stands in for the row count
+    result = {
+        "row_count": max((s["count"] for s in stats.values()), default=0),
+        "stats": stats
+    }
+    if group_by:
+        result["groups"] = {}
+        for column, future in grouped.items():
+            for row in future.result():
+                group = result["groups"].setdefault(str(row['group']), {"row_count": 0, "stats": {}})
+                group["stats"][column] = stats_from_rpc(row, percentiles, bins)
+                group["row_count"] = max(group["row_count"], row['count'])
+        # Groups without values in a column still report that column
+        for group in result["groups"].values():
+            for column in columns:
+                group["stats"].setdefault(column, stats_from_rpc(None, percentiles, bins))
+    return result
+
+# Pagination cursors
+def encode_cursor(sort_by, sort_direction, value, property_id):
+    """Opaque token for the position just after the last row of a page"""
+    payload = json.dumps([sort_by, sort_direction.lower(), value, property_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, sort_by, sort_direction):
+    """Decode a cursor into (sort value, property_id); raises ValueError if it doesn't fit the query"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        cursor_sort_by, cursor_direction, value, property_id = json.loads(base64.urlsafe_b64decode(padded))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if cursor_sort_by != sort_by or cursor_direction != sort_direction.lower():
+        raise ValueError("Cursor does not match sort_by/sort_direction")
+    return (value, property_id)
+
+def next_cursor(properties, params):
+    """Cursor for the page after this one, or None on the last page"""
+    if not properties or len(properties) < params.get('limit', 10):
+        return None
+    last = properties[-1]
+    sort_by = params.get('sort_by', 'estimated_value')
+    return encode_cursor(sort_by, params.get('sort_direction', 'desc'), last.get(sort_by), last.get('property_id'))
+
+def parse_property_params(args):
+    """Build query params from a request's query string; raises ValueError on bad input"""
+    params = {
+        'borough': args.getlist('borough') or None,
+        'min_price': float(args.get('min_price')) if args.get('min_price') else None,
+        'max_price': float(args.get('max_price')) if args.get('max_price') else None,
+        'min_bedrooms': float(args.get('min_bedrooms')) if args.get('min_bedrooms') else None,
+        'min_bathrooms': float(args.get('min_bathrooms')) if args.get('min_bathrooms') else None,
+        'property_type': args.getlist('property_type') or None,
+        'zoning_code': args.getlist('zoning_code') or None,
+        'mls_status': args.getlist('mls_status') or None,
+        'zip_code': args.getlist('zip_code') or None,
+        'min_sqft': float(args.get('min_sqft')) if args.get('min_sqft') else None,
+        'max_sqft': float(args.get('max_sqft')) if args.get('max_sqft') else None,
+        'max_year_built': int(args.get('max_year_built')) if args.get('max_year_built') else None,
+        'sort_by': args.get('sort_by', 'estimated_value'),
+        'sort_direction': args.get('sort_direction', 'desc'),
+        'limit': int(args.get('limit', 10))
+    }
+    
+    if args.get('cursor'):
+        params['after'] = decode_cursor(args['cursor'], params['sort_by'], params['sort_direction'])
+    
+    # Clean parameters, removing None values
+    return {k: v for k, v in params.items() if v is not None}
+
+def search_response_body(params, properties, view='full', fields=None, current=None, counts=None, plan=None):
+    """JSON bytes of a /api/properties response, assembled from cached per-property fragments"""
+    search_context = {
+        "filters": {
+            "borough": params.get('borough', []),
+            "min_price": params.get('min_price'),
+            "max_price": params.get('max_price'),
+            "min_bedrooms": params.get('min_bedrooms'),
+            "min_bathrooms": params.get('min_bathrooms'),
+            "property_type": params.get('property_type', []),
+            "zoning_code": params.get('zoning_code', []),
+            "mls_status": params.get('mls_status', []),
+            "zip_code": params.get('zip_code', []),
+            "min_sqft": params.get('min_sqft'),
+            "max_sqft": params.get('max_sqft'),
+            "max_year_built": params.get('max_year_built')
+        },
+        "sort_by": params.get('sort_by'),
+        "sort_direction": params.get('sort_direction')
+    }
+    
+    # Assemble the body from cached per-property JSON fragments
+    with stage('serialize'):
+        members = [
+            ("search_context", encode_json(search_context)),
+            ("properties", serialize_properties(properties, view, fields, current)),
+            ("next_cursor", encode_json(next_cursor(properties, params)))
+        ]
+        if counts is not None:
+            members.append(("facets", encode_json(counts)))
+        if plan is not None:
+            members.append(("plan", encode_json(plan)))
+        return json_object(members)
 
 # API Routes
 @app.route('/api/properties', methods=['GET'])
 def get_properties():
     """Get properties based on query parameters"""
     # Extract parameters from query string
-    params = {
-        'borough': request.args.getlist('borough') or None,
-        'min_price': float(request.args.get('min_price')) if request.args.get('min_price') else None,
-        'max_price': float(request.args.get('max_price')) if request.args.get('max_price') else None,
-        'min_bedrooms': float(request.args.get('min_bedrooms')) if request.args.get('min_bedrooms') else None,
-        'min_bathrooms': float(request.args.get('min_bathrooms')) if request.args.get('min_bathrooms') else None,
-        'property_type': request.args.getlist('property_type') or None,
-        'min_sqft': float(request.args.get('min_sqft')) if request.args.get('min_sqft') else None,
-        'max_year_built': int(request.args.get('max_year_built')) if request.args.get('max_year_built') else None,
-        'sort_by': request.args.get('sort_by', 'estimated_value'),
-        'sort_direction': request.args.get('sort_direction', 'desc'),
-        'limit': int(request.args.get('limit', 10))
-    }
+    try:
+        params = parse_property_params(request.args)
+        view, fields = parse_projection(request.args)
+        facets = parse_facets(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Clean parameters, removing None values
-    params = {k: v for k, v in params.items() if v is not None}
+    current = snapshot if USE_LOCAL_DATA else None
+    
+    # Stream newline-delimited JSON as rows are produced; without an explicit limit, stream everything
+    if request.args.get('format') == 'ndjson':
+        if 'limit' not in request.args:
+            params.pop('limit')
+        
+        # Exported rows bypass the fragment cache so a large export doesn't fill it
+        def generate():
+            for p in iter_properties(params, current):
+                yield serialize_property(p, view, fields) + b'\n'
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    # Query properties, counting facets in the same pass when asked for
+    counts = None
+    plan = None
+    if request.args.get('explain') in ('1', 'true'):
+        properties, plan = explain_query(params, current)
+        if facets:
+            counts = query_properties_with_facets(params, facets, current)[1]
+    elif facets:
+        properties, counts = query_properties_with_facets(params, facets, current)
+    else:
+        properties = query_properties(params, current)
+    
+    return json_bytes_response(search_response_body(params, properties, view, fields, current, counts, plan))
+
+@app.route('/api/properties/stats', methods=['GET'])
+def get_property_stats():
+    """Count, min/max/mean/median, percentiles and histograms of numeric columns over the matching properties"""
+    try:
+        params = parse_property_params(request.args)
+        columns, group_by, percentiles, bins = parse_stats_params(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Query properties
     if USE_LOCAL_DATA:
-        properties = query_properties_from_local(params)
+        current = snapshot
+        if not current:
+            return jsonify({"error": "Local data not loaded"}), 503
+        stats = current.store.aggregate(params, columns, group_by, percentiles, bins)
     else:
-        properties = query_properties_from_supabase(params)
+        try:
+            stats = property_stats_from_supabase(params, columns, group_by, percentiles, bins)
+        except Exception as e:
+            print(f"Error computing stats in Supabase: {e}")
+            return jsonify({"error": "Failed to compute statistics"}), 502
     
-    # Create MCP structure for response
-    response = {
-        "search_context": {
-            "filters": {
-                "borough": params.get('borough', []),
-                "min_price": params.get('min_price'),
-                "max_price": params.get('max_price'),
-                "min_bedrooms": params.get('min_bedrooms'),
-                "min_bathrooms": params.get('min_bathrooms'),
-                "property_type": params.get('property_type', []),
-                "min_sqft": params.get('min_sqft'),
-                "max_year_built": params.get('max_year_built')
-            },
-            "sort_by": params.get('sort_by'),
-            "sort_direction": params.get('sort_direction')
-        },
-        "properties": [format_property_for_mcp(p) for p in properties]
-    }
+    filters = {k: v for k, v in params.items() if k not in ('sort_by', 'sort_direction', 'limit', 'after')}
+    return jsonify({
+        "filters": filters,
+        "group_by": group_by,
+        **stats
+    })
+
+@app.route('/api/properties/autocomplete', methods=['GET'])
+def autocomplete_properties():
+    """Properties whose address or zip starts with ?q=, preferring ?borough= and then higher values"""
+    query = request.args.get('q', '').strip()
+    borough = request.args.get('borough') or None
+    try:
+        limit = min(int(request.args.get('limit', 10)), AUTOCOMPLETE_MAX_LIMIT)
+        view, fields = parse_projection(request.args, AUTOCOMPLETE_FIELDS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    return jsonify(response)
+    current = snapshot if USE_LOCAL_DATA else None
+    if not query or limit <= 0:
+        properties = []
+    elif USE_LOCAL_DATA:
+        properties = current.store.rows(current.address_index.search(query, limit, borough)) if current else []
+    else:
+        try:
+            properties = autocomplete_from_supabase(query, limit, borough)
+        except Exception as e:
+            print(f"Error searching addresses in Supabase: {e}")
+            properties = []
+    
+    with stage('serialize'):
+        body = json_object([
+            ("query", encode_json(query)),
+            ("properties", serialize_properties(properties, view, fields, current))
+        ])
+    return json_bytes_response(body)
 
 @app.route('/api/properties/<property_id>', methods=['GET'])
 def get_property(property_id):
     """Get a specific property by ID"""
-    # Get property data
-    property_data = None
+    try:
+        view, fields = parse_projection(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
+    current = None
     if USE_LOCAL_DATA:
-        property_data = next((p for p in local_properties if str(p.get('property_id')) == str(property_id)), None)
+        # Get property data
+        current = snapshot
+        property_data = current.store.get(property_id) if current else None
+        if not property_data:
+            return jsonify({"error": "Property not found"}), 404
+        
+        # Find similar properties in the same snapshot
+        similar_properties = find_similar_in_snapshot(current, property_id)
     else:
-        response = supabase.table('properties').select('*').eq('property_id', property_id).execute()
-        if response.data:
-            property_data = response.data[0]
-    
-    if not property_data:
-        return jsonify({"error": "Property not found"}), 404
+        # Fetch the property and its similar properties concurrently
+        property_future = supabase_executor.submit(fetch_property_from_supabase, property_id)
+        similar_future = supabase_executor.submit(fetch_similar_from_supabase, property_id)
+        
+        property_data = property_future.result()
+        if not property_data:
+            similar_future.cancel()
+            return jsonify({"error": "Property not found"}), 404
+        
+        try:
+            similar_properties = similar_future.result()
+        except Exception as e:
+            # RPC not installed (see sql/similar_properties.sql); reuse the fetched target
+            print(f"Error calling similar_properties RPC: {e}")
+            similar_properties = find_similar_properties(property_id, target_property=property_data)
     
-    # Find similar properties
-    similar_properties = find_similar_properties(property_id)
+    return json_bytes_response(property_response_body(property_data, similar_properties, view, fields, current))
+
+@app.route('/api/properties/batch', methods=['POST'])
+def get_properties_batch():
+    """
+    Get several properties by ID in one request.
+
+    Body: {"property_ids": [...], "similar": n}. Properties come back in
+    request order; unknown ids are listed under "missing". With similar > 0,
+    "similar_properties" maps each found id to its similar properties.
+    """
+    data = request.get_json(silent=True) or {}
+    property_ids = data.get('property_ids')
+    if not isinstance(property_ids, list) or not property_ids:
+        return jsonify({"error": "property_ids must be a non-empty list"}), 400
+    if len(property_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} property_ids per request"}), 400
+    try:
+        similar_limit = min(int(data.get('similar', 0)), MAX_SIMILAR_PROPERTIES)
+        view, fields = parse_projection(request.args)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Create MCP structure for response
-    response = {
-        "property_context": {
-            "current_property": format_property_for_mcp(property_data),
-            "similar_properties": [format_property_summary(p) for p in similar_properties]
-        }
-    }
+    property_ids = list(dict.fromkeys(str(property_id) for property_id in property_ids))
+    current = None
+    if USE_LOCAL_DATA:
+        current = snapshot
+        if not current:
+            return jsonify({"error": "Local data not loaded"}), 503
+        rows = {property_id: current.store.find_row(property_id) for property_id in property_ids}
+        found = {property_id: row for property_id, row in rows.items() if row is not None}
+        by_id = dict(zip(found, current.store.rows(list(found.values()))))
+        similar = find_similar_batch_in_snapshot(current, list(found), similar_limit) if similar_limit > 0 else None
+    else:
+        try:
+            by_id = {str(p.get('property_id')): p for p in fetch_properties_from_supabase(property_ids)}
+            similar = fetch_similar_batch_from_supabase(list(by_id.values()), similar_limit) if similar_limit > 0 else None
+        except Exception as e:
+            print(f"Error fetching properties from Supabase: {e}")
+            return jsonify({"error": "Failed to fetch properties"}), 502
     
-    return jsonify(response)
+    properties = [by_id[property_id] for property_id in property_ids if property_id in by_id]
+    with stage('serialize'):
+        members = [
+            ("properties", serialize_properties(properties, view, fields, current)),
+            ("missing", encode_json([property_id for property_id in property_ids if property_id not in by_id]))
+        ]
+        if similar is not None:
+            members.append(("similar_properties", json_object([
+                (property_id, serialize_properties(similar.get(property_id, []), 'summary', None, current))
+                for property_id in by_id
+            ])))
+        body = json_object(members)
+    return json_bytes_response(body)
 
 @app.route('/api/mcp/property-query', methods=['POST'])
 def property_query_mcp():
@@ -304,31 +1061,27 @@ def property_query_mcp():
     
     user_query = data['query']
     
-    # Sample logic to extract search parameters from natural language query
-    # In a real app, you would use an LLM to extract these parameters
-    params = {}
-    
-    if 'manhattan' in user_query.lower():
-        params['borough'] = ['Manhattan']
-    elif 'brooklyn' in user_query.lower():
-        params['borough'] = ['Brooklyn']
-    
-    if 'under 2 million' in user_query.lower():
-        params['max_price'] = 2000000
-    elif 'under 1 million' in user_query.lower():
-        params['max_price'] = 1000000
-    
-    if 'at least 2 bedrooms' in user_query.lower():
-        params['min_bedrooms'] = 2
-    elif 'at least 3 bedrooms' in user_query.lower():
-        params['min_bedrooms'] = 3
+    # Extract search parameters with the rule-based parser (memoized, no LLM round trip)
+    params = parse_property_query(user_query)
     
     # Query properties based on extracted parameters
-    if USE_LOCAL_DATA:
-        properties = query_properties_from_local(params)
-    else:
-        properties = query_properties_from_supabase(params)
+    current = snapshot if USE_LOCAL_DATA else None
+    properties = query_properties(params, current)
     
+    return json_bytes_response(mcp_response_body(user_query, params, properties, current))
+
+def property_response_body(property_data, similar_properties, view='full', fields=None, current=None):
+    """JSON bytes of a /api/properties/<id> response in MCP structure, from cached fragments"""
+    with stage('serialize'):
+        return json_object([
+            ("property_context", json_object([
+                ("current_property", serialize_property(property_data, view, fields, current)),
+                ("similar_properties", serialize_properties(similar_properties, 'summary', None, current))
+            ]))
+        ])
+
+def mcp_response_body(user_query, params, properties, current=None):
+    """JSON bytes of a /api/mcp/property-query response"""
     # If no specific filters were extracted, return a random sample
     if not params and properties:
         # Get a random sample
@@ -339,9 +1092,6 @@ def property_query_mcp():
     response = {
         "query": user_query,
         "extracted_parameters": params,
-        "property_context": {
-            "properties": [format_property_for_mcp(p) for p in properties]
-        },
         "conversation_memory": {
             "property_mentions": [
                 {
@@ -354,13 +1104,72 @@ def property_query_mcp():
         }
     }
     
-    return jsonify(response)
+    with stage('serialize'):
+        members = [(key, encode_json(value)) for key, value in response.items()]
+        members.append(("property_context", json_object([
+            ("properties", serialize_properties(properties, 'full', None, current))
+        ])))
+        return json_object(members)
+
+def admin_required(view):
+    """Reject requests to an admin endpoint that don't carry ADMIN_TOKEN"""
+    @wraps(view)
+    def guarded(*args, **kwargs):
+        if not token_matches(request.headers.get('X-Admin-Token'), ADMIN_TOKEN):
+            return jsonify({"error": "Admin token required"}), 403
+        return view(*args, **kwargs)
+    return guarded
+
+@app.route('/api/admin/cache', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Report query cache size and hit/miss counters"""
+    return jsonify(dict(query_cache.stats(), parser=parse_cache_info()))
+
+@app.route('/api/admin/cache/invalidate', methods=['POST'])
+@admin_required
+def invalidate_cache():
+    """Drop cached query results in every worker, e.g. after the Supabase table is re-uploaded"""
+    query_cache.invalidate()
+    return jsonify(query_cache.stats())
+
+@app.route('/api/admin/snapshot', methods=['GET'])
+@admin_required
+def get_snapshot_info():
+    """Report the version, size and load time of the local data snapshot"""
+    current = snapshot
+    if not current:
+        return jsonify({"error": "Not running with local data"}), 404
+    return jsonify(current.describe())
+
+def create_app(shared=False, watch=True):
+    """
+    Load the local data (when serving it) and return the app.
+
+    With shared, the data is converted to a columnar snapshot first if
+    needed so it is memory-mapped; a preforking server calls this once in
+    the master so workers inherit the loaded snapshot. There watch is off:
+    the master starts the snapshot watcher once it is ready and re-forks
+    the workers after a reload (see gunicorn.conf.py), and each worker
+    starts its own continuous profiler, since threads do not survive a fork.
+    """
+    if USE_LOCAL_DATA and snapshot is None:
+        if shared:
+            share_local_data()
+        reload_local_data()
+    if USE_LOCAL_DATA and watch:
+        start_snapshot_watcher()
+    if watch:
+        start_continuous_profiler()
+    return app
 
 if __name__ == '__main__':
+    create_app()
+    
     # Check if we can connect to Supabase or if we're using local data
     if USE_LOCAL_DATA:
-        print(f"Running with local data from {LOCAL_DATA_FILE}")
-        print(f"Found {len(local_properties) if local_properties else 0} properties in local data.")
+        print(f"Running with local data from {snapshot.source if snapshot else LOCAL_DATA_FILE}")
+        print(f"Found {len(snapshot.store) if snapshot else 0} properties in local data.")
     else:
         print(f"Connected to Supabase at {SUPABASE_URL}")
     
@@ -0,0 +1,246 @@
+"""
+Async Property API for Beacon
+
+An asyncio (ASGI) version of property_api.py's search, property detail
+and MCP query endpoints. A request waiting on Supabase only holds a
+coroutine, not a worker thread, so one process can keep hundreds of slow
+upstream calls in flight. Supabase is reached through the async client,
+which talks to PostgREST over httpx.AsyncClient. Local-data queries are
+CPU-bound; they run on a small thread pool, and at most one query per
+thread runs at a time, with the rest waiting on the event loop.
+
+Query parsing, caching and serialization are shared with property_api.py,
+so responses are byte-for-byte the same:
+
+    hypercorn property_api_async:app --bind 0.0.0.0:5001
+"""
+
+import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, request, jsonify, Response
+from supabase import acreate_client
+import property_api
+from property_api import (
+    USE_LOCAL_DATA, SUPABASE_URL, SUPABASE_KEY, query_cache, query_cache_key,
+    apply_supabase_params, rpc_filter_args, facet_counts_from_rows, similarity_params,
+    parse_property_params, parse_projection, parse_facets, parse_property_query,
+    query_properties_from_local, query_facets_from_local, find_similar_in_snapshot,
+    search_response_body, property_response_body, mcp_response_body
+)
+from utils import profiling
+
+app = Quart(__name__)
+
+# Threads for local filtering; more would only contend for the same cores
+LOCAL_QUERY_THREADS = int(os.getenv('LOCAL_QUERY_THREADS', str(os.cpu_count() or 4)))
+local_executor = ThreadPoolExecutor(max_workers=LOCAL_QUERY_THREADS, thread_name_prefix='local-query')
+local_slots = None
+
+# Supabase requests in flight per process; the rest wait on the event loop
+ASYNC_SUPABASE_MAX_CONCURRENCY = int(os.getenv('ASYNC_SUPABASE_MAX_CONCURRENCY', '200'))
+supabase_slots = None
+
+# Created on startup, since the async client has to be awaited
+supabase = None
+
+# Requests in flight on the event loop; the continuous profiler samples the
+# loop thread while there are any
+requests_in_flight = 0
+
+@app.before_serving
+async def startup():
+    """Load the local snapshot or connect to Supabase"""
+    global supabase, local_slots, supabase_slots
+    local_slots = asyncio.Semaphore(LOCAL_QUERY_THREADS)
+    supabase_slots = asyncio.Semaphore(ASYNC_SUPABASE_MAX_CONCURRENCY)
+    if USE_LOCAL_DATA:
+        await asyncio.get_running_loop().run_in_executor(local_executor, property_api.create_app)
+    else:
+        supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+
+@app.before_request
+async def mark_loop_active():
+    """Have the continuous profiler sample the event loop thread while requests are in flight"""
+    global requests_in_flight
+    requests_in_flight += 1
+    profiling.active_threads.add(threading.get_ident())
+
+@app.teardown_request
+async def mark_loop_idle(exception=None):
+    global requests_in_flight
+    requests_in_flight -= 1
+    if requests_in_flight == 0:
+        profiling.active_threads.discard(threading.get_ident())
+
+def sampled(function, *args):
+    """Call function with the current pool thread marked for the continuous profiler"""
+    thread_id = threading.get_ident()
+    profiling.active_threads.add(thread_id)
+    try:
+        return function(*args)
+    finally:
+        profiling.active_threads.discard(thread_id)
+
+async def run_local(function, *args):
+    """Run a CPU-bound local query on the bounded thread pool"""
+    async with local_slots:
+        return await asyncio.get_running_loop().run_in_executor(local_executor, sampled, function, *args)
+
+async def execute(query):
+    """Execute a Supabase request, holding one of the upstream slots while it runs"""
+    async with supabase_slots:
+        return await query.execute()
+
+def json_bytes_response(body, status=200):
+    """Response for an already-serialized JSON body"""
+    return Response(body, status=status, mimetype='application/json')
+
+# Supabase access
+async def query_properties_from_supabase(params):
+    """Query properties from Supabase based on parameters"""
+    query = apply_supabase_params(supabase.table('properties').select('*'), params)
+    try:
+        response = await execute(query)
+        return response.data
+    except Exception as e:
+        print(f"Error querying Supabase: {e}")
+        return []
+
+async def facet_counts_from_supabase(params, facets):
+    """Facet counts via the property_facets RPC"""
+    response = await execute(supabase.rpc('property_facets', rpc_filter_args(params)))
+    return facet_counts_from_rows(response.data or [], facets)
+
+async def fetch_property_from_supabase(property_id):
+    """Fetch a single property row from Supabase"""
+    response = await execute(supabase.table('properties').select('*').eq('property_id', property_id).limit(1))
+    return response.data[0] if response.data else None
+
+async def fetch_similar_from_supabase(property_id, limit=3):
+    """Similar properties via the similar_properties RPC"""
+    response = await execute(supabase.rpc('similar_properties', {'target_id': int(property_id), 'max_results': limit}))
+    return response.data or []
+
+async def find_similar_from_supabase(property_id, target_property, limit=3):
+    """Similar properties by nearby price, size and borough, for when the RPC is not installed"""
+    similar = await query_properties_from_supabase(similarity_params(target_property, limit))
+    return [p for p in similar if str(p.get('property_id')) != str(property_id)][:limit]
+
+# Queries
+async def query_properties(params, current=None):
+    """Query properties from the active data source, serving repeats from the cache; local queries use the pinned snapshot"""
+    key = query_cache_key(params, current)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return list(cached)
+
+    generation = query_cache.generation
+    if USE_LOCAL_DATA:
+        properties = await run_local(query_properties_from_local, params, current)
+    else:
+        properties = await query_properties_from_supabase(params)
+
+    query_cache.put(key, properties, generation)
+    return list(properties)
+
+async def query_properties_with_facets(params, facets, current=None):
+    """Query properties and count facet values over all matches, serving repeats from the cache; local queries use the pinned snapshot"""
+    key = query_cache_key(dict(params, facets=facets), current)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return list(cached[0]), cached[1]
+
+    generation = query_cache.generation
+    if USE_LOCAL_DATA:
+        properties, counts = await run_local(query_facets_from_local, params, facets, current)
+    else:
+        properties, counts = await asyncio.gather(query_properties_from_supabase(params),
+                                                  facet_counts_from_supabase(params, facets),
+                                                  return_exceptions=True)
+        if isinstance(counts, Exception):
+            print(f"Error counting facets in Supabase: {counts}")
+            return properties, {facet: {} for facet in facets}
+
+    query_cache.put(key, (properties, counts), generation)
+    return list(properties), counts
+
+# API Routes
+@app.route('/api/properties', methods=['GET'])
+async def get_properties():
+    """Get properties based on query parameters"""
+    try:
+        params = parse_property_params(request.args)
+        view, fields = parse_projection(request.args)
+        facets = parse_facets(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    current = property_api.snapshot if USE_LOCAL_DATA else None
+
+    counts = None
+    if facets:
+        properties, counts = await query_properties_with_facets(params, facets, current)
+    else:
+        properties = await query_properties(params, current)
+
+    return json_bytes_response(search_response_body(params, properties, view, fields, current, counts))
+
+@app.route('/api/properties/<property_id>', methods=['GET'])
+async def get_property(property_id):
+    """Get a specific property by ID"""
+    try:
+        view, fields = parse_projection(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    current = None
+    if USE_LOCAL_DATA:
+        current = property_api.snapshot
+        property_data = current.store.get(property_id) if current else None
+        if not property_data:
+            return jsonify({"error": "Property not found"}), 404
+        similar_properties = await run_local(find_similar_in_snapshot, current, property_id)
+    else:
+        # Fetch the property and its similar properties concurrently
+        property_data, similar_properties = await asyncio.gather(
+            fetch_property_from_supabase(property_id),
+            fetch_similar_from_supabase(property_id),
+            return_exceptions=True
+        )
+        if isinstance(property_data, Exception):
+            print(f"Error fetching property from Supabase: {property_data}")
+            return jsonify({"error": "Failed to fetch property"}), 502
+        if not property_data:
+            return jsonify({"error": "Property not found"}), 404
+        if isinstance(similar_properties, Exception):
+            # RPC not installed (see sql/similar_properties.sql); reuse the fetched target
+            print(f"Error calling similar_properties RPC: {similar_properties}")
+            similar_properties = await find_similar_from_supabase(property_id, property_data)
+
+    return json_bytes_response(property_response_body(property_data, similar_properties, view, fields, current))
+
+@app.route('/api/mcp/property-query', methods=['POST'])
+async def property_query_mcp():
+    """Accept a natural language query and return property data in MCP format"""
+    data = await request.get_json(silent=True)
+
+    if not data or 'query' not in data:
+        return jsonify({"error": "Missing query parameter"}), 400
+
+    user_query = data['query']
+    params = parse_property_query(user_query)
+
+    current = property_api.snapshot if USE_LOCAL_DATA else None
+    properties = await query_properties(params, current)
+
+    return json_bytes_response(mcp_response_body(user_query, params, properties, current))
+
+if __name__ == '__main__':
+    if USE_LOCAL_DATA:
+        print(f"Running with local data from {property_api.LOCAL_DATA_FILE}")
+    else:
+        print(f"Connected to Supabase at {SUPABASE_URL}")
+
+    app.run(port=int(os.getenv('PORT', '5001')))
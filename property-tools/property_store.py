@@ -0,0 +1,1035 @@
+"""
+Columnar Property Store for Beacon
+
+Holds the cleaned property records as NumPy columns so the local query
+path in property_api.py can filter with boolean masks instead of scanning
+a list of dicts. Rows are only turned back into dicts for the results
+that are actually returned.
+
+A store can be saved as a columnar snapshot: a directory with one .npy
+file per array and a JSON manifest. Loading memory-maps the arrays, so
+startup does not depend on dataset size and worker processes share the
+same physical pages. Indexes built on top of the store (similar
+properties, address autocomplete) can be saved in the snapshot as extra
+arrays and mapped the same way.
+"""
+
+import os
+import json
+import time
+import shutil
+import bisect
+import numpy as np
+from query_planner import ColumnStats, Stage, combined_estimate
+
+# Low-cardinality text columns stored as dictionary-encoded codes
+CATEGORICAL_COLUMNS = [
+    'borough',
+    'property_type_detail',
+    'property_city',
+    'property_state',
+    'property_county',
+    'zoning_code',
+    'mls_status'
+]
+
+# Range filters accepted by the property API: (parameter, column, operator)
+RANGE_FILTERS = [
+    ('min_price', 'estimated_value', 'ge'),
+    ('max_price', 'estimated_value', 'le'),
+    ('min_bedrooms', 'bedroom_count', 'ge'),
+    ('min_bathrooms', 'bathroom_count', 'ge'),
+    ('min_sqft', 'total_building_area_square_feet', 'ge'),
+    ('max_sqft', 'total_building_area_square_feet', 'le'),
+    ('max_year_built', 'year_built', 'le')
+]
+
+# Numeric columns with a sorted secondary index
+SORTED_INDEX_COLUMNS = [
+    'estimated_value',
+    'bedroom_count',
+    'bathroom_count',
+    'total_building_area_square_feet',
+    'year_built'
+]
+
+# Categorical columns with one compressed bitmap per distinct value
+BITMAP_COLUMNS = [
+    'borough',
+    'property_type_detail',
+    'zoning_code',
+    'mls_status'
+]
+
+# Facets the search API can count: categorical facets reuse CATEGORY_FILTERS,
+# bedrooms are bucketed 0, 1, 2, ... with the last bucket open-ended
+FACETS = ['borough', 'property_type', 'zoning_code', 'mls_status', 'bedrooms']
+BEDROOM_BUCKETS = 5
+
+# Columns the stats endpoint can group by: (group name, column)
+GROUP_COLUMNS = {
+    'borough': 'borough',
+    'property_type': 'property_type_detail',
+    'zip': 'property_zip'
+}
+
+# Version of the columnar snapshot layout written by PropertyStore.save()
+SNAPSHOT_FORMAT = 1
+
+# IN-list filters accepted by the property API: (parameter, column)
+CATEGORY_FILTERS = [
+    ('borough', 'borough'),
+    ('property_type', 'property_type_detail'),
+    ('zoning_code', 'zoning_code'),
+    ('mls_status', 'mls_status')
+]
+
+
+def as_list(value):
+    """Wrap a scalar filter value in a list"""
+    return value if isinstance(value, list) else [value]
+
+
+def is_number(value):
+    """Check whether a value can live in a numeric column"""
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class PropertyStore:
+    """Column-oriented, read-only view of the property records"""
+
+    def __init__(self, size, columns):
+        self.size = size
+        self.columns = columns
+        self.numeric = {}        # column -> int64/float64 array
+        self.codes = {}          # column -> int32 codes into dictionaries[column]
+        self.dictionaries = {}   # column -> sorted list of distinct values
+        self.objects = {}        # column -> object array for free-text columns
+        self.nulls = {}          # column -> boolean null mask
+        self.id_index = {}       # str(property_id) -> row
+        self.sorted_indexes = {} # column -> SortedIndex
+        self.bitmap_indexes = {} # column -> BitmapIndex
+        self.zip_codes = None    # codes into zip_dictionary for each row's five-digit zip
+        self.zip_dictionary = []
+        self.column_stats = {}   # column -> ColumnStats, for the query planner
+        self.extras = {}         # name -> array saved with the snapshot by other indexes
+        self.extra_info = {}     # JSON settings saved with the extras
+        self._sort_keys = {}
+        self._sort_values = {}
+
+    @classmethod
+    def from_records(cls, records):
+        """Build a store from a list of property dicts"""
+        columns = []
+        seen = set()
+        for record in records:
+            for key in record:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+
+        return cls.from_columns({name: [record.get(name) for record in records] for name in columns})
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Build a store from {column: list of values}, all lists the same length"""
+        size = len(next(iter(columns.values()))) if columns else 0
+        store = cls(size, list(columns))
+        for name, values in columns.items():
+            store._add_column(name, values)
+        store._build_id_index(columns.get('property_id', [None] * size))
+        store._build_sorted_indexes()
+        store._build_bitmap_indexes()
+        store._build_zip_codes()
+        store._build_column_stats()
+        return store
+
+    def __len__(self):
+        return self.size
+
+    # Columnar snapshots
+    def save(self, path, extras=None, extra_info=None):
+        """
+        Write the store, its indexes and column stats as a columnar snapshot.
+
+        extras ({name: array}) and extra_info (JSON) are saved alongside
+        for indexes kept outside the store, and come back as store.extras
+        and store.extra_info. The snapshot is written next to path and then
+        moved into place, and the manifest is the last file written, so a
+        reader never sees a partial snapshot. The side directories are named
+        per process, so two writers never write into the same one.
+        """
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        shutil.rmtree(temp_path, ignore_errors=True)
+        os.makedirs(temp_path)
+
+        def write(name, array):
+            np.save(os.path.join(temp_path, f"{name}.npy"), np.ascontiguousarray(array))
+
+        kinds = {}
+        encodings = {}
+        for name in self.columns:
+            write(f"{name}.nulls", self.nulls[name])
+            if name in self.numeric:
+                kinds[name] = 'numeric'
+                write(name, self.numeric[name])
+            elif name in self.codes:
+                kinds[name] = 'codes'
+                write(f"{name}.codes", self.codes[name])
+            else:
+                kinds[name] = 'strings'
+                encodings[name], offsets, data = encode_strings(self.objects[name], self.nulls[name])
+                write(f"{name}.offsets", offsets)
+                write(f"{name}.data", data)
+
+        for name, index in self.sorted_indexes.items():
+            write(f"{name}.sorted_rows", index.rows)
+            write(f"{name}.sorted_values", index.values)
+        for name, index in self.bitmap_indexes.items():
+            write(f"{name}.bitmaps", np.stack([index.bitmaps[value] for value in self.dictionaries[name]])
+                  if self.dictionaries[name] else np.zeros((0, len(index.empty)), dtype=np.uint8))
+        write('zip_codes', self.zip_codes)
+        ids = sorted(self.id_index.items())
+        write('id_keys', np.array([key for key, _ in ids], dtype=str))
+        write('id_rows', np.array([row for _, row in ids], dtype=np.intp))
+        extras = extras or {}
+        for name, array in extras.items():
+            write(f"extra.{name}", array)
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "size": self.size,
+            "columns": self.columns,
+            "kinds": kinds,
+            "encodings": encodings,
+            "dictionaries": self.dictionaries,
+            "zip_dictionary": self.zip_dictionary,
+            "sorted_indexes": list(self.sorted_indexes),
+            "bitmap_indexes": list(self.bitmap_indexes),
+            "column_stats": {name: stats.to_json() for name, stats in self.column_stats.items()},
+            "extras": list(extras),
+            "extra_info": extra_info or {}
+        }
+        with open(os.path.join(temp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f)
+
+        old_path = f"{path}.{os.getpid()}.old"
+        shutil.rmtree(old_path, ignore_errors=True)
+        if os.path.exists(path):
+            os.rename(path, old_path)
+        os.rename(temp_path, path)
+        shutil.rmtree(old_path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, path):
+        """Open a columnar snapshot written by save(), memory-mapping its arrays"""
+        with open(os.path.join(path, 'manifest.json'), 'r') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format {manifest.get('format')} in {path}")
+
+        def read(name):
+            return load_array(os.path.join(path, f"{name}.npy"))
+
+        store = cls(manifest['size'], manifest['columns'])
+        for name, kind in manifest['kinds'].items():
+            store.nulls[name] = read(f"{name}.nulls")
+            if kind == 'numeric':
+                store.numeric[name] = read(name)
+            elif kind == 'codes':
+                store.codes[name] = read(f"{name}.codes")
+                store.dictionaries[name] = manifest['dictionaries'][name]
+            else:
+                store.objects[name] = StringColumn(read(f"{name}.offsets"), read(f"{name}.data"),
+                                                   manifest['encodings'][name])
+
+        for name in manifest['sorted_indexes']:
+            store.sorted_indexes[name] = SortedIndex.from_arrays(
+                read(f"{name}.sorted_rows"), read(f"{name}.sorted_values"), store.nulls[name])
+        for name in manifest['bitmap_indexes']:
+            store.bitmap_indexes[name] = BitmapIndex.from_array(read(f"{name}.bitmaps"), store.dictionaries[name], store.size)
+        store.zip_codes = read('zip_codes')
+        store.zip_dictionary = manifest['zip_dictionary']
+        store.id_index = IdIndex(read('id_keys'), read('id_rows'))
+        store.column_stats = {name: ColumnStats.from_json(stats) for name, stats in manifest['column_stats'].items()}
+        # Snapshots written before extras existed have none
+        store.extras = {name: read(f"extra.{name}") for name in manifest.get('extras', [])}
+        store.extra_info = manifest.get('extra_info', {})
+        return store
+
+    def _add_column(self, name, values):
+        """Store one column using the most compact representation"""
+        nulls = np.fromiter((v is None for v in values), dtype=bool, count=self.size)
+        present = [v for v in values if v is not None]
+        self.nulls[name] = nulls
+
+        if all(is_number(v) for v in present) and name not in CATEGORICAL_COLUMNS:
+            dtype = np.int64 if all(isinstance(v, int) for v in present) else np.float64
+            column = np.fromiter((0 if v is None else v for v in values), dtype=dtype, count=self.size)
+            self.numeric[name] = column
+        elif name in CATEGORICAL_COLUMNS:
+            dictionary = sorted(set(present), key=str)
+            lookup = {value: code for code, value in enumerate(dictionary)}
+            codes = np.fromiter((-1 if v is None else lookup[v] for v in values), dtype=np.int32, count=self.size)
+            self.dictionaries[name] = dictionary
+            self.codes[name] = codes
+        else:
+            column = np.empty(self.size, dtype=object)
+            column[:] = values
+            self.objects[name] = column
+
+    def _build_id_index(self, property_ids):
+        """Map each property_id to its row; the first occurrence wins"""
+        for row, property_id in enumerate(property_ids):
+            self.id_index.setdefault(str(property_id), row)
+
+    def _build_sorted_indexes(self):
+        """Sort the range-filtered numeric columns once so filters become slices"""
+        for name in SORTED_INDEX_COLUMNS:
+            if name in self.numeric:
+                self.sorted_indexes[name] = SortedIndex(self.numeric[name], self.nulls[name])
+
+    def _build_bitmap_indexes(self):
+        """Build a packed bitmap per distinct value of the low-cardinality columns"""
+        for name in BITMAP_COLUMNS:
+            if name in self.codes:
+                self.bitmap_indexes[name] = BitmapIndex(self.codes[name], self.dictionaries[name])
+
+    # Row access
+    def _build_zip_codes(self):
+        """Dictionary-encode the five-digit prefix of property_zip, which may mix ZIP and ZIP+4"""
+        self.zip_codes = np.full(self.size, -1, dtype=np.int32)
+        if 'property_zip' not in self.nulls:
+            return
+        present = ~self.nulls['property_zip']
+        if 'property_zip' in self.numeric:
+            values = self.numeric['property_zip'][present]
+        elif 'property_zip' in self.codes:
+            values = np.asarray(self.dictionaries['property_zip'], dtype=object)[self.codes['property_zip'][present]]
+        else:
+            values = self.objects['property_zip'][present]
+        dictionary, inverse = np.unique(np.array([str(value)[:5] for value in values], dtype=str), return_inverse=True)
+        self.zip_codes[present] = inverse
+        self.zip_dictionary = dictionary.tolist()
+
+    def _build_column_stats(self):
+        """Gather histograms, value counts and distinct counts for the planner"""
+        for name in self.numeric:
+            self.column_stats[name] = ColumnStats.numeric(self.numeric[name], self.nulls[name])
+        for name in self.codes:
+            self.column_stats[name] = ColumnStats.categorical(self.codes[name], len(self.dictionaries[name]))
+        self.column_stats['zip_code'] = ColumnStats.categorical(self.zip_codes, len(self.zip_dictionary))
+
+    def find_row(self, property_id):
+        """Row index for a property_id, or None if it is not in the store"""
+        return self.id_index.get(str(property_id))
+
+    def get(self, property_id):
+        """Look up a single property by id"""
+        row = self.find_row(property_id)
+        return self.row(row) if row is not None else None
+
+    def row(self, index):
+        """Materialize a single row as a dict"""
+        record = {}
+        for name in self.columns:
+            if self.nulls[name][index]:
+                record[name] = None
+            elif name in self.numeric:
+                record[name] = self.numeric[name][index].item()
+            elif name in self.codes:
+                record[name] = self.dictionaries[name][self.codes[name][index]]
+            else:
+                record[name] = self.objects[name][index]
+        return record
+
+    def rows(self, indexes):
+        """Materialize several rows as dicts"""
+        return [self.row(i) for i in indexes]
+
+    # Predicates
+    def range_mask(self, column, op, value, rows=None):
+        """Boolean mask for a numeric comparison; nulls never match"""
+        size = self.size if rows is None else len(rows)
+        if column not in self.numeric:
+            return np.zeros(size, dtype=bool)
+        data = gather(self.numeric[column], rows)
+        matches = data >= value if op == 'ge' else data <= value
+        return matches & ~gather(self.nulls[column], rows)
+
+    def isin_mask(self, column, values, rows=None):
+        """Boolean mask for an IN-list over a categorical column"""
+        size = self.size if rows is None else len(rows)
+        if column not in self.codes:
+            return np.zeros(size, dtype=bool)
+        lookup = {value: code for code, value in enumerate(self.dictionaries[column])}
+        wanted = [lookup[v] for v in values if v in lookup]
+        return np.isin(gather(self.codes[column], rows), wanted)
+
+    def zip_mask(self, zip_codes, rows=None):
+        """Rows whose five-digit zip is in zip_codes"""
+        lookup = {value: code for code, value in enumerate(self.zip_dictionary)}
+        wanted = [lookup[str(value)[:5]] for value in zip_codes if str(value)[:5] in lookup]
+        return np.isin(gather(self.zip_codes, rows), wanted)
+
+    def filter_mask(self, params, rows=None, skip=(), seek=None):
+        """
+        Combine all filters in params into one boolean mask.
+
+        With rows given, the mask is computed over just those rows; range
+        filters on columns in skip are assumed to hold already. seek, from
+        seek_position(), also drops rows at or before a pagination cursor.
+        """
+        if rows is None:
+            bitmap = self.category_bitmap(params)
+            mask = np.ones(self.size, dtype=bool) if bitmap is None else unpack(bitmap, self.size)
+        else:
+            mask = np.ones(len(rows), dtype=bool)
+
+        for param, column in CATEGORY_FILTERS:
+            if params.get(param) and (rows is not None or column not in self.bitmap_indexes):
+                mask &= self.isin_mask(column, as_list(params[param]), rows)
+
+        if params.get('zip_code'):
+            mask &= self.zip_mask(as_list(params['zip_code']), rows)
+
+        for param, column, op in RANGE_FILTERS:
+            if params.get(param) and column not in skip:
+                if not mask.any():
+                    return mask
+                mask &= self.range_mask(column, op, params[param], rows)
+
+        if seek is not None:
+            mask &= self.after_mask(seek, rows)
+
+        return mask
+
+    def seek_position(self, after, sort_by, descending):
+        """
+        Translate a cursor's (sort value, property_id) into a position in sort order.
+
+        Returns (sort_by, descending, key, row) where key is the value on the
+        sort_keys() scale, or None when the last row had no value.
+        """
+        value, property_id = after
+        row = self.find_row(property_id)
+        if row is None:
+            # The row is gone; skip its whole tie group rather than repeat rows
+            row = self.size
+        if value is None or sort_by not in self.nulls:
+            return (sort_by, descending, None, row)
+        if sort_by in self.numeric:
+            return (sort_by, descending, value, row)
+
+        # Text columns: locate the value among the sorted distinct values
+        distinct = self.sort_values(sort_by)
+        position = bisect.bisect_left(distinct, str(value))
+        if position < len(distinct) and distinct[position] == str(value):
+            return (sort_by, descending, position, row)
+        return (sort_by, descending, position - 0.5, row)
+
+    def after_mask(self, seek, rows=None):
+        """Boolean mask of rows that come strictly after a seek position"""
+        sort_by, descending, key, after_row = seek
+        row_ids = np.arange(self.size) if rows is None else rows
+        if sort_by not in self.nulls:
+            return row_ids > after_row
+
+        nulls = gather(self.nulls[sort_by], rows)
+        if key is None:
+            later_nulls = nulls & (row_ids > after_row)
+            return later_nulls | ~nulls if descending else later_nulls
+
+        keys = gather(self.sort_keys(sort_by), rows)
+        past = keys < key if descending else keys > key
+        mask = ~nulls & (past | ((keys == key) & (row_ids > after_row)))
+        return mask if descending else mask | nulls
+
+    def category_bitmap(self, params):
+        """
+        AND together the bitmap-indexed IN-list filters in params.
+
+        Returns a packed bitmap, or None when no such filter is present.
+        """
+        bitmap = None
+        for param, column in CATEGORY_FILTERS:
+            if params.get(param) and column in self.bitmap_indexes:
+                matches = self.bitmap_indexes[column].any_of(as_list(params[param]))
+                bitmap = matches if bitmap is None else bitmap & matches
+        return bitmap
+
+    def range_bounds(self, params):
+        """Collect the range filters in params as {column: (low, high)}"""
+        bounds = {}
+        for param, column, op in RANGE_FILTERS:
+            if params.get(param):
+                low, high = bounds.get(column, (None, None))
+                if op == 'ge':
+                    low = params[param] if low is None else max(low, params[param])
+                else:
+                    high = params[param] if high is None else min(high, params[param])
+                bounds[column] = (low, high)
+        return bounds
+
+    # Sorting
+    def sort_keys(self, column):
+        """Numeric sort keys for a column (codes are already in value order)"""
+        if column not in self._sort_keys:
+            if column in self.numeric:
+                keys = self.numeric[column]
+            elif column in self.codes:
+                keys = self.codes[column]
+            else:
+                present = ~self.nulls[column]
+                keys = np.zeros(self.size, dtype=np.int64)
+                distinct, ranks = np.unique(self.objects[column][present].astype(str), return_inverse=True)
+                keys[present] = ranks
+                self._sort_values[column] = distinct.tolist()
+            self._sort_keys[column] = keys
+        return self._sort_keys[column]
+
+    def sort_values(self, column):
+        """Distinct values of a text column as strings, in sort-key order"""
+        if column in self.codes:
+            return [str(value) for value in self.dictionaries[column]]
+        self.sort_keys(column)
+        return self._sort_values[column]
+
+    def sort_rows(self, rows, sort_by, descending):
+        """
+        Order row indexes by a column.
+
+        Matches the ordering of the original list-based implementation:
+        nulls come first when descending and last when ascending, and
+        ties are broken by row order.
+        """
+        if len(rows) == 0:
+            return rows
+        if sort_by not in self.nulls:
+            return np.sort(rows)
+        keys = self.sort_keys(sort_by)[rows]
+        nulls = self.nulls[sort_by][rows]
+        if descending:
+            order = np.lexsort((rows, -keys, ~nulls))
+        else:
+            order = np.lexsort((rows, keys, nulls))
+        return rows[order]
+
+    def top_k(self, rows, sort_by, descending, limit):
+        """Return the first `limit` rows in sort order without sorting all of them"""
+        if limit <= 0 or len(rows) <= limit or sort_by not in self.nulls:
+            return self.sort_rows(rows, sort_by, descending)[:limit]
+
+        # Lower score sorts first; nulls lead when descending and trail when ascending
+        scores = self.sort_keys(sort_by)[rows].astype(np.float64)
+        nulls = self.nulls[sort_by][rows]
+        if descending:
+            scores = -scores
+            scores[nulls] = -np.inf
+        else:
+            scores[nulls] = np.inf
+
+        threshold = np.partition(scores, limit - 1)[limit - 1]
+        selected = rows[scores <= threshold]
+        return self.sort_rows(selected, sort_by, descending)[:limit]
+
+    def walk_sorted_index(self, params, stages, bounds, sort_by, descending, limit, seek=None, trace=None):
+        """
+        Find the top `limit` rows by scanning the sort column's index in order.
+
+        Rows are checked against the remaining stages in growing chunks, so
+        the scan stops as soon as enough matches are found instead of
+        touching every row. With a seek position the scan starts at the
+        cursor instead of the top of the index. Per-stage row counts and
+        timings, summed over the chunks, go into trace when given.
+        """
+        started = time.perf_counter()
+        index = self.sorted_indexes[sort_by]
+        low, high = bounds.get(sort_by, (None, None))
+        null_rows = index.null_rows
+        if seek is not None:
+            key, after_row = seek[2], seek[3]
+            if key is None:
+                null_rows = null_rows[np.searchsorted(null_rows, after_row, side='right'):]
+            elif descending:
+                high = key if high is None else min(high, key)
+            else:
+                low = key if low is None else max(low, key)
+
+        ordered = index.range(low, high)
+        if seek is not None and seek[2] is None and not descending:
+            # Past the last value: only nulls are left
+            ordered = ordered[:0]
+        if descending:
+            ordered = ordered[::-1]
+
+        segments = [ordered]
+        if sort_by not in bounds:
+            segments = [null_rows, ordered] if descending else [ordered, null_rows]
+
+        # The walk itself applies the range on the sort column
+        walked = [position for position, stage in enumerate(stages)
+                  if stage.kind == 'range' and stage.column == sort_by]
+        remaining = [(position, stage) for position, stage in enumerate(stages) if position not in walked]
+        if trace is not None:
+            tallies = {position: [0, 0.0] for position, _ in remaining}
+            seek_tally = [0, 0.0]
+            walk_ms = elapsed_ms(started)
+
+        skip = (sort_by,)
+        found = []
+        count = 0
+        scanned = 0
+        chunk = max(limit * 4, 256)
+        for segment in segments:
+            start = 0
+            while start < len(segment) and count < limit:
+                part = segment[start:start + chunk]
+                scanned += len(part)
+                for position, stage in remaining:
+                    if len(part) == 0:
+                        break
+                    stage_started = time.perf_counter()
+                    part = part[self.stage_mask(stage, part)]
+                    if trace is not None:
+                        tallies[position][0] += len(part)
+                        tallies[position][1] += time.perf_counter() - stage_started
+                if seek is not None and len(part):
+                    stage_started = time.perf_counter()
+                    part = part[self.after_mask(seek, part)]
+                    if trace is not None:
+                        seek_tally[0] += len(part)
+                        seek_tally[1] += time.perf_counter() - stage_started
+                found.append(part)
+                count += len(part)
+                start += chunk
+                chunk *= 2
+            if count >= limit:
+                break
+        if trace is not None:
+            trace.update(scanned_rows=scanned, matched_rows=count)
+            for position in walked:
+                trace['stages'][position].update(access="index_walk", rows=scanned, ms=walk_ms)
+            for position, (rows, seconds) in tallies.items():
+                trace['stages'][position].update(access="filter", rows=int(rows), ms=round(seconds * 1000, 3))
+            if seek is not None:
+                trace['stages'].append({"predicate": "after cursor", "access": "filter",
+                                        "rows": int(seek_tally[0]), "ms": round(seek_tally[1] * 1000, 3)})
+
+        matches = np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+        if count > limit or (count == limit and not self.nulls[sort_by][matches[-1]]):
+            # Pull in the whole tie group at the boundary so ties resolve by row order
+            matches = matches[:limit]
+            boundary = matches[-1]
+            if not self.nulls[sort_by][boundary]:
+                value = self.numeric[sort_by][boundary]
+                block = index.block(value)
+                block = block[self.filter_mask(params, block, skip, seek)]
+                keep = self.nulls[sort_by][matches] | (self.numeric[sort_by][matches] != value)
+                matches = np.concatenate([matches[keep], block])
+
+        sort_started = time.perf_counter()
+        matches = self.sort_rows(matches, sort_by, descending)[:limit]
+        if trace is not None:
+            trace["sort"] = {"column": sort_by, "descending": descending, "limit": limit,
+                             "ms": elapsed_ms(sort_started)}
+        return matches
+
+    # Planning
+    def plan(self, params):
+        """The filters in params as stages, most selective first by estimated row count"""
+        stages = []
+        for param, column in CATEGORY_FILTERS:
+            if params.get(param) and column in self.codes:
+                lookup = {value: code for code, value in enumerate(self.dictionaries[column])}
+                codes = [lookup[v] for v in as_list(params[param]) if v in lookup]
+                access = 'bitmap' if column in self.bitmap_indexes else 'scan'
+                stages.append(Stage('in', column, codes, self.column_stats[column].estimate_in(codes), access))
+            elif params.get(param):
+                stages.append(Stage('in', column, [], 0, 'scan'))
+
+        if params.get('zip_code'):
+            lookup = {value: code for code, value in enumerate(self.zip_dictionary)}
+            codes = [lookup[str(z)[:5]] for z in as_list(params['zip_code']) if str(z)[:5] in lookup]
+            stages.append(Stage('zip', 'zip_code', codes, self.column_stats['zip_code'].estimate_in(codes), 'scan'))
+
+        for column, (low, high) in self.range_bounds(params).items():
+            stats = self.column_stats.get(column)
+            estimate = stats.estimate_range(low, high) if stats else 0
+            access = 'sorted_index' if column in self.sorted_indexes else 'scan'
+            stages.append(Stage('range', column, (low, high), estimate, access))
+
+        return sorted(stages, key=lambda stage: stage.estimate)
+
+    def stage_rows(self, stage):
+        """Rows matching a stage run first, read through its index where it has one"""
+        if stage.kind == 'range':
+            low, high = stage.argument
+            if stage.column in self.sorted_indexes:
+                return self.sorted_indexes[stage.column].range(low, high)
+            return np.flatnonzero(self.stage_mask(stage))
+        if stage.kind == 'in' and stage.column in self.bitmap_indexes:
+            values = [self.dictionaries[stage.column][code] for code in stage.argument]
+            return np.flatnonzero(unpack(self.bitmap_indexes[stage.column].any_of(values), self.size))
+        return np.flatnonzero(self.stage_mask(stage))
+
+    def stage_mask(self, stage, rows=None):
+        """Boolean mask of the rows (all rows when None) matching a stage"""
+        if stage.kind == 'range':
+            low, high = stage.argument
+            mask = np.ones(self.size if rows is None else len(rows), dtype=bool)
+            if low is not None:
+                mask &= self.range_mask(stage.column, 'ge', low, rows)
+            if high is not None:
+                mask &= self.range_mask(stage.column, 'le', high, rows)
+            return mask
+        codes = self.zip_codes if stage.kind == 'zip' else self.codes.get(stage.column)
+        if codes is None:
+            return np.zeros(self.size if rows is None else len(rows), dtype=bool)
+        return np.isin(gather(codes, rows), stage.argument)
+
+    def run_stages(self, stages, seek=None, trace=None):
+        """
+        Apply stages in order: the first reads its index, each later one only
+        filters the rows left so far, and execution stops early once no rows
+        remain. Per-stage row counts and timings go into trace when given.
+        """
+        rows = None
+        for position, stage in enumerate(stages):
+            started = time.perf_counter()
+            rows = self.stage_rows(stage) if rows is None else rows[self.stage_mask(stage, rows)]
+            if trace is not None:
+                trace['stages'][position].update(rows=int(len(rows)), ms=elapsed_ms(started))
+            if len(rows) == 0:
+                return rows
+
+        if rows is None:
+            rows = np.arange(self.size)
+        if seek is not None:
+            started = time.perf_counter()
+            rows = rows[self.after_mask(seek, rows)]
+            if trace is not None:
+                trace['stages'].append({"predicate": "after cursor", "access": "filter",
+                                        "rows": int(len(rows)), "ms": elapsed_ms(started)})
+        return rows
+
+    def select_rows(self, params, trace=None):
+        """
+        Row indexes matching params, sorted and limited.
+
+        Pass a dict as trace to have it filled with the chosen plan: the
+        strategy, each stage's estimated and actual row counts, and timings.
+        """
+        started = time.perf_counter()
+        sort_by = params.get('sort_by', 'estimated_value')
+        descending = params.get('sort_direction', 'desc').lower() == 'desc'
+        limit = params.get('limit', 10)
+        seek = self.seek_position(params['after'], sort_by, descending) if params.get('after') else None
+
+        stages = self.plan(params)
+        estimate = combined_estimate(stages, self.size)
+        if trace is not None:
+            trace.update(estimated_rows=estimate, stages=[
+                {"predicate": stage.predicate(self), "access": stage.access, "estimated_rows": stage.estimate}
+                for stage in stages
+            ])
+
+        # Walk the sort column's index when reaching `limit` matches that way
+        # should touch fewer rows than the most selective filter returns
+        if limit > 0 and sort_by in self.sorted_indexes:
+            bounds = self.range_bounds(params)
+            walk_size = len(self.sorted_indexes[sort_by].range(*bounds[sort_by])) if sort_by in bounds else self.size
+            expected_scan = walk_size if estimate == 0 else min(walk_size, limit * walk_size / estimate)
+            if not stages or expected_scan < stages[0].estimate:
+                if trace is not None:
+                    trace.update(strategy="index_walk", walk_rows=walk_size, expected_scan=int(expected_scan))
+                rows = self.walk_sorted_index(params, stages, bounds, sort_by, descending, limit, seek, trace)
+                if trace is not None:
+                    trace["ms"] = elapsed_ms(started)
+                return rows
+
+        if trace is not None:
+            trace["strategy"] = "filter_then_top_k"
+        rows = self.run_stages(stages, seek, trace)
+
+        sort_started = time.perf_counter()
+        rows = self.top_k(rows, sort_by, descending, limit)
+        if trace is not None:
+            trace["sort"] = {"column": sort_by, "descending": descending, "limit": limit,
+                             "ms": elapsed_ms(sort_started)}
+            trace["ms"] = elapsed_ms(started)
+        return rows
+
+    def query(self, params, trace=None):
+        """Filter, sort and limit, returning the matching rows as dicts"""
+        return self.rows(self.select_rows(params, trace))
+
+    # Faceted search
+    def query_with_facets(self, params, facets):
+        """
+        Like query(), also returning facet counts from the same filter pass.
+
+        Counts cover every row matching the filters, not just the returned
+        page, and ignore the pagination cursor so they stay stable across pages.
+        """
+        sort_by = params.get('sort_by', 'estimated_value')
+        descending = params.get('sort_direction', 'desc').lower() == 'desc'
+        rows = np.flatnonzero(self.filter_mask(params))
+        counts = self.facet_values(facets, rows)
+
+        if params.get('after'):
+            rows = rows[self.after_mask(self.seek_position(params['after'], sort_by, descending), rows)]
+        return self.rows(self.top_k(rows, sort_by, descending, params.get('limit', 10))), counts
+
+    def facet_values(self, facets, rows):
+        """{facet: {value: count}} over rows, values ordered by count, empty values omitted"""
+        categories = dict(CATEGORY_FILTERS)
+        result = {}
+        for facet in facets:
+            if facet == 'bedrooms':
+                result[facet] = self.bedroom_buckets(rows)
+                continue
+            column = categories[facet]
+            if column not in self.codes:
+                result[facet] = {}
+                continue
+            codes = self.codes[column][rows]
+            counts = np.bincount(codes[codes >= 0], minlength=len(self.dictionaries[column]))
+            order = np.argsort(-counts, kind='stable')
+            result[facet] = {self.dictionaries[column][code]: int(counts[code]) for code in order if counts[code]}
+        return result
+
+    def bedroom_buckets(self, rows):
+        """Row counts per bedroom count, with BEDROOM_BUCKETS and above in one bucket"""
+        labels = [str(n) for n in range(BEDROOM_BUCKETS)] + [f"{BEDROOM_BUCKETS}+"]
+        if 'bedroom_count' not in self.numeric:
+            return dict.fromkeys(labels, 0)
+        values = self.numeric['bedroom_count'][rows][~self.nulls['bedroom_count'][rows]]
+        buckets = np.clip(np.floor(values), 0, BEDROOM_BUCKETS).astype(np.intp)
+        return dict(zip(labels, np.bincount(buckets, minlength=len(labels)).tolist()))
+
+    # Aggregation
+    def group_codes(self, group_by, rows):
+        """(codes, dictionary) grouping rows, code -1 for nulls; zip codes group by their first five digits"""
+        column = GROUP_COLUMNS[group_by]
+        if group_by == 'zip':
+            return self.zip_codes[rows], self.zip_dictionary
+        if column not in self.codes:
+            return np.full(len(rows), -1, dtype=np.int32), []
+        return self.codes[column][rows], self.dictionaries[column]
+
+    def aggregate(self, params, columns, group_by=None, percentiles=(10, 25, 50, 75, 90), bins=10):
+        """
+        Summary statistics for numeric columns over the rows matching params.
+
+        Returns {"row_count", "stats": {column: summary}} plus, when group_by
+        is given, "groups": {label: {"row_count", "stats"}}.
+        """
+        rows = np.flatnonzero(self.filter_mask(params))
+        result = {
+            "row_count": int(len(rows)),
+            "stats": {column: self.describe_column(column, rows, percentiles, bins) for column in columns}
+        }
+
+        if group_by:
+            codes, dictionary = self.group_codes(group_by, rows)
+            present = codes >= 0
+            counts = np.bincount(codes[present], minlength=len(dictionary))
+            order = np.argsort(codes[present], kind='stable')
+            groups = np.split(rows[present][order], np.cumsum(counts)[:-1])
+            result["groups"] = {}
+            for code, group_rows in enumerate(groups):
+                if len(group_rows):
+                    result["groups"][str(dictionary[code])] = {
+                        "row_count": int(len(group_rows)),
+                        "stats": {column: self.describe_column(column, group_rows, percentiles, bins) for column in columns}
+                    }
+
+        return result
+
+    def describe_column(self, column, rows, percentiles, bins):
+        """Statistics for the non-null values of one numeric column"""
+        if column not in self.numeric:
+            return describe_values(np.empty(0), percentiles, bins)
+        values = self.numeric[column][rows]
+        values = values[~self.nulls[column][rows]].astype(np.float64)
+        return describe_values(values, percentiles, bins)
+
+
+class SortedIndex:
+    """Row ids of a numeric column ordered by value, for range scans"""
+
+    def __init__(self, values, nulls):
+        present = np.flatnonzero(~nulls)
+        order = np.argsort(values[present], kind='stable')
+        self.rows = present[order]
+        self.values = values[self.rows]
+        self.null_rows = np.flatnonzero(nulls)
+
+    @classmethod
+    def from_arrays(cls, rows, values, nulls):
+        """An index whose sorted rows and values were saved in a snapshot"""
+        index = cls.__new__(cls)
+        index.rows = rows
+        index.values = values
+        index.null_rows = np.flatnonzero(nulls)
+        return index
+
+    def range(self, low=None, high=None):
+        """Rows with low <= value <= high, in ascending value order"""
+        start = 0 if low is None else np.searchsorted(self.values, low, side='left')
+        end = len(self.values) if high is None else np.searchsorted(self.values, high, side='right')
+        return self.rows[start:max(start, end)]
+
+    def block(self, value):
+        """Rows whose value equals value exactly"""
+        return self.range(value, value)
+
+
+class BitmapIndex:
+    """Packed bitmaps, one per distinct value of a dictionary-encoded column"""
+
+    def __init__(self, codes, dictionary):
+        self.empty = np.zeros((len(codes) + 7) // 8, dtype=np.uint8)
+        self.bitmaps = {value: np.packbits(codes == code) for code, value in enumerate(dictionary)}
+
+    @classmethod
+    def from_array(cls, bitmaps, dictionary, size):
+        """An index over saved bitmaps, one row of the 2-D array per dictionary value"""
+        index = cls.__new__(cls)
+        index.empty = np.zeros((size + 7) // 8, dtype=np.uint8)
+        index.bitmaps = {value: bitmaps[code] for code, value in enumerate(dictionary)}
+        return index
+
+    def any_of(self, values):
+        """OR together the bitmaps for an IN-list; unknown values match nothing"""
+        bitmap = self.empty.copy()
+        for value in values:
+            if value in self.bitmaps:
+                bitmap |= self.bitmaps[value]
+        return bitmap
+
+
+class StringColumn:
+    """
+    Read-only text column of a loaded snapshot: UTF-8 bytes for all rows
+    back to back, with offsets[row]:offsets[row + 1] spanning each value.
+
+    Values are decoded on access. Columns whose values were not all
+    strings (zip codes mix str and int) hold each value JSON-encoded so
+    the original type comes back.
+    """
+
+    def __init__(self, offsets, data, encoding):
+        self.offsets = offsets
+        self.data = data
+        self.decode = json.loads if encoding == 'json' else str
+        self.size = len(offsets) - 1
+
+    def __len__(self):
+        return self.size
+
+    def value(self, row):
+        """Decoded value of one row; nulls come back as empty strings, callers check the null mask"""
+        raw = self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode('utf-8')
+        if not raw:
+            return raw
+        return self.decode(raw)
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.value(int(key))
+        rows = np.arange(self.size)[key]
+        column = np.empty(len(rows), dtype=object)
+        column[:] = [self.value(row) for row in rows.tolist()]
+        return column
+
+
+class IdIndex:
+    """
+    Read-only property_id -> row mapping of a loaded snapshot, kept as
+    sorted key and row arrays instead of a dict so it needs no building.
+    """
+
+    def __init__(self, keys, rows):
+        self.keys = keys
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, key, default=None):
+        position = np.searchsorted(self.keys, key)
+        if position < len(self.keys) and self.keys[position] == key:
+            return int(self.rows[position])
+        return default
+
+    def __getitem__(self, key):
+        row = self.get(key)
+        if row is None:
+            raise KeyError(key)
+        return row
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def items(self):
+        return zip(self.keys.tolist(), self.rows.tolist())
+
+
+def encode_strings(values, nulls):
+    """
+    (encoding, offsets, data) for a text column; see StringColumn.
+
+    Nulls are stored as empty values. Columns holding anything besides
+    strings are JSON-encoded.
+    """
+    present = [value for value, null in zip(values, nulls) if not null]
+    encoding = 'utf8' if all(isinstance(value, str) for value in present) else 'json'
+    encode = str if encoding == 'utf8' else json.dumps
+    chunks = [b'' if null else encode(value).encode('utf-8') for value, null in zip(values, nulls)]
+    offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+    np.cumsum([len(chunk) for chunk in chunks], out=offsets[1:])
+    return encoding, offsets, np.frombuffer(b''.join(chunks), dtype=np.uint8)
+
+
+def load_array(path):
+    """Memory-map a saved array read-only (empty arrays, which can't be mapped, are read)"""
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        return np.load(path)
+
+
+def describe_values(values, percentiles, bins):
+    """count/min/max/mean/median, percentiles and an equal-width histogram of an array"""
+    if len(values) == 0:
+        return {"count": 0, "min": None, "max": None, "mean": None, "median": None,
+                "percentiles": {str(p): None for p in percentiles}, "histogram": None}
+
+    quantiles = np.percentile(values, [50] + list(percentiles))
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        "count": int(len(values)),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "mean": float(values.mean()),
+        "median": float(quantiles[0]),
+        "percentiles": {str(p): float(q) for p, q in zip(percentiles, quantiles[1:])},
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()}
+    }
+
+
+def unpack(bitmap, size):
+    """Expand a packed bitmap into a boolean mask"""
+    return np.unpackbits(bitmap, count=size).view(bool)
+
+
+def elapsed_ms(started):
+    """Milliseconds since a time.perf_counter() reading, rounded for reports"""
+    return round((time.perf_counter() - started) * 1000, 3)
+
+
+def gather(array, rows):
+    """Select rows from a column, or the whole column when rows is None"""
+    return array if rows is None else array[rows]
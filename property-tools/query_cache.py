@@ -0,0 +1,135 @@
+"""
+Query Result Cache for Beacon
+
+Caches property query results keyed on a canonical form of the query
+parameters, with LRU and TTL eviction. property_api.py invalidates the
+cache whenever the backing dataset is reloaded.
+
+Each process keeps its own entries, but the invalidation count lives in
+shared memory: a cache created before a preforking server forks drops
+the entries of every worker when any one of them is invalidated.
+"""
+
+import time
+import threading
+import multiprocessing
+from collections import OrderedDict
+
+# Defaults applied by both query backends
+QUERY_DEFAULTS = {
+    'sort_by': 'estimated_value',
+    'sort_direction': 'desc',
+    'limit': 10
+}
+
+LIST_PARAMS = ['borough', 'property_type', 'zoning_code', 'mls_status', 'zip_code']
+NUMBER_PARAMS = ['min_price', 'max_price', 'min_bedrooms', 'min_bathrooms', 'min_sqft', 'max_sqft', 'max_year_built']
+
+
+def canonical_params(params):
+    """
+    Build a hashable cache key for a params dict.
+
+    Lists are sorted and de-duplicated, numbers coerced to float, defaults
+    filled in and empty filters dropped, so equivalent queries share a key.
+    """
+    canonical = dict(QUERY_DEFAULTS)
+    for key, value in params.items():
+        if key in LIST_PARAMS:
+            values = value if isinstance(value, list) else [value]
+            value = tuple(sorted({str(v) for v in values if v is not None}))
+        elif key in NUMBER_PARAMS:
+            value = float(value) if value else None
+        elif key == 'limit':
+            value = int(value)
+        elif key == 'sort_direction':
+            value = str(value).lower()
+        elif isinstance(value, list):
+            value = tuple(value)
+        canonical[key] = value
+    return tuple(sorted((k, v) for k, v in canonical.items() if v not in (None, ())))
+
+
+class QueryCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters"""
+
+    def __init__(self, max_entries=1024, ttl_seconds=300):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        # Invalidations across all processes sharing this cache, and the count this one has applied
+        self._shared_invalidations = multiprocessing.Value('q', 0)
+        self._seen_invalidations = 0
+
+    def _sync(self):
+        """Drop the entries if another process invalidated the cache; call with the lock held"""
+        invalidations = self._shared_invalidations.value
+        if invalidations != self._seen_invalidations:
+            self._seen_invalidations = invalidations
+            self._entries.clear()
+            self.generation += 1
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss or expiry"""
+        with self._lock:
+            self._sync()
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+                self.evictions += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, value, generation=None):
+        """
+        Store a value, evicting the least recently used entry when full.
+
+        Pass the generation read before computing value; the put is dropped
+        if the cache was invalidated in the meantime, so a slow query that
+        started before a reload cannot store a stale result.
+        """
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._sync()
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        """Drop every entry, in every process sharing the cache; called whenever the backing data changes"""
+        with self._lock:
+            with self._shared_invalidations.get_lock():
+                self._shared_invalidations.value += 1
+                self._seen_invalidations = self._shared_invalidations.value
+            self._entries.clear()
+            self.generation += 1
+
+    def stats(self):
+        """Counters for monitoring the cache"""
+        with self._lock:
+            self._sync()
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": self.hits / lookups if lookups else 0.0
+            }
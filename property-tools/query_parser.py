@@ -0,0 +1,239 @@
+"""
+Natural Language Property Query Parser for Beacon
+
+Turns free-text searches such as "3 bed co-ops in Park Slope under $1.2M"
+into the filter params accepted by the property API, without an LLM call.
+All rules are compiled into one regular expression and applied in a single
+left-to-right scan, and parse results are memoized, so repeated queries
+cost a dictionary lookup.
+"""
+
+import re
+from functools import lru_cache
+
+# Spelled-out counts accepted for bedrooms and bathrooms
+NUMBER_WORDS = {
+    'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10
+}
+
+MONEY_UNITS = {
+    'k': 1e3, 'thousand': 1e3,
+    'm': 1e6, 'mm': 1e6, 'mil': 1e6, 'million': 1e6,
+    'b': 1e9, 'bn': 1e9, 'billion': 1e9
+}
+
+BOROUGHS = {
+    'manhattan': 'Manhattan',
+    'brooklyn': 'Brooklyn', 'bklyn': 'Brooklyn', 'bk': 'Brooklyn',
+    'queens': 'Queens',
+    'the bronx': 'Bronx', 'bronx': 'Bronx',
+    'staten island': 'Staten Island'
+}
+
+# Property type synonyms -> property_type_detail values
+TOWNHOUSE_TYPES = ['Duplex', 'Triplex', 'Quadruplex']
+APARTMENT_BUILDING_TYPES = ['Apartment House (5+ Units)', 'Garden Apartment, Court Apartment (5+ Units)', 'Apartments']
+# Condo labels as the property records spell them; the current extract has none
+CONDO_TYPES = ['Condominium', 'Condominium Unit']
+PROPERTY_TYPES = {
+    'co-op': ['Cooperative Unit'], 'coop': ['Cooperative Unit'], 'cooperative': ['Cooperative Unit'],
+    'condo': CONDO_TYPES, 'condominium': CONDO_TYPES,
+    'apartment building': APARTMENT_BUILDING_TYPES, 'apartment house': APARTMENT_BUILDING_TYPES,
+    'rental building': APARTMENT_BUILDING_TYPES, 'walk-up': APARTMENT_BUILDING_TYPES,
+    'walkup': APARTMENT_BUILDING_TYPES,
+    'garden apartment': ['Garden Apartment, Court Apartment (5+ Units)'],
+    'multi-family': ['Multi-Family Dwelling', 'Residential Income (Multi-Family)'] + TOWNHOUSE_TYPES,
+    'multifamily': ['Multi-Family Dwelling', 'Residential Income (Multi-Family)'] + TOWNHOUSE_TYPES,
+    'multi family': ['Multi-Family Dwelling', 'Residential Income (Multi-Family)'] + TOWNHOUSE_TYPES,
+    'duplex': ['Duplex'], 'two-family': ['Duplex'], 'two family': ['Duplex'], '2-family': ['Duplex'],
+    'triplex': ['Triplex'], 'three-family': ['Triplex'], 'three family': ['Triplex'], '3-family': ['Triplex'],
+    'quadruplex': ['Quadruplex'], 'fourplex': ['Quadruplex'], 'four-family': ['Quadruplex'],
+    'four family': ['Quadruplex'], '4-family': ['Quadruplex'],
+    'high-rise': ['Highrise Apartment'], 'highrise': ['Highrise Apartment'], 'high rise': ['Highrise Apartment'],
+    'townhouse': TOWNHOUSE_TYPES, 'townhome': TOWNHOUSE_TYPES, 'brownstone': TOWNHOUSE_TYPES,
+    'row house': TOWNHOUSE_TYPES, 'rowhouse': TOWNHOUSE_TYPES
+}
+
+# Neighbourhoods -> five-digit zip codes. The dataset's borough labels don't
+# always follow geography (Ridgewood is labelled Brooklyn), so neighbourhoods
+# filter on zip code rather than borough.
+NEIGHBORHOODS = {
+    # Manhattan
+    'upper west side': ['10023', '10024', '10025', '10069'], 'uws': ['10023', '10024', '10025', '10069'],
+    'upper east side': ['10021', '10028', '10065', '10075', '10128', '10162'],
+    'ues': ['10021', '10028', '10065', '10075', '10128', '10162'],
+    'harlem': ['10026', '10027', '10030', '10037', '10039'], 'east harlem': ['10029', '10035'],
+    'morningside heights': ['10025', '10027'], 'hamilton heights': ['10031'],
+    'washington heights': ['10032', '10033', '10040'], 'inwood': ['10034', '10040'],
+    'chelsea': ['10001', '10011'], "hell's kitchen": ['10019', '10036'], 'hells kitchen': ['10019', '10036'],
+    'midtown': ['10017', '10018', '10019', '10020', '10022', '10036'],
+    'murray hill': ['10016'], 'kips bay': ['10016'], 'gramercy': ['10003', '10010'], 'flatiron': ['10010'],
+    'greenwich village': ['10012', '10014'], 'west village': ['10014'], 'east village': ['10003', '10009'],
+    'soho': ['10012', '10013'], 'noho': ['10012'], 'nolita': ['10012'], 'tribeca': ['10007', '10013'],
+    'lower east side': ['10002'], 'chinatown': ['10002', '10013'],
+    'financial district': ['10004', '10005', '10006', '10038'], 'fidi': ['10004', '10005', '10006', '10038'],
+    'battery park city': ['10280', '10282'],
+    # Brooklyn
+    'williamsburg': ['11206', '11211', '11249'], 'greenpoint': ['11222'],
+    'bushwick': ['11206', '11207', '11221', '11237'],
+    'bed-stuy': ['11205', '11206', '11216', '11221', '11233'], 'bed stuy': ['11205', '11206', '11216', '11221', '11233'],
+    'bedford-stuyvesant': ['11205', '11206', '11216', '11221', '11233'],
+    'bedford stuyvesant': ['11205', '11206', '11216', '11221', '11233'],
+    'crown heights': ['11213', '11216', '11225', '11233', '11238'], 'prospect heights': ['11238'],
+    'park slope': ['11215', '11217'], 'gowanus': ['11215', '11217'], 'windsor terrace': ['11215', '11218'],
+    'brooklyn heights': ['11201'], 'dumbo': ['11201'], 'downtown brooklyn': ['11201'],
+    'cobble hill': ['11201', '11231'], 'boerum hill': ['11201', '11217'], 'carroll gardens': ['11231'],
+    'red hook': ['11231'], 'fort greene': ['11205', '11217'], 'clinton hill': ['11205', '11238'],
+    'prospect lefferts gardens': ['11225'], 'flatbush': ['11203', '11210', '11225', '11226'],
+    'ditmas park': ['11218', '11226'], 'kensington': ['11218'], 'sunset park': ['11220', '11232'],
+    'bay ridge': ['11209'], 'east new york': ['11207', '11208'], 'brownsville': ['11212'],
+    # Queens and the Bronx
+    'ridgewood': ['11385'], 'maspeth': ['11378'], 'middle village': ['11379'],
+    'riverdale': ['10463', '10471']
+}
+
+# Pre-war in New York real estate means built before 1940
+PREWAR_YEAR = 1939
+
+# Half-width of the price band for "around $1M"
+AROUND_PRICE_MARGIN = 0.15
+
+
+def alternation(phrases):
+    """Regex alternation of literal phrases, longest first so "east harlem" beats "harlem" """
+    return '|'.join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+
+
+COUNT = r'(\d+(?:\.\d+)?|' + alternation(NUMBER_WORDS) + r')'
+UNIT = r'(?:' + alternation(MONEY_UNITS) + r')\b'
+# An amount that is clearly money: a $, a unit, thousands separators, or five or more digits
+MONEY = (r'(?:\$\s*\d[\d,]*(?:\.\d+)?(?:\s*' + UNIT + r')?'
+         r'|\d[\d,]*(?:\.\d+)?\s*' + UNIT +
+         r'|\d{1,3}(?:,\d{3})+|\d{5,})')
+# A bare number is allowed on the left of a range when the right side is money ("1-2 million")
+RANGE_START = r'(?:\$?\s*\d[\d,]*(?:\.\d+)?(?:\s*' + UNIT + r')?)'
+# "3+", "3 or more", "3-bedroom" and ranges like "3-4 bedrooms", whose lower end is the minimum
+COUNT_TAIL = r'(?:\s*(?:-|to)\s*\d+(?:\.\d+)?)?\s*\+?\s*-?\s*(?:or\s+more\s+)?'
+NOT_SIZE = r'(?!\s*(?:sq|square|sf\b|bed|bath|br\b|bd\b|ba\b))'
+YEAR = r'((?:18|19|20)\d\d)'
+# Words that make a size an upper bound ("under 2000 sqft"); without one it is a minimum
+SIZE_MAX_WORDS = (r'(?:under|below|less\s+than|smaller\s+than|at\s+most|up\s+to|no\s+more\s+than'
+                  r'|no\s+bigger\s+than|max(?:imum)?|<)')
+SIZE_MAX_PATTERN = re.compile(r'^' + SIZE_MAX_WORDS)
+
+RULES = [
+    ('neighborhood', r'\b(?:' + alternation(NEIGHBORHOODS) + r')\b'),
+    ('price_range', r'(?:\b(?:between|from)\s+)?' + RANGE_START + r'\s*(?:-|to|and)\s*' + MONEY + NOT_SIZE),
+    ('price_around', r'\b(?:around|about|approximately|roughly|~)\s*' + MONEY + NOT_SIZE),
+    ('price_max', r'(?:\b(?:under|below|less\s+than|at\s+most|up\s+to|no\s+more\s+than|max(?:imum)?'
+                  r'|cheaper\s+than|within)|<)\s*' + MONEY + NOT_SIZE),
+    ('price_min', r'(?:\b(?:over|above|more\s+than|at\s+least|min(?:imum)?|starting\s+at|from)|>)\s*'
+                  + MONEY + NOT_SIZE),
+    ('bedrooms', r'\b' + COUNT + COUNT_TAIL + r'(?:bed(?:room)?s?|bdrms?|brs?|bds?)\b'),
+    ('bathrooms', r'\b' + COUNT + COUNT_TAIL + r'(?:bath(?:room)?s?|bths?|ba)\b'),
+    ('sqft', r'(?:\b' + SIZE_MAX_WORDS + r'\s*)?\b(\d[\d,]*(?:\.\d+)?\s*k?)\s*\+?\s*'
+             r'(?:sq\.?\s*f(?:ee)?t\.?|sqft|square\s+f(?:ee|oo)t|sf)\b'),
+    ('prewar', r'\bpre-?\s*war\b'),
+    ('built_by', r'\bbuilt\s+(?:in\s+or\s+before|by|no\s+later\s+than|up\s+to)\s+' + YEAR + r'\b'),
+    ('built_before', r'\b(?:built\s+)?(?:before|prior\s+to|older\s+than|pre-?)\s*' + YEAR + r'\b'),
+    ('borough', r'\b(?:' + alternation(BOROUGHS) + r')\b'),
+    ('property_type', r'\b(?:' + alternation(PROPERTY_TYPES) + r')(?:e?s)?\b')
+]
+
+PATTERN = re.compile('|'.join(f'(?P<{name}>{rule})' for name, rule in RULES))
+MONEY_PATTERN = re.compile(r'\$?\s*(\d[\d,]*(?:\.\d+)?)\s*(' + UNIT + r')?')
+NUMBER_PATTERN = re.compile(COUNT)
+
+
+def parse_count(text):
+    """Numeric value of a count like "3", "2.5" or "three" """
+    return float(NUMBER_WORDS.get(text, text))
+
+
+def parse_amounts(text):
+    """[(value, has_unit)] for each amount in a matched price expression"""
+    amounts = []
+    for number, unit in MONEY_PATTERN.findall(text):
+        value = float(number.replace(',', ''))
+        amounts.append((value * MONEY_UNITS[unit.strip()] if unit else value, bool(unit)))
+    return amounts
+
+
+def price_range(text):
+    """(low, high) for a range such as "$800k-1.2M" or "between 1 and 2 million" """
+    (low, low_unit), (high, _) = parse_amounts(text)[-2:]
+    if not low_unit and low < high / 1000:
+        # "1-2 million": the left side shares the right side's unit
+        scale = next(s for s in sorted(MONEY_UNITS.values(), reverse=True) if high >= s)
+        low = low * scale if low * scale <= high else low * 1e3
+    return min(low, high), max(low, high)
+
+
+def add_values(params, key, values):
+    """Append to a list-valued param, keeping first-seen order without duplicates"""
+    existing = params.setdefault(key, [])
+    existing.extend(value for value in values if value not in existing)
+
+
+@lru_cache(maxsize=4096)
+def _parse(text):
+    params = {}
+    for match in PATTERN.finditer(text):
+        rule, matched = match.lastgroup, match.group(match.lastgroup)
+        if rule == 'neighborhood':
+            add_values(params, 'zip_code', NEIGHBORHOODS[matched])
+            add_values(params, 'neighborhood', [matched])
+        elif rule == 'price_range':
+            params['min_price'], params['max_price'] = price_range(matched)
+        elif rule == 'price_around':
+            value = parse_amounts(matched)[-1][0]
+            params['min_price'] = round(value * (1 - AROUND_PRICE_MARGIN))
+            params['max_price'] = round(value * (1 + AROUND_PRICE_MARGIN))
+        elif rule == 'price_max':
+            params['max_price'] = parse_amounts(matched)[-1][0]
+        elif rule == 'price_min':
+            params['min_price'] = parse_amounts(matched)[-1][0]
+        elif rule in ('bedrooms', 'bathrooms'):
+            params[f'min_{rule}'] = parse_count(NUMBER_PATTERN.search(matched).group(1))
+        elif rule == 'sqft':
+            number = re.search(r'\d[\d,.]*\s*k?', matched).group(0).replace(',', '').strip()
+            key = 'max_sqft' if SIZE_MAX_PATTERN.match(matched) else 'min_sqft'
+            params[key] = float(number[:-1]) * 1e3 if number.endswith('k') else float(number)
+        elif rule == 'prewar':
+            params['max_year_built'] = PREWAR_YEAR
+        elif rule == 'built_by':
+            params['max_year_built'] = int(match.group(0)[-4:])
+        elif rule == 'built_before':
+            params['max_year_built'] = int(re.search(YEAR, matched).group(1)) - 1
+        elif rule == 'borough':
+            add_values(params, 'borough', [BOROUGHS[matched]])
+        elif rule == 'property_type':
+            # Plurals: "co-ops", "townhouses", "duplexes"
+            phrase = next(p for p in (matched, matched[:-1], matched[:-2]) if p in PROPERTY_TYPES)
+            add_values(params, 'property_type', PROPERTY_TYPES[phrase])
+    return tuple((key, tuple(value) if isinstance(value, list) else value) for key, value in params.items())
+
+
+def normalize_query(query):
+    """Lower-case, unify dashes and collapse whitespace so equivalent queries share a cache entry"""
+    query = re.sub(r'[‐-―−]', '-', str(query).lower())
+    return ' '.join(query.split())
+
+
+def parse_property_query(query):
+    """
+    Extract property filter params from a natural-language query.
+
+    Returns a dict using the API's param names (borough, property_type,
+    zip_code, min_price, max_price, min_bedrooms, min_bathrooms, min_sqft,
+    max_sqft, max_year_built) plus "neighborhood" naming any neighbourhoods matched.
+    Later mentions of the same filter win over earlier ones.
+    """
+    return {key: list(value) if isinstance(value, tuple) else value
+            for key, value in _parse(normalize_query(query))}
+
+
+def parse_cache_info():
+    """Hit/miss counters of the memoized parser"""
+    return _parse.cache_info()._asdict()
@@ -0,0 +1,123 @@
+"""
+Query Planning for Beacon
+
+Per-column statistics gathered when a PropertyStore is built, and the
+filter stages the store's planner orders by them. Estimating each filter's
+row count up front lets the most selective filter run first through its
+index, with the rest applied only to the rows it leaves, and lets the
+store decide whether walking the sort index beats filtering first.
+"""
+
+import numpy as np
+
+# Buckets in each numeric column's equi-depth histogram
+HISTOGRAM_BUCKETS = 64
+
+
+class ColumnStats:
+    """
+    Statistics for one column.
+
+    Numeric columns keep an equi-depth histogram (bucket boundaries at
+    evenly spaced quantiles); categorical columns keep exact row counts
+    per dictionary code.
+    """
+
+    def __init__(self, rows, nulls, distinct, bounds=None, counts=None):
+        self.rows = rows          # non-null rows
+        self.nulls = nulls
+        self.distinct = distinct
+        self.bounds = bounds      # numeric: HISTOGRAM_BUCKETS + 1 quantile boundaries
+        self.counts = counts      # categorical: rows per code
+        if bounds is not None and len(bounds):
+            # Fraction of rows below each distinct boundary value, and up to and including it
+            positions = np.linspace(0.0, 1.0, len(bounds))
+            self._values, first = np.unique(bounds, return_index=True)
+            last = len(bounds) - 1 - np.unique(bounds[::-1], return_index=True)[1]
+            self._below = positions[first]
+            self._through = positions[last]
+
+    @classmethod
+    def numeric(cls, values, nulls):
+        """Stats for a numeric column"""
+        present = np.sort(values[~nulls])
+        if not len(present):
+            return cls(0, int(nulls.sum()), 0, bounds=present)
+        distinct = int(np.count_nonzero(np.diff(present))) + 1
+        quantiles = np.linspace(0, len(present) - 1, HISTOGRAM_BUCKETS + 1).round().astype(np.intp)
+        return cls(len(present), int(nulls.sum()), distinct, bounds=present[quantiles].astype(np.float64))
+
+    @classmethod
+    def categorical(cls, codes, dictionary_size):
+        """Stats for a dictionary-encoded column; code -1 is null"""
+        present = codes[codes >= 0]
+        counts = np.bincount(present, minlength=dictionary_size)
+        return cls(len(present), len(codes) - len(present), int(np.count_nonzero(counts)), counts=counts)
+
+    def estimate_range(self, low=None, high=None):
+        """Estimated rows with low <= value <= high, interpolating within histogram buckets"""
+        if self.bounds is None or not self.rows:
+            return 0
+        through = 1.0 if high is None else np.interp(high, self._values, self._through, left=0.0, right=1.0)
+        below = 0.0 if low is None else np.interp(low, self._values, self._below, left=0.0, right=1.0)
+        return int(round(max(0.0, through - below) * self.rows))
+
+    def estimate_in(self, codes):
+        """Rows whose code is one of codes"""
+        if self.counts is None:
+            return 0
+        return int(sum(self.counts[code] for code in set(codes)))
+
+    def to_json(self):
+        """JSON-serializable form, for columnar snapshots"""
+        return {
+            "rows": int(self.rows), "nulls": int(self.nulls), "distinct": int(self.distinct),
+            "bounds": None if self.bounds is None else self.bounds.tolist(),
+            "counts": None if self.counts is None else self.counts.tolist()
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        """Stats saved by to_json()"""
+        bounds = None if data["bounds"] is None else np.asarray(data["bounds"], dtype=np.float64)
+        counts = None if data["counts"] is None else np.asarray(data["counts"], dtype=np.int64)
+        return cls(data["rows"], data["nulls"], data["distinct"], bounds=bounds, counts=counts)
+
+    def describe(self):
+        """Summary for the admin endpoint"""
+        summary = {"rows": self.rows, "nulls": self.nulls, "distinct": self.distinct}
+        if self.bounds is not None and len(self.bounds):
+            summary["min"] = float(self.bounds[0])
+            summary["max"] = float(self.bounds[-1])
+        return summary
+
+
+class Stage:
+    """One filter predicate with its estimated row count and access path"""
+
+    def __init__(self, kind, column, argument, estimate, access):
+        self.kind = kind          # 'in', 'zip' or 'range'
+        self.column = column
+        self.argument = argument  # codes for 'in' and 'zip', (low, high) for 'range'
+        self.estimate = estimate
+        self.access = access      # how the stage reads rows when it runs first
+
+    def predicate(self, store):
+        """Human-readable form of the predicate"""
+        if self.kind == 'range':
+            low, high = self.argument
+            parts = [f"{low} <="] if low is not None else []
+            parts.append(self.column)
+            if high is not None:
+                parts.append(f"<= {high}")
+            return ' '.join(parts)
+        dictionary = store.zip_dictionary if self.kind == 'zip' else store.dictionaries.get(self.column, [])
+        return f"{self.column} IN {[dictionary[code] for code in self.argument]}"
+
+
+def combined_estimate(stages, size):
+    """Estimated rows matching every stage, assuming the filters are independent"""
+    estimate = float(size)
+    for stage in stages:
+        estimate *= stage.estimate / size if size else 0.0
+    return int(round(estimate))
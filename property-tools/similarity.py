@@ -0,0 +1,369 @@
+"""
+Property Similarity Index for Beacon
+
+Nearest-neighbour search over normalized property feature vectors, used
+by property_api.py to find properties similar to a given one. Uses a
+SciPy KD-tree when SciPy is installed and falls back to a vectorized
+brute-force search otherwise.
+
+The precomputed SimilarityTable keeps each property's neighbour list.
+Both the feature vectors and the table are saved as arrays in the
+columnar snapshot and memory-mapped at startup; when the data is
+refreshed, only the neighbourhoods touched by changed rows are recomputed.
+"""
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Numeric features: (column, log scale); skewed money/area columns are log-scaled
+NUMERIC_FEATURES = [
+    ('estimated_value', True),
+    ('total_building_area_square_feet', True),
+    ('bedroom_count', False),
+    ('bathroom_count', False),
+    ('year_built', False),
+    ('lot_size_square_feet', True)
+]
+
+# Categorical features, one-hot encoded
+CATEGORY_FEATURES = ['borough', 'property_type_detail']
+
+# Only the most common values of a categorical feature get their own dimension
+MAX_CATEGORY_VALUES = 16
+
+DEFAULT_WEIGHTS = {
+    'estimated_value': 2.0,
+    'total_building_area_square_feet': 1.0,
+    'bedroom_count': 1.0,
+    'bathroom_count': 1.0,
+    'year_built': 0.5,
+    'lot_size_square_feet': 0.5,
+    'borough': 3.0,
+    'property_type_detail': 1.0
+}
+
+# Neighbours stored per property in the precomputed table
+TABLE_K = 10
+
+# Above this fraction of changed rows the table is rebuilt from scratch
+REBUILD_FRACTION = 0.25
+
+# Numeric normalization drift (in standard deviations) tolerated before the
+# table is rebuilt with a fresh spec instead of refreshed
+SPEC_TOLERANCE = 0.05
+
+# Upper bound on the distance matrix size for one brute-force chunk
+BRUTE_FORCE_CHUNK_CELLS = 1 << 24
+
+
+class SimilarityIndex:
+    """
+    k-nearest-neighbour index over the rows of a PropertyStore.
+
+    spec pins the normalization (means, standard deviations, one-hot
+    values and weights); passing the spec of an earlier index keeps the
+    vectors of unchanged rows identical, which incremental refreshes rely on.
+    """
+
+    def __init__(self, store, weights=None, spec=None, vectors=None, tree=True):
+        self.store = store
+        self.spec = spec or build_spec(store, dict(DEFAULT_WEIGHTS, **(weights or {})))
+        self.weights = self.spec['weights']
+        # Vectors saved with a snapshot are memory-mapped instead of rebuilt
+        self.vectors = self._build_vectors() if vectors is None else vectors
+        use_tree = tree and cKDTree is not None and len(self.vectors)
+        self.tree = cKDTree(self.vectors) if use_tree else None
+
+    def _build_vectors(self):
+        """Build the weighted, normalized feature matrix, one row per property"""
+        store = self.store
+        blocks = []
+
+        for column, log_scale in NUMERIC_FEATURES:
+            block = np.zeros(store.size)
+            if column in store.numeric and column in self.spec['numeric']:
+                mean, std = self.spec['numeric'][column]
+                present = ~store.nulls[column]
+                values = scale(store.numeric[column][present], log_scale)
+                # Missing values sit at the mean so they never block a match
+                block[present] = (values - mean) / std
+            blocks.append(block[:, None] * self.weights.get(column, 0.0))
+
+        for column in CATEGORY_FEATURES:
+            values = self.spec['categories'].get(column, [])
+            block = np.zeros((store.size, len(values)))
+            if column in store.codes:
+                lookup = {value: code for code, value in enumerate(store.dictionaries[column])}
+                for position, value in enumerate(values):
+                    if value in lookup:
+                        block[:, position] = store.codes[column] == lookup[value]
+            blocks.append(block * self.weights.get(column, 0.0))
+
+        return np.hstack(blocks)
+
+    def search(self, rows, k=3):
+        """
+        Find the k nearest neighbours of each row in rows, in one call.
+
+        Returns (neighbours, distances): one array per input row, nearest
+        first, never including the row itself.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        k = min(k, self.store.size - 1)
+        if len(rows) == 0 or k <= 0:
+            empty = [np.empty(0, dtype=np.intp) for _ in rows]
+            return empty, [np.empty(0) for _ in rows]
+
+        if self.tree is not None:
+            distances, found = self.tree.query(self.vectors[rows], k=k + 1)
+            found = np.asarray(found).reshape(len(rows), k + 1)
+            distances = np.asarray(distances).reshape(len(rows), k + 1)
+        else:
+            found, distances = self._brute_force(rows, k + 1)
+
+        keep = [candidates != row for row, candidates in zip(rows, found)]
+        return ([f[m][:k] for f, m in zip(found, keep)],
+                [d[m][:k] for d, m in zip(distances, keep)])
+
+    def neighbours(self, rows, k=3):
+        """Neighbour row indexes for each row in rows, nearest first"""
+        return self.search(rows, k)[0]
+
+    def neighbours_for_ids(self, property_ids, k=3):
+        """Batch lookup by property_id; returns {property_id: [neighbour rows]}"""
+        found = {}
+        for property_id in property_ids:
+            row = self.store.find_row(property_id)
+            if row is not None:
+                found[str(property_id)] = row
+        results = self.neighbours(list(found.values()), k)
+        return dict(zip(found.keys(), results))
+
+    def distances(self, rows):
+        """Distance matrix from each row in rows to every row in the store"""
+        vectors = self.vectors
+        norms = np.einsum('ij,ij->i', vectors, vectors)
+        squared = norms[None, :] - 2.0 * vectors[rows] @ vectors.T + norms[rows, None]
+        return np.sqrt(np.clip(squared, 0, None))
+
+    def _brute_force(self, rows, k):
+        """Exact search by computing distances to every row in bounded chunks"""
+        chunk = max(1, BRUTE_FORCE_CHUNK_CELLS // max(1, len(self.vectors)))
+        found = []
+        found_distances = []
+        for start in range(0, len(rows), chunk):
+            distances = self.distances(rows[start:start + chunk])
+            nearest = np.argpartition(distances, k - 1, axis=1)[:, :k]
+            nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+            order = np.argsort(nearest_distances, axis=1, kind='stable')
+            found.append(np.take_along_axis(nearest, order, axis=1))
+            found_distances.append(np.take_along_axis(nearest_distances, order, axis=1))
+        return np.vstack(found), np.vstack(found_distances)
+
+class SimilarityTable:
+    """
+    Precomputed neighbour lists, one per row of the store they were built for.
+
+    neighbours holds each row's k nearest rows, nearest first, padded with
+    -1; radius holds the distance to the k-th of them, which refresh() uses
+    to find the rows a changed property may have moved close to.
+    """
+
+    def __init__(self, k, spec, neighbours=None, radius=None):
+        self.k = k
+        self.spec = spec
+        self.neighbours = neighbours
+        self.radius = radius
+
+    @classmethod
+    def build(cls, index, k=TABLE_K):
+        """Compute the neighbour lists for every row of the index"""
+        size = index.store.size
+        table = cls(k, index.spec, np.full((size, k), -1, dtype=np.intp), np.full(size, np.inf))
+        table._recompute(index, np.arange(size))
+        return table
+
+    def lookup(self, row, limit=None):
+        """Neighbour rows of a row, nearest first, or None if the table has none for it"""
+        if self.neighbours is None or row is None or row >= len(self.neighbours):
+            return None
+        found = self.neighbours[row]
+        return found[found >= 0][:limit]
+
+    def _recompute(self, index, rows):
+        """Recompute and store the neighbour lists for the given rows"""
+        neighbours, distances = index.search(rows, self.k)
+        for row, found, found_distances in zip(rows, neighbours, distances):
+            self.neighbours[row] = -1
+            self.neighbours[row, :len(found)] = found
+            self.radius[row] = found_distances[-1] if len(found_distances) == self.k else np.inf
+
+    def refresh(self, previous_index, index):
+        """
+        The table brought up to date with the store behind index, or None
+        when a full rebuild is needed instead.
+
+        previous_index is the index this table was built from. Rows are
+        matched by property_id. Only rows whose features changed, rows that
+        listed a changed or removed property, and rows a changed property
+        may now be closer to than their current k-th neighbour are
+        recomputed; the rest keep their lists, renumbered to the new rows.
+        """
+        if index.spec != self.spec or self.neighbours is None or previous_index.store.size == 0:
+            return None
+
+        store = index.store
+        previous_rows = match_rows(previous_index.store, store)
+        present = previous_rows >= 0
+        changed = ~present
+        changed[present] = (previous_index.vectors[previous_rows[present]] != index.vectors[present]).any(axis=1)
+
+        # New row of each previous row, -1 for removed properties
+        new_rows = np.full(previous_index.store.size, -1, dtype=np.intp)
+        new_rows[previous_rows[present]] = np.flatnonzero(present)
+        removed = new_rows < 0
+        if changed.sum() + removed.sum() > REBUILD_FRACTION * max(1, store.size):
+            return None
+
+        dirty = removed.copy()
+        dirty[previous_rows[changed & present]] = True
+        listed = self.neighbours >= 0
+        lists_dirty = (listed & dirty[self.neighbours]).any(axis=1)
+        affected = changed.copy()
+        affected[present] |= lists_dirty[previous_rows[present]]
+
+        neighbours = np.full((store.size, self.k), -1, dtype=np.intp)
+        neighbours[present] = np.where(listed, new_rows[self.neighbours], -1)[previous_rows[present]]
+        radius = np.full(store.size, np.inf)
+        radius[present] = self.radius[previous_rows[present]]
+
+        # Rows that a changed property may have moved into the neighbourhood of
+        changed_rows = np.flatnonzero(changed)
+        chunk = max(1, BRUTE_FORCE_CHUNK_CELLS // max(1, store.size))
+        for start in range(0, len(changed_rows), chunk):
+            affected |= (index.distances(changed_rows[start:start + chunk]) < radius[None, :]).any(axis=0)
+
+        table = SimilarityTable(self.k, self.spec, neighbours, radius)
+        table._recompute(index, np.flatnonzero(affected))
+        return table
+
+
+def row_ids(store):
+    """property_id of each row ('' for rows whose id an earlier row already has)"""
+    ids = [''] * store.size
+    for property_id, row in store.id_index.items():
+        ids[row] = property_id
+    return np.array(ids, dtype=str)
+
+
+def match_rows(previous, store):
+    """Row of previous holding each row's property_id in store, or -1"""
+    previous_ids = row_ids(previous)
+    ids = row_ids(store)
+    order = np.argsort(previous_ids, kind='stable')
+    positions = np.minimum(np.searchsorted(previous_ids[order], ids), len(order) - 1)
+    found = (previous_ids[order][positions] == ids) & (ids != '')
+    return np.where(found, order[positions], -1)
+
+
+def build_spec(store, weights):
+    """Derive normalization statistics and one-hot values from a store"""
+    spec = {'weights': weights, 'numeric': {}, 'categories': {}}
+
+    for column, log_scale in NUMERIC_FEATURES:
+        if column in store.numeric:
+            values = scale(store.numeric[column][~store.nulls[column]], log_scale)
+            if len(values):
+                spec['numeric'][column] = [float(values.mean()), float(values.std()) or 1.0]
+
+    for column in CATEGORY_FEATURES:
+        if column in store.codes:
+            codes = store.codes[column]
+            counts = np.bincount(codes[codes >= 0], minlength=len(store.dictionaries[column]))
+            top_codes = np.argsort(-counts, kind='stable')[:MAX_CATEGORY_VALUES]
+            spec['categories'][column] = [store.dictionaries[column][code] for code in top_codes if counts[code]]
+
+    return spec
+
+
+def spec_changed(spec, fresh):
+    """
+    Whether fresh, derived from newer data, gives different dimensions or
+    normalization than spec: a category gained or lost its dimension, or a
+    mean or standard deviation moved by more than SPEC_TOLERANCE.
+    """
+    if spec['weights'] != fresh['weights'] or spec['numeric'].keys() != fresh['numeric'].keys():
+        return True
+    old_dimensions = {column: set(values) for column, values in spec['categories'].items()}
+    if old_dimensions != {column: set(values) for column, values in fresh['categories'].items()}:
+        return True
+    for column, (mean, std) in fresh['numeric'].items():
+        old_mean, old_std = spec['numeric'][column]
+        if abs(mean - old_mean) > SPEC_TOLERANCE * old_std or abs(std - old_std) > SPEC_TOLERANCE * old_std:
+            return True
+    return False
+
+
+def scale(values, log_scale):
+    """Convert raw column values to the scale used for distances"""
+    values = values.astype(np.float64)
+    return np.log1p(np.clip(values, 0, None)) if log_scale else values
+
+
+def similarity_arrays(index, table):
+    """(extras, extra_info) that save an index and its table with a columnar snapshot"""
+    extras = {'similarity_vectors': index.vectors}
+    if table.neighbours is not None:
+        extras.update(similar_neighbours=table.neighbours, similar_radius=table.radius)
+    return extras, {'similarity': {'k': table.k, 'spec': index.spec}}
+
+
+def saved_similarity(store, weights, k):
+    """
+    (vectors, table) saved with a snapshot-loaded store, or None if it has
+    none or they were built with other settings
+    """
+    saved = store.extra_info.get('similarity')
+    if saved is None or saved['k'] != k or saved['spec'].get('weights') != weights:
+        return None
+    extras = store.extras
+    if 'similarity_vectors' not in extras:
+        return None
+    table = SimilarityTable(k, saved['spec'], extras.get('similar_neighbours'), extras.get('similar_radius'))
+    return extras['similarity_vectors'], table
+
+
+def load_similarity(store, previous=None, weights=None, k=TABLE_K, build_table=True):
+    """
+    The similarity index and neighbour table for a store.
+
+    A store loaded from a columnar snapshot saved with them gets both back
+    memory-mapped. Otherwise the table is built, reusing the one saved with
+    previous (an earlier snapshot of the data) so that only changed
+    neighbourhoods are recomputed; it falls back to a full rebuild when
+    previous has no table, was built with other settings, the spec derived
+    from the new data differs from the saved one (spec_changed()), or too
+    much has changed. Without build_table an empty table is returned
+    instead, and every lookup falls back to the index. Returns (index, table).
+    """
+    weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    saved = saved_similarity(store, weights, k)
+    if saved is not None:
+        vectors, table = saved
+        return SimilarityIndex(store, spec=table.spec, vectors=vectors), table
+
+    spec = build_spec(store, weights)
+    earlier = saved_similarity(previous, weights, k) if previous is not None else None
+    if earlier is not None and not spec_changed(earlier[1].spec, spec):
+        vectors, table = earlier
+        index = SimilarityIndex(store, spec=table.spec)
+        table = table.refresh(SimilarityIndex(previous, spec=table.spec, vectors=vectors, tree=False), index)
+        if table is not None:
+            return index, table
+
+    index = SimilarityIndex(store, spec=spec)
+    return index, SimilarityTable.build(index, k) if build_table else SimilarityTable(k, index.spec)
@@ -0,0 +1,195 @@
+"""
+Property Snapshot Management for Beacon
+
+A snapshot bundles one version of the local property data with the
+indexes built from it, so a request always sees a consistent set. The
+SnapshotWatcher polls the data files and builds a replacement snapshot on
+a background thread whenever one of them changes.
+
+save_local_snapshot() writes a store together with those indexes as one
+columnar snapshot, so loading it maps everything instead of rebuilding.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from property_store import PropertyStore
+from similarity import load_similarity, similarity_arrays
+from address_index import AddressIndex
+
+# Serialized property JSON kept per snapshot, in megabytes
+FRAGMENT_CACHE_BYTES = int(float(os.getenv('FRAGMENT_CACHE_MB', '64')) * 1024 * 1024)
+
+
+class PropertySnapshot:
+    """One immutable version of the local dataset and its indexes"""
+
+    def __init__(self, version, source, signature, store, similarity_index, similar_table, address_index, load_seconds):
+        self.version = version
+        self.source = source
+        self.signature = signature
+        self.store = store
+        self.similarity_index = similarity_index
+        self.similar_table = similar_table
+        self.address_index = address_index
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now()
+        self.fragments = FragmentCache()
+
+    def describe(self):
+        """Summary for the admin endpoint"""
+        return {
+            "version": self.version,
+            "source": self.source,
+            "source_modified_at": datetime.fromtimestamp(self.signature[0] / 1e9).isoformat() if self.signature else None,
+            "row_count": len(self.store),
+            "loaded_at": self.loaded_at.isoformat(),
+            "load_seconds": round(self.load_seconds, 3),
+            "fragment_cache": self.fragments.stats(),
+            "column_stats": {name: stats.describe() for name, stats in self.store.column_stats.items()}
+        }
+
+
+class FragmentCache:
+    """
+    Serialized JSON per property and output shape (view plus projected
+    fields), kept for the lifetime of one snapshot.
+
+    The fragments held are capped at max_bytes in total, least recently
+    used out first, so large result sets and ad-hoc projections can't grow
+    the cache without bound.
+    """
+
+    def __init__(self, max_bytes=FRAGMENT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, shape, property_id, build):
+        """Return the cached fragment for a property, building it on first use"""
+        key = (shape, property_id)
+        with self._lock:
+            fragment = self._entries.get(key)
+            if fragment is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return fragment
+            self.misses += 1
+
+        # Serialize outside the lock; a concurrent build of the same key just replaces it
+        fragment = build()
+        if len(fragment) > self.max_bytes:
+            return fragment
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size_bytes -= len(previous)
+            self._entries[key] = fragment
+            self.size_bytes += len(fragment)
+            while self.size_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+                self.evictions += 1
+        return fragment
+
+    def stats(self):
+        """Entry count, size and counters for the admin endpoint"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "size_bytes": self.size_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
+
+
+def file_signature(path):
+    """(mtime_ns, inode, size) of a file, or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_ino, stat.st_size)
+
+
+class SnapshotWatcher(threading.Thread):
+    """
+    Background thread that reloads a snapshot when any of its data files change.
+
+    loaded() returns the signatures of the files (see file_signature) that
+    the current snapshot was loaded from. A change is only acted on once
+    the signatures have been stable for one full poll interval, so a file
+    that is still being written is not loaded half-way through.
+    """
+
+    def __init__(self, paths, loaded, reload, interval=5.0):
+        super().__init__(name='snapshot-watcher', daemon=True)
+        self.paths = paths
+        self.loaded = loaded
+        self.reload = reload
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def signatures(self):
+        return tuple(file_signature(path) for path in self.paths)
+
+    def run(self):
+        pending = None
+        handled = None
+        while not self._stop_event.wait(self.interval):
+            signatures = self.signatures()
+            if signatures == self.loaded() or signatures == handled:
+                pending = None
+                continue
+            if signatures != pending:
+                pending = signatures
+                continue
+            try:
+                self.reload()
+            except Exception as e:
+                print(f"Error reloading {', '.join(self.paths)}: {e}")
+            # Don't retry the same broken files on every poll
+            handled = signatures
+            pending = None
+
+    def stop(self):
+        self._stop_event.set()
+
+
+def load_previous_store(path):
+    """The columnar snapshot at path, or None if there is none that loads"""
+    if not os.path.exists(os.path.join(path, 'manifest.json')):
+        return None
+    try:
+        return PropertyStore.load(path)
+    except Exception as e:
+        print(f"Error loading previous snapshot {path}: {e}")
+        return None
+
+
+def save_local_snapshot(store, path, build_table=True):
+    """
+    Save a store as a columnar snapshot at path with its similarity and
+    address indexes. The similar-properties table of the snapshot being
+    replaced is refreshed rather than rebuilt; without build_table no
+    table is saved, only the similarity vectors.
+    """
+    similarity_index, similar_table = load_similarity(store, load_previous_store(path), build_table=build_table)
+    extras, extra_info = similarity_arrays(similarity_index, similar_table)
+    extras.update(AddressIndex(store).arrays())
+    store.save(path, extras, extra_info)
+
+
+def timed(load):
+    """Run load() and return (result, seconds taken)"""
+    start = time.perf_counter()
+    result = load()
+    return result, time.perf_counter() - start
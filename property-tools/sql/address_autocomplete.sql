@@ -0,0 +1,9 @@
+-- Indexes for property_api.py's /api/properties/autocomplete in Supabase
+-- mode, which matches address and zip prefixes with ILIKE / LIKE.
+
+-- Trigram index so ILIKE 'W 84th%' on addresses doesn't scan the table
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE INDEX IF NOT EXISTS idx_properties_address_trgm ON properties USING gin (property_address gin_trgm_ops);
+
+-- Zip prefixes are case-free, so a plain pattern-ops btree serves LIKE '100%'
+CREATE INDEX IF NOT EXISTS idx_properties_zip_prefix ON properties (property_zip text_pattern_ops);
@@ -0,0 +1,64 @@
+-- Facet counts used by property_api.py's /api/properties?facets= in
+-- Supabase mode. All facets come from one scan of the matching rows
+-- using GROUPING SETS instead of one count query per facet value.
+
+-- Row counts per borough, property type, zoning code, MLS status and bedroom
+-- bucket (0-4, with 5 meaning five or more) over the properties matching the
+-- same filters as /api/properties. Returns one row per (facet, value).
+-- Replaces the version without max_sqft; a new argument list would otherwise add an overload
+DROP FUNCTION IF EXISTS property_facets(TEXT[], TEXT[], TEXT[], TEXT[], TEXT[], NUMERIC, NUMERIC, NUMERIC,
+                                        NUMERIC, NUMERIC, INTEGER);
+CREATE OR REPLACE FUNCTION property_facets(
+  boroughs TEXT[] DEFAULT NULL,
+  property_types TEXT[] DEFAULT NULL,
+  zoning_codes TEXT[] DEFAULT NULL,
+  mls_statuses TEXT[] DEFAULT NULL,
+  zip_codes TEXT[] DEFAULT NULL,
+  min_price NUMERIC DEFAULT NULL,
+  max_price NUMERIC DEFAULT NULL,
+  min_bedrooms NUMERIC DEFAULT NULL,
+  min_bathrooms NUMERIC DEFAULT NULL,
+  min_sqft NUMERIC DEFAULT NULL,
+  max_sqft NUMERIC DEFAULT NULL,
+  max_year_built INTEGER DEFAULT NULL
+)
+RETURNS TABLE (facet TEXT, value TEXT, count BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+  WITH filtered AS (
+    SELECT
+      borough,
+      property_type_detail,
+      zoning_code,
+      mls_status,
+      LEAST(GREATEST(floor(bedroom_count), 0), 5)::int AS bedrooms
+    FROM properties
+    WHERE (boroughs IS NULL OR borough = ANY(boroughs))
+      AND (property_types IS NULL OR property_type_detail = ANY(property_types))
+      AND (zoning_codes IS NULL OR zoning_code = ANY(zoning_codes))
+      AND (mls_statuses IS NULL OR mls_status = ANY(mls_statuses))
+      AND (zip_codes IS NULL OR left(property_zip::text, 5) = ANY(zip_codes))
+      AND (min_price IS NULL OR estimated_value >= min_price)
+      AND (max_price IS NULL OR estimated_value <= max_price)
+      AND (min_bedrooms IS NULL OR bedroom_count >= min_bedrooms)
+      AND (min_bathrooms IS NULL OR bathroom_count >= min_bathrooms)
+      AND (min_sqft IS NULL OR total_building_area_square_feet >= min_sqft)
+      AND (max_sqft IS NULL OR total_building_area_square_feet <= max_sqft)
+      AND (max_year_built IS NULL OR year_built <= max_year_built)
+  )
+  SELECT
+    CASE
+      WHEN GROUPING(borough) = 0 THEN 'borough'
+      WHEN GROUPING(property_type_detail) = 0 THEN 'property_type'
+      WHEN GROUPING(zoning_code) = 0 THEN 'zoning_code'
+      WHEN GROUPING(mls_status) = 0 THEN 'mls_status'
+      ELSE 'bedrooms'
+    END AS facet,
+    COALESCE(borough, property_type_detail, zoning_code, mls_status, bedrooms::text) AS value,
+    count(*) AS count
+  FROM filtered
+  GROUP BY GROUPING SETS ((borough), (property_type_detail), (zoning_code), (mls_status), (bedrooms))
+  HAVING COALESCE(borough, property_type_detail, zoning_code, mls_status, bedrooms::text) IS NOT NULL
+  ORDER BY 1, 3 DESC, 2;
+$$;
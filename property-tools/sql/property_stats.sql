@@ -0,0 +1,119 @@
+-- Aggregate statistics used by property_api.py's /api/properties/stats in
+-- Supabase mode, and by verify_data.py. Computing them in the database
+-- returns one small JSON document instead of every matching row.
+
+-- Summary statistics for one numeric column over the properties matching the
+-- same filters as /api/properties, optionally per borough, property type or
+-- five-digit zip. Returns a JSON array with one object per group:
+--   {group, count, min, max, mean, median, percentiles, histogram}
+-- percentiles are fractions (0.25 for the 25th percentile); histogram maps
+-- bucket number (1..bins, equal width between min and max) to row count.
+-- Replaces the version without max_sqft; a new argument list would otherwise add an overload
+DROP FUNCTION IF EXISTS property_stats(TEXT, TEXT, FLOAT8[], INTEGER, TEXT[], TEXT[], TEXT[], TEXT[], TEXT[],
+                                       NUMERIC, NUMERIC, NUMERIC, NUMERIC, NUMERIC, INTEGER);
+CREATE OR REPLACE FUNCTION property_stats(
+  stat_column TEXT,
+  group_column TEXT DEFAULT NULL,
+  percentiles FLOAT8[] DEFAULT '{0.1,0.25,0.5,0.75,0.9}',
+  bins INTEGER DEFAULT 10,
+  boroughs TEXT[] DEFAULT NULL,
+  property_types TEXT[] DEFAULT NULL,
+  zoning_codes TEXT[] DEFAULT NULL,
+  mls_statuses TEXT[] DEFAULT NULL,
+  zip_codes TEXT[] DEFAULT NULL,
+  min_price NUMERIC DEFAULT NULL,
+  max_price NUMERIC DEFAULT NULL,
+  min_bedrooms NUMERIC DEFAULT NULL,
+  min_bathrooms NUMERIC DEFAULT NULL,
+  min_sqft NUMERIC DEFAULT NULL,
+  max_sqft NUMERIC DEFAULT NULL,
+  max_year_built INTEGER DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+AS $$
+DECLARE
+  group_expression TEXT;
+  result JSONB;
+BEGIN
+  -- Column names are spliced into the query, so only allow known ones
+  IF stat_column NOT IN ('estimated_value', 'bedroom_count', 'bathroom_count',
+                         'total_building_area_square_feet', 'lot_size_square_feet',
+                         'year_built', 'last_sale_price', 'total_assessed_value',
+                         'mls_listing_amount') THEN
+    RAISE EXCEPTION 'Unsupported stat column: %', stat_column;
+  END IF;
+
+  group_expression := CASE group_column
+    WHEN 'borough' THEN 'borough'
+    WHEN 'property_type' THEN 'property_type_detail'
+    WHEN 'zip' THEN 'left(property_zip::text, 5)'
+    ELSE 'NULL::text'
+  END;
+  IF group_column IS NOT NULL AND group_expression = 'NULL::text' THEN
+    RAISE EXCEPTION 'Unsupported group column: %', group_column;
+  END IF;
+
+  EXECUTE format($query$
+    WITH filtered AS (
+      SELECT %1$I::float8 AS v, %2$s AS g
+      FROM properties
+      WHERE %1$I IS NOT NULL
+        AND ($1 IS NULL OR borough = ANY($1))
+        AND ($2 IS NULL OR property_type_detail = ANY($2))
+        AND ($3 IS NULL OR zoning_code = ANY($3))
+        AND ($4 IS NULL OR mls_status = ANY($4))
+        AND ($5 IS NULL OR estimated_value >= $5)
+        AND ($6 IS NULL OR estimated_value <= $6)
+        AND ($7 IS NULL OR bedroom_count >= $7)
+        AND ($8 IS NULL OR bathroom_count >= $8)
+        AND ($9 IS NULL OR total_building_area_square_feet >= $9)
+        AND ($10 IS NULL OR year_built <= $10)
+        AND ($13 IS NULL OR left(property_zip::text, 5) = ANY($13))
+        AND ($14 IS NULL OR total_building_area_square_feet <= $14)
+    ),
+    summary AS (
+      SELECT
+        g,
+        count(*) AS count,
+        min(v) AS min,
+        max(v) AS max,
+        avg(v) AS mean,
+        percentile_cont(0.5) WITHIN GROUP (ORDER BY v) AS median,
+        percentile_cont($11) WITHIN GROUP (ORDER BY v) AS percentiles
+      FROM filtered
+      WHERE g IS NOT NULL OR %3$L IS NULL
+      GROUP BY g
+    ),
+    buckets AS (
+      -- Like numpy.histogram: the maximum falls in the last bucket, and a
+      -- single repeated value in the middle bucket
+      SELECT
+        f.g,
+        CASE WHEN s.max = s.min THEN $12 / 2 + 1 ELSE LEAST(width_bucket(f.v, s.min, s.max, $12), $12) END AS bucket,
+        count(*) AS count
+      FROM filtered f
+      JOIN summary s ON s.g IS NOT DISTINCT FROM f.g
+      GROUP BY 1, 2
+    )
+    SELECT COALESCE(jsonb_agg(jsonb_build_object(
+      'group', s.g,
+      'count', s.count,
+      'min', s.min,
+      'max', s.max,
+      'mean', s.mean,
+      'median', s.median,
+      'percentiles', to_jsonb(s.percentiles),
+      'histogram', (SELECT jsonb_object_agg(b.bucket, b.count) FROM buckets b WHERE b.g IS NOT DISTINCT FROM s.g)
+    ) ORDER BY s.g), '[]'::jsonb)
+    FROM summary s
+  $query$, stat_column, group_expression, group_column)
+  INTO result
+  USING boroughs, property_types, zoning_codes, mls_statuses,
+        min_price, max_price, min_bedrooms, min_bathrooms, min_sqft, max_year_built,
+        percentiles, bins, zip_codes, max_sqft;
+
+  RETURN result;
+END;
+$$;
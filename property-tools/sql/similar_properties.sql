@@ -0,0 +1,47 @@
+-- Similar-properties lookup used by property_api.py in Supabase mode.
+-- Resolving the target row inside the database lets the API fetch a
+-- property and its similar properties concurrently in one round trip.
+
+-- Speed up single-property lookups
+CREATE INDEX IF NOT EXISTS idx_properties_property_id ON properties (property_id);
+
+-- Same criteria as find_similar_properties: same borough, at most one fewer
+-- bedroom/bathroom, and an estimated value within 30% of the target
+CREATE OR REPLACE FUNCTION similar_properties(target_id INTEGER, max_results INTEGER DEFAULT 3)
+RETURNS SETOF properties
+LANGUAGE sql
+STABLE
+AS $$
+  WITH target AS (
+    SELECT
+      borough,
+      GREATEST(0, COALESCE(bedroom_count, 0) - 1) AS min_bedrooms,
+      GREATEST(0, COALESCE(bathroom_count, 0) - 1) AS min_bathrooms,
+      COALESCE(estimated_value, 0) AS estimated_value
+    FROM properties
+    WHERE property_id = target_id
+    LIMIT 1
+  )
+  SELECT p.*
+  FROM properties p, target t
+  WHERE p.property_id <> target_id
+    AND (t.borough IS NULL OR p.borough = t.borough)
+    AND (t.min_bedrooms = 0 OR p.bedroom_count >= t.min_bedrooms)
+    AND (t.min_bathrooms = 0 OR p.bathroom_count >= t.min_bathrooms)
+    AND (t.estimated_value = 0 OR p.estimated_value BETWEEN t.estimated_value * 0.7 AND t.estimated_value * 1.3)
+  ORDER BY p.estimated_value DESC
+  LIMIT max_results;
+$$;
+
+-- Similar properties for several targets in one call, used by the batch
+-- endpoint; returns one row per target with its matches as a JSON array
+CREATE OR REPLACE FUNCTION similar_properties_batch(target_ids INTEGER[], max_results INTEGER DEFAULT 3)
+RETURNS TABLE (target_id INTEGER, similar JSONB)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT
+    t.id,
+    COALESCE((SELECT jsonb_agg(to_jsonb(s)) FROM similar_properties(t.id, max_results) s), '[]'::jsonb)
+  FROM unnest(target_ids) AS t(id);
+$$;
@@ -0,0 +1,116 @@
+"""
+Synthetic Property Data for Beacon
+
+Generates datasets shaped like cleaned_data/all_properties.json at any
+size, for benchmarks. Each synthetic row starts from a randomly chosen
+real row, which keeps the columns' joint distributions, null patterns
+and value mix (boroughs, zips, zoning codes, ZIP vs ZIP+4). The numbers
+are then jittered and the house number and ZIP+4 suffix redrawn, so
+rows are distinct and the sort indexes see realistic spreads.
+
+    python synthetic_data.py 1000000 cleaned_data/synthetic_1m.json
+"""
+
+import re
+import sys
+import json
+import numpy as np
+
+TEMPLATE_FILE = 'cleaned_data/all_properties.json'
+
+# Relative spread of the multiplicative noise on money and area columns
+VALUE_JITTER = 0.15
+MONEY_AND_AREA_COLUMNS = [
+    'estimated_value',
+    'last_sale_price',
+    'total_assessed_value',
+    'mls_listing_amount',
+    'total_building_area_square_feet',
+    'lot_size_square_feet'
+]
+
+# Largest +/- change to room counts and year built
+COUNT_JITTER = {'bedroom_count': 1, 'bathroom_count': 1, 'year_built': 5}
+
+# Standard deviation of the shift applied to dates, in days
+DATE_JITTER_DAYS = 180
+DATE_COLUMNS = ['last_sale_date', 'mls_listing_date']
+MS_PER_DAY = 86400000
+
+HOUSE_NUMBER = re.compile(r'^(\d+)(.*)$')
+
+
+def load_templates(path=TEMPLATE_FILE):
+    """Real property records to draw rows from"""
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def generate_properties(rows, seed=0, templates=None):
+    """
+    {column: list of values} for rows synthetic properties, ready for
+    PropertyStore.from_columns(). The same seed gives the same data.
+    """
+    templates = templates if templates is not None else load_templates()
+    rng = np.random.default_rng(seed)
+    picks = rng.integers(0, len(templates), rows)
+    names = list(templates[0].keys())
+
+    columns = {}
+    for name in names:
+        source = [templates[i].get(name) for i in range(len(templates))]
+        values = [source[i] for i in picks.tolist()]
+        if name == 'property_id':
+            values = list(range(1, rows + 1))
+        elif name in MONEY_AND_AREA_COLUMNS:
+            noise = rng.lognormal(0.0, VALUE_JITTER, rows).tolist()
+            values = [None if v is None else float(round(v * n)) for v, n in zip(values, noise)]
+        elif name in COUNT_JITTER:
+            steps = rng.integers(-COUNT_JITTER[name], COUNT_JITTER[name] + 1, rows).tolist()
+            values = [None if v is None else float(max(0, v + s)) for v, s in zip(values, steps)]
+        elif name in DATE_COLUMNS:
+            shifts = (rng.normal(0.0, DATE_JITTER_DAYS, rows).round() * MS_PER_DAY).astype(np.int64).tolist()
+            values = [None if v is None else v + s for v, s in zip(values, shifts)]
+        elif name == 'property_address':
+            numbers = rng.integers(1, 2000, rows).tolist()
+            values = [renumber(v, n) for v, n in zip(values, numbers)]
+        elif name == 'property_zip':
+            suffixes = rng.integers(1, 10000, rows).tolist()
+            values = [rezip(v, s) for v, s in zip(values, suffixes)]
+        columns[name] = values
+    return columns
+
+
+def renumber(address, number):
+    """Replace the house number of an address, if it has one"""
+    if not address:
+        return address
+    match = HOUSE_NUMBER.match(address)
+    return f"{number}{match.group(2)}" if match else address
+
+
+def rezip(zip_code, suffix):
+    """Draw a new ZIP+4 suffix, keeping five-digit and integer zips as they are"""
+    if isinstance(zip_code, str) and len(zip_code) == 10:
+        return f"{zip_code[:5]}-{suffix:04d}"
+    return zip_code
+
+
+def write_json(columns, path):
+    """Write columns as a JSON array of records, one record at a time"""
+    names = list(columns)
+    rows = len(columns[names[0]]) if names else 0
+    with open(path, 'w') as f:
+        f.write('[')
+        for row in range(rows):
+            if row:
+                f.write(',')
+            f.write(json.dumps({name: columns[name][row] for name in names}))
+        f.write(']')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print("Usage: python synthetic_data.py <rows> <output.json>")
+        sys.exit(1)
+    write_json(generate_properties(int(sys.argv[1])), sys.argv[2])
@@ -0,0 +1,59 @@
+"""
+Property Stats SQL Tests for Beacon
+
+Renders the dynamic query in sql/property_stats.sql the way the
+function's format() call does, and checks which columns each CTE reads.
+
+Run from property-tools with: python -m pytest test_property_stats_sql.py
+"""
+
+import os
+import re
+
+SQL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sql', 'property_stats.sql')
+
+# The group expressions the function splices in, by group_column
+GROUP_EXPRESSIONS = {
+    'borough': 'borough',
+    'property_type': 'property_type_detail',
+    'zip': 'left(property_zip::text, 5)',
+    None: 'NULL::text'
+}
+
+
+def render(stat_column, group_column):
+    """The query text format() builds for a stat and group column"""
+    with open(SQL_FILE, 'r') as f:
+        template = re.search(r'\$query\$(.*?)\$query\$', f.read(), re.S).group(1)
+    literal = 'NULL' if group_column is None else "'" + group_column.replace("'", "''") + "'"
+    arguments = {'1': stat_column, '2': GROUP_EXPRESSIONS[group_column], '3': literal}
+    return re.sub(r'%(\d)\$[IsL]', lambda m: arguments[m.group(1)], template)
+
+
+def cte(query, name):
+    """Body of one CTE of a rendered query"""
+    start = query.index(f"{name} AS (") + len(f"{name} AS (")
+    depth = 1
+    for position in range(start, len(query)):
+        depth += {'(': 1, ')': -1}.get(query[position], 0)
+        if depth == 0:
+            return query[start:position]
+    raise ValueError(f"Unterminated CTE {name}")
+
+
+def test_grouped_summary_reads_only_filtered_columns():
+    for group_column in ('borough', 'property_type', 'zip'):
+        summary = cte(render('estimated_value', group_column), 'summary')
+        # filtered only has v and g; the source columns are out of scope here
+        assert GROUP_EXPRESSIONS[group_column] not in re.sub(r"'[^']*'", "''", summary)
+        assert 'WHERE g IS NOT NULL' in summary
+
+
+def test_grouped_query_groups_by_the_expression():
+    filtered = cte(render('estimated_value', 'zip'), 'filtered')
+    assert 'left(property_zip::text, 5) AS g' in filtered
+
+
+def test_ungrouped_query_keeps_the_null_group():
+    summary = cte(render('estimated_value', None), 'summary')
+    assert 'OR NULL IS NULL' in summary
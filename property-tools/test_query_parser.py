@@ -0,0 +1,32 @@
+"""
+Query Parser Tests for Beacon
+
+Run from property-tools with: python -m pytest test_query_parser.py
+"""
+
+from query_parser import parse_property_query
+
+
+def test_sqft_upper_bound_is_max_sqft():
+    params = parse_property_query("under 2000 sqft")
+    assert params['max_sqft'] == 2000
+    assert 'min_sqft' not in params
+
+
+def test_sqft_upper_bound_with_comma_and_square_feet():
+    params = parse_property_query("less than 1,500 square feet")
+    assert params['max_sqft'] == 1500
+    assert 'min_sqft' not in params
+
+
+def test_sqft_without_bound_word_is_min_sqft():
+    params = parse_property_query("2000+ sqft in Brooklyn")
+    assert params['min_sqft'] == 2000
+    assert 'max_sqft' not in params
+
+
+def test_condo_is_a_property_type():
+    params = parse_property_query("2 bed condos in Brooklyn")
+    assert params['property_type'] == ['Condominium', 'Condominium Unit']
+    assert params['borough'] == ['Brooklyn']
+    assert parse_property_query("a condo")['property_type'] == ['Condominium', 'Condominium Unit']
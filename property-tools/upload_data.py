@@ -2,6 +2,7 @@ import os
 import json
 import time
 import datetime
+import requests
 from dotenv import load_dotenv
 from supabase import create_client
 
@@ -12,6 +13,9 @@ load_dotenv()
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
 
+# Running property API to notify so it drops cached query results after an upload
+PROPERTY_API_URL = os.getenv('PROPERTY_API_URL', 'http://localhost:5000')
+
 def convert_timestamp_to_date(timestamp):
     """Convert Unix timestamp (milliseconds) to ISO date string"""
     if not timestamp or not isinstance(timestamp, (int, float)):
@@ -43,6 +47,18 @@ def cast_value(value, target_type):
     except:
         return None
 
+def invalidate_api_cache():
+    """Ask the property API to drop cached query results for the old data; one request reaches every worker"""
+    try:
+        response = requests.post(f"{PROPERTY_API_URL}/api/admin/cache/invalidate",
+                                 headers={'X-Admin-Token': os.getenv('ADMIN_TOKEN', '')}, timeout=5)
+        if response.status_code == 200:
+            print("Property API query cache invalidated.")
+        else:
+            print(f"Could not invalidate property API cache: {response.status_code}")
+    except requests.exceptions.RequestException as e:
+        print(f"Property API not reachable, cache not invalidated: {e}")
+
 def upload_data():
     """Upload property data to Supabase"""
     if not SUPABASE_URL or not SUPABASE_KEY:
@@ -151,6 +167,9 @@ def upload_data():
         print(f"Successful records: {success_count}")
         print(f"Failed records: {error_count}")
         
+        if success_count > 0:
+            invalidate_api_cache()
+        
     except Exception as e:
         print(f"Error: {e}")
 
@@ -83,21 +83,19 @@ def verify_supabase_data():
         # Data statistics
         print("\nCalculating data statistics...")
         
-        # Get data to calculate statistics manually (since direct aggregates aren't working)
-        value_data_response = supabase.from_('properties').select('estimated_value').filter('estimated_value', 'not.is', 'null').execute()
-        
-        if value_data_response.data:
-            # Extract the values
-            values = [p.get('estimated_value') for p in value_data_response.data if p.get('estimated_value') is not None]
+        # Aggregate in the database with the property_stats function (sql/property_stats.sql)
+        try:
+            stats_response = supabase.rpc('property_stats', {'stat_column': 'estimated_value'}).execute()
+            stats = stats_response.data[0] if stats_response.data else None
             
-            if values:
-                min_price = min(values)
-                max_price = max(values)
-                avg_price = sum(values) / len(values)
-                
-                print(f"  Price Range: {format_value(min_price)} - {format_value(max_price)}")
-                print(f"  Average Price: {format_value(avg_price)}")
-                print(f"  Sample Size: {len(values)} properties with price data")
+            if stats and stats.get('count'):
+                print(f"  Price Range: {format_value(stats['min'])} - {format_value(stats['max'])}")
+                print(f"  Average Price: {format_value(stats['mean'])}")
+                print(f"  Median Price: {format_value(stats['median'])}")
+                print(f"  Sample Size: {stats['count']} properties with price data")
+        except Exception as e:
+            print(f"Error calculating statistics: {e}")
+            print("Make sure sql/property_stats.sql has been run against the database.")
         
         # Borough distribution - we'll count records
         manhattan_count_response = supabase.from_('properties').select('*', count='exact').eq('borough', 'Manhattan').limit(1).execute()
@@ -0,0 +1,19 @@
+"""
+WSGI Entry Point for Beacon's Property API
+
+Builds the app once in the server's master process (gunicorn's
+preload_app) so the property snapshot is loaded before workers fork:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The store is memory-mapped from the columnar snapshot, so every worker
+reads the same physical pages. Objects that already exist are moved out
+of the garbage collector's reach so collections in the workers don't
+write to, and so un-share, the pages they inherited.
+"""
+
+import gc
+from property_api import create_app
+
+app = create_app(shared=True, watch=False)
+gc.freeze()
@@ -1,13 +1,22 @@
 import os
 import re
+import sys
 import json
+import time
+import uuid
 import sqlite3
-from flask import Flask, render_template, request, jsonify, g, make_response, session
+from flask import Flask, render_template, request, jsonify, g, make_response, session, Response, stream_with_context
+from itsdangerous import URLSafeTimedSerializer, BadSignature
 from dotenv import load_dotenv
 import tiktoken
 # Import without any proxies or custom settings
 from openai import OpenAI
 
+# Add parent directory to path so we can import from the project root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from utils.metrics import instrument_app, stage, observe_stage
+from utils.profiling import instrument_profiling, start_continuous_profiler
+
 # Load environment variables
 load_dotenv()
 
@@ -17,6 +26,11 @@ app = Flask(__name__,
             template_folder='templates')
 app.secret_key = os.getenv('SECRET_KEY', 'beacon-default-secret')
 
+# Per-route and per-stage latency histograms, served at /metrics
+instrument_app(app, 'beacon_chat')
+# Per-request profiles for requests sent with X-Profile, listed at /api/admin/profiles
+instrument_profiling(app)
+
 # Initialize OpenAI client
 client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
 OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-4-turbo')
@@ -38,8 +52,9 @@ TOKEN_PRICING = {
 # Token counting functions
 def num_tokens_from_string(string, model):
     """Returns the number of tokens in a text string."""
-    encoding = tiktoken.encoding_for_model(model)
-    num_tokens = len(encoding.encode(string))
+    with stage('tokenize'):
+        encoding = tiktoken.encoding_for_model(model)
+        num_tokens = len(encoding.encode(string))
     return num_tokens
 
 def calculate_cost(input_tokens, output_tokens, model=OPENAI_MODEL):
@@ -113,20 +128,61 @@ def close_connection(exception):
 
 def query_db(query, args=(), one=False):
     """Execute a database query and return results"""
-    cur = get_db().execute(query, args)
-    rv = cur.fetchall()
-    cur.close()
+    with stage('sqlite'):
+        cur = get_db().execute(query, args)
+        rv = cur.fetchall()
+        cur.close()
     return (rv[0] if rv else None) if one else rv
 
 def insert_db(query, args=()):
     """Insert data into the database"""
-    db = get_db()
-    cur = db.execute(query, args)
-    db.commit()
-    last_id = cur.lastrowid
-    cur.close()
+    with stage('sqlite'):
+        db = get_db()
+        cur = db.execute(query, args)
+        db.commit()
+        last_id = cur.lastrowid
+        cur.close()
     return last_id
 
+# Tokens and cost per conversation, recorded server-side so the budget
+# holds even when a client never sends its updated session back
+CHAT_USAGE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_usage (
+    conversation_id TEXT PRIMARY KEY,
+    input_tokens INTEGER NOT NULL DEFAULT 0,
+    output_tokens INTEGER NOT NULL DEFAULT 0,
+    cost REAL NOT NULL DEFAULT 0,
+    turns INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+def record_chat_usage(conversation_id, input_tokens, output_tokens):
+    """Add one turn's tokens and cost to the conversation's server-side usage"""
+    try:
+        insert_db(
+            """INSERT INTO chat_usage (conversation_id, input_tokens, output_tokens, cost, turns)
+               VALUES (?, ?, ?, ?, 1)
+               ON CONFLICT(conversation_id) DO UPDATE SET
+                   input_tokens = input_tokens + excluded.input_tokens,
+                   output_tokens = output_tokens + excluded.output_tokens,
+                   cost = cost + excluded.cost,
+                   turns = turns + 1,
+                   updated_at = CURRENT_TIMESTAMP""",
+            (conversation_id, input_tokens, output_tokens, calculate_cost(input_tokens, output_tokens))
+        )
+    except sqlite3.Error as e:
+        print(f"Error recording chat usage: {e}")
+
+def recorded_chat_cost(conversation_id):
+    """Cost recorded server-side for a conversation so far"""
+    try:
+        row = query_db('SELECT cost FROM chat_usage WHERE conversation_id = ?', (conversation_id,), one=True)
+    except sqlite3.Error as e:
+        print(f"Error reading chat usage: {e}")
+        return 0.0
+    return row['cost'] if row else 0.0
+
 # System prompt construction
 def create_system_prompt():
     knowledge_json = json.dumps(NYC_REAL_ESTATE_KNOWLEDGE, indent=2)
@@ -176,6 +232,7 @@ def get_conversation_state():
     """Get or initialize the conversation state"""
     if 'conversation' not in session:
         session['conversation'] = {
+            'id': uuid.uuid4().hex,
             'messages': [],
             'token_count': {
                 'input': 0,
@@ -194,6 +251,9 @@ def get_conversation_state():
                 'email': None
             }
         }
+    elif 'id' not in session['conversation']:
+        # Conversations started before usage was recorded server-side
+        session['conversation']['id'] = uuid.uuid4().hex
     return session['conversation']
 
 def update_conversation_state(user_message, assistant_message, input_tokens, output_tokens):
@@ -218,9 +278,9 @@ def update_conversation_state(user_message, assistant_message, input_tokens, out
     return state
 
 def is_within_budget():
-    """Check if the conversation is still within budget"""
+    """Check if the conversation is still within budget, by the larger of the session and server-side costs"""
     state = get_conversation_state()
-    return state['cost'] < MAX_BUDGET_DOLLARS
+    return max(state['cost'], recorded_chat_cost(state['id'])) < MAX_BUDGET_DOLLARS
 
 # Routes
 @app.route('/')
@@ -242,11 +302,12 @@ def test_openai():
         # Try a simple completion to test the API
         print(f"Testing OpenAI API with key starting with: {api_key[:5]}...")
         test_client = OpenAI(api_key=api_key)
-        completion = test_client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[{"role": "user", "content": "Hello, are you working?"}],
-            max_tokens=10
-        )
+        with stage('openai'):
+            completion = test_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[{"role": "user", "content": "Hello, are you working?"}],
+                max_tokens=10
+            )
         return jsonify({
             'success': True,
             'message': completion.choices[0].message.content,
@@ -289,91 +350,123 @@ def handle_message():
     
     return jsonify(response)
 
+# OpenAI chat
+OVER_BUDGET_MESSAGE = "I've enjoyed our conversation about NYC real estate investments, but I need to head to another client meeting now. Would you like to leave your email so I can send you some property recommendations that match what we've discussed?"
+CHAT_ERROR_MESSAGE = "I'm sorry, I'm having trouble connecting with our property database right now. Could you please try again in a moment?"
+
+# Seconds a streamed reply's signed conversation state can still be committed
+STREAM_STATE_MAX_AGE = int(os.getenv('STREAM_STATE_MAX_AGE', '600'))
+
+def start_chat_turn(data):
+    """Read a chat request, merging any user info it carries into the conversation state"""
+    user_message = data.get('message', '')
+    user_info = data.get('user_info', {})
+    
+    print(f"Received message: {user_message}")
+    
+    # Get conversation state
+    state = get_conversation_state()
+    
+    # Update collected info if provided
+    if user_info:
+        for key, value in user_info.items():
+            if value and key in state['collected_info']:
+                state['collected_info'][key] = value
+    
+    return user_message, state
+
+def chat_messages(state, user_message):
+    """OpenAI messages for the next turn and their input token count"""
+    messages = [
+        {"role": "system", "content": create_system_prompt()}
+    ]
+    
+    # Add conversation history
+    for msg in state['messages']:
+        messages.append({"role": msg['role'], "content": msg['content']})
+    
+    # Add user's current message
+    messages.append({"role": "user", "content": user_message})
+    
+    # Count input tokens
+    input_text = create_system_prompt() + "".join([m['content'] for m in state['messages']]) + user_message
+    input_tokens = num_tokens_from_string(input_text, OPENAI_MODEL)
+    
+    return messages, input_tokens
+
+def create_chat_completion(messages, stream=False):
+    """Call OpenAI with the preferred model, falling back to GPT-3.5 if needed; returns (response, model)"""
+    model_to_use = OPENAI_MODEL
+    print(f"Calling OpenAI API with model: {model_to_use}")
+    
+    try:
+        # Call OpenAI API with preferred model
+        response = client.chat.completions.create(
+            model=model_to_use,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            stream=stream
+        )
+    except Exception as model_error:
+        print(f"Error with model {model_to_use}: {str(model_error)}")
+        print(f"Falling back to {FALLBACK_MODEL}")
+        model_to_use = FALLBACK_MODEL
+        # Try with fallback model
+        response = client.chat.completions.create(
+            model=model_to_use,
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+            stream=stream
+        )
+    
+    return response, model_to_use
+
+def finish_chat_turn(state, user_message, assistant_message, input_tokens, model_to_use):
+    """Record a completed turn: token accounting, history and any extracted user info"""
+    print(f"Received response from OpenAI using {model_to_use}")
+    
+    # Count output tokens
+    output_tokens = num_tokens_from_string(assistant_message, model_to_use)
+    
+    # Update conversation state
+    update_conversation_state(user_message, assistant_message, input_tokens, output_tokens)
+    record_chat_usage(state['id'], input_tokens, output_tokens)
+    
+    # Extract information from the message
+    extracted_info = extract_info_from_message(user_message, assistant_message)
+    if extracted_info:
+        for key, value in extracted_info.items():
+            if value and key in state['collected_info']:
+                state['collected_info'][key] = value
+    
+    return state
+
 # New API endpoint for OpenAI chat
 @app.route('/api/openai_chat', methods=['POST'])
 def openai_chat():
     """Process chat messages through OpenAI API"""
     try:
-        data = request.json
-        user_message = data.get('message', '')
-        user_info = data.get('user_info', {})
-        
-        print(f"Received message: {user_message}")
-        
-        # Get conversation state
-        state = get_conversation_state()
-        
-        # Update collected info if provided
-        if user_info:
-            for key, value in user_info.items():
-                if value and key in state['collected_info']:
-                    state['collected_info'][key] = value
+        user_message, state = start_chat_turn(request.json)
         
         # Check if we're over budget
         if not is_within_budget():
             return jsonify({
-                'message': "I've enjoyed our conversation about NYC real estate investments, but I need to head to another client meeting now. Would you like to leave your email so I can send you some property recommendations that match what we've discussed?",
+                'message': OVER_BUDGET_MESSAGE,
                 'over_budget': True,
                 'state': state
             })
         
-        # Prepare messages for OpenAI
-        messages = [
-            {"role": "system", "content": create_system_prompt()}
-        ]
-        
-        # Add conversation history
-        for msg in state['messages']:
-            messages.append({"role": msg['role'], "content": msg['content']})
-        
-        # Add user's current message
-        messages.append({"role": "user", "content": user_message})
+        messages, input_tokens = chat_messages(state, user_message)
         
-        # Count input tokens
-        input_text = create_system_prompt() + "".join([m['content'] for m in state['messages']]) + user_message
-        input_tokens = num_tokens_from_string(input_text, OPENAI_MODEL)
-        
-        # Try with the preferred model first, then fall back to GPT-3.5 if needed
-        model_to_use = OPENAI_MODEL
-        print(f"Calling OpenAI API with model: {model_to_use}")
-        
-        try:
-            # Call OpenAI API with preferred model
-            response = client.chat.completions.create(
-                model=model_to_use,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
-        except Exception as model_error:
-            print(f"Error with model {model_to_use}: {str(model_error)}")
-            print(f"Falling back to {FALLBACK_MODEL}")
-            model_to_use = FALLBACK_MODEL
-            # Try with fallback model
-            response = client.chat.completions.create(
-                model=model_to_use,
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
-            )
+        with stage('openai'):
+            response, model_to_use = create_chat_completion(messages)
         
         # Get assistant's response
         assistant_message = response.choices[0].message.content
         
-        print(f"Received response from OpenAI using {model_to_use}")
-        
-        # Count output tokens
-        output_tokens = num_tokens_from_string(assistant_message, model_to_use)
-        
-        # Update conversation state
-        update_conversation_state(user_message, assistant_message, input_tokens, output_tokens)
-        
-        # Extract information from the message
-        extracted_info = extract_info_from_message(user_message, assistant_message)
-        if extracted_info:
-            for key, value in extracted_info.items():
-                if value and key in state['collected_info']:
-                    state['collected_info'][key] = value
+        finish_chat_turn(state, user_message, assistant_message, input_tokens, model_to_use)
         
         return jsonify({
             'message': assistant_message,
@@ -385,10 +478,103 @@ def openai_chat():
         print(f"ERROR in OpenAI chat: {str(e)}")
         print(f"Error details: {error_details}")
         return jsonify({
-            'message': "I'm sorry, I'm having trouble connecting with our property database right now. Could you please try again in a moment?",
+            'message': CHAT_ERROR_MESSAGE,
             'error': str(e)
         }), 500
 
+def stream_state_serializer():
+    """Signs conversation state handed to the browser at the end of a stream"""
+    return URLSafeTimedSerializer(app.secret_key, salt='beacon-chat-stream')
+
+def sse_event(event, data):
+    """One Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/openai_chat/stream', methods=['POST'])
+def openai_chat_stream():
+    """
+    Like /api/openai_chat, but sends the reply as Server-Sent Events while
+    OpenAI generates it: "token" events carry each piece of text, then a
+    "done" event carries the full message and the updated state (or an
+    "error" event). The session cookie has already gone out with the
+    headers by the end of the stream, so "done" also carries the new state
+    signed as "session"; the client posts it to /api/openai_chat/commit to
+    keep the transcript. Tokens and cost are recorded server-side when the
+    stream ends, even if the client disconnects or never commits, and the
+    budget check reads them from there.
+    """
+    data = request.get_json(silent=True) or {}
+    # Create the conversation (and its usage id) now, so the session cookie
+    # sent with the headers carries it even if the client never commits
+    get_conversation_state()
+    
+    def generate():
+        try:
+            user_message, state = start_chat_turn(data)
+            
+            # Check if we're over budget
+            if not is_within_budget():
+                yield sse_event('done', {'message': OVER_BUDGET_MESSAGE, 'over_budget': True, 'state': state})
+                return
+            
+            messages, input_tokens = chat_messages(state, user_message)
+            
+            started = time.perf_counter()
+            stream, model_to_use = create_chat_completion(messages, stream=True)
+            
+            # Pass each piece of the reply through as soon as it arrives
+            parts = []
+            streamed = False
+            try:
+                for chunk in stream:
+                    content = chunk.choices[0].delta.content if chunk.choices else None
+                    if not content:
+                        continue
+                    if not parts:
+                        observe_stage('openai_first_token', time.perf_counter() - started)
+                    parts.append(content)
+                    yield sse_event('token', {'content': content})
+                streamed = True
+            finally:
+                if not streamed:
+                    # The client went away or the stream broke: still count what was generated
+                    record_chat_usage(state['id'], input_tokens,
+                                      num_tokens_from_string(''.join(parts), model_to_use))
+            observe_stage('openai', time.perf_counter() - started)
+            
+            assistant_message = ''.join(parts)
+            finish_chat_turn(state, user_message, assistant_message, input_tokens, model_to_use)
+            
+            yield sse_event('done', {
+                'message': assistant_message,
+                'state': state,
+                'session': stream_state_serializer().dumps(state)
+            })
+        except Exception as e:
+            import traceback
+            error_details = traceback.format_exc()
+            print(f"ERROR in OpenAI chat stream: {str(e)}")
+            print(f"Error details: {error_details}")
+            yield sse_event('error', {'message': CHAT_ERROR_MESSAGE, 'error': str(e)})
+    
+    response = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    # Keep proxies from buffering the stream
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/openai_chat/commit', methods=['POST'])
+def commit_chat_stream():
+    """Save the signed conversation state (transcript and collected info) from a finished stream into the session"""
+    data = request.get_json(silent=True) or {}
+    try:
+        state = stream_state_serializer().loads(data.get('session', ''), max_age=STREAM_STATE_MAX_AGE)
+    except BadSignature:
+        return jsonify({'error': 'Invalid or expired conversation state'}), 400
+    
+    session['conversation'] = state
+    return jsonify({'state': state})
+
 # Simple information extraction function
 def extract_info_from_message(user_message, assistant_message):
     """Extract investment preferences from messages"""
@@ -542,7 +728,13 @@ def get_property_recommendation():
     else:
         return jsonify({'error': 'No matching properties found'}), 404
 
-if __name__ == '__main__':
+def create_app():
+    """
+    Prepare the database and return the app.
+
+    A preforking server calls this once in the master process, so the
+    database is initialized before any worker starts taking requests.
+    """
     # Ensure database directory exists
     os.makedirs(os.path.dirname(DATABASE), exist_ok=True)
     
@@ -551,5 +743,15 @@ if __name__ == '__main__':
         from database.init_db import init_db
         init_db()
     
+    # Databases created before usage was recorded server-side lack the table
+    with sqlite3.connect(DATABASE) as db:
+        db.execute(CHAT_USAGE_SCHEMA)
+    
+    return app
+
+if __name__ == '__main__':
+    create_app()
+    start_continuous_profiler()
+    
     # Run the app on all network interfaces with port 8080 instead of 5000
     app.run(debug=True, host='0.0.0.0', port=8080)
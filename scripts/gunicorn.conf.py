@@ -0,0 +1,32 @@
+"""
+Gunicorn Settings for the Beacon Chat App
+
+Preforking multi-process serving for app.py; see wsgi.py. Every setting
+can be overridden from the environment.
+"""
+
+import os
+import multiprocessing
+
+bind = os.getenv('BIND', '0.0.0.0:8080')
+
+# Chat requests mostly wait on OpenAI, so each worker runs several threads
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Import the app and set up the database once in the master
+preload_app = True
+
+# OpenAI completions can take a while
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    """Start this worker's continuous profiler; the master's threads don't survive the fork"""
+    from utils.profiling import start_continuous_profiler
+    start_continuous_profiler()
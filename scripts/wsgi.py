@@ -0,0 +1,15 @@
+"""
+WSGI Entry Point for the Beacon Chat App
+
+Builds the app once in the server's master process (gunicorn's
+preload_app), then forks the workers:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+from app import create_app
+
+app = create_app()
+# Keep the garbage collector from touching, and so un-sharing, inherited objects
+gc.freeze()
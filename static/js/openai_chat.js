@@ -76,8 +76,8 @@ async function processUserMessage(message) {
     sendButton.disabled = true;
     
     try {
-        // Send message to backend
-        const response = await fetch('/api/openai_chat', {
+        // Send message to backend; the reply streams back as Server-Sent Events
+        const response = await fetch('/api/openai_chat/stream', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -88,29 +88,41 @@ async function processUserMessage(message) {
             })
         });
         
-        const data = await response.json();
+        if (!response.ok || !response.body) {
+            throw new Error(`Chat request failed with status ${response.status}`);
+        }
         
-        // Update conversation state
-        if (data.state) {
-            // Update collected information if available
-            if (data.state.collected_info) {
-                const info = data.state.collected_info;
-                
-                // Update our local state with the backend's state
-                if (info.name) conversationState.userInfo.name = info.name;
-                if (info.email) conversationState.userInfo.email = info.email;
-                if (info.investment_strategy) conversationState.userInfo.investment_strategy = info.investment_strategy;
-                if (info.boroughs && info.boroughs.length) conversationState.userInfo.boroughs = info.boroughs;
-                if (info.neighborhoods && info.neighborhoods.length) conversationState.userInfo.neighborhoods = info.neighborhoods;
-                if (info.property_types && info.property_types.length) conversationState.userInfo.property_types = info.property_types;
-                if (info.min_budget) conversationState.userInfo.min_budget = info.min_budget;
-                if (info.max_budget) conversationState.userInfo.max_budget = info.max_budget;
-                if (info.risk_tolerance) conversationState.userInfo.risk_tolerance = info.risk_tolerance;
+        // Show each piece of the reply as soon as it arrives
+        const botMessage = startBotMessage();
+        let data = null;
+        await readEventStream(response, (event, payload) => {
+            if (event === 'token') {
+                botMessage.append(payload.content);
+            } else if (event === 'done' || event === 'error') {
+                data = payload;
             }
+        });
+        
+        if (!data) {
+            throw new Error('Chat stream ended without a reply');
         }
+        botMessage.finish(data.message, Boolean(data.error));
         
-        // Add bot response to UI
-        addBotMessage(data.message);
+        // The session cookie went out before the reply finished; save the final state now
+        if (data.session) {
+            await fetch('/api/openai_chat/commit', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify({ session: data.session })
+            });
+        }
+        
+        // Update conversation state
+        if (data.state) {
+            updateUserInfo(data.state);
+        }
         
         // Check if we've collected enough information to show property
         if (shouldShowProperty()) {
@@ -134,6 +146,89 @@ async function processUserMessage(message) {
     }
 }
 
+// Update our local state with the backend's collected information
+function updateUserInfo(state) {
+    if (!state.collected_info) return;
+    const info = state.collected_info;
+    
+    if (info.name) conversationState.userInfo.name = info.name;
+    if (info.email) conversationState.userInfo.email = info.email;
+    if (info.investment_strategy) conversationState.userInfo.investment_strategy = info.investment_strategy;
+    if (info.boroughs && info.boroughs.length) conversationState.userInfo.boroughs = info.boroughs;
+    if (info.neighborhoods && info.neighborhoods.length) conversationState.userInfo.neighborhoods = info.neighborhoods;
+    if (info.property_types && info.property_types.length) conversationState.userInfo.property_types = info.property_types;
+    if (info.min_budget) conversationState.userInfo.min_budget = info.min_budget;
+    if (info.max_budget) conversationState.userInfo.max_budget = info.max_budget;
+    if (info.risk_tolerance) conversationState.userInfo.risk_tolerance = info.risk_tolerance;
+}
+
+// Read a text/event-stream response, calling onEvent(name, data) for each event
+async function readEventStream(response, onEvent) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            
+            let event = 'message';
+            const data = [];
+            for (const line of block.split('\n')) {
+                if (line.startsWith('event:')) event = line.slice(6).trim();
+                else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+            }
+            if (data.length) onEvent(event, JSON.parse(data.join('\n')));
+        }
+    }
+}
+
+// Add an empty bot message that fills in as the reply streams
+function startBotMessage() {
+    const messageElement = document.createElement('div');
+    messageElement.className = 'message bot-message';
+    
+    // Create avatar element
+    const avatar = document.createElement('div');
+    avatar.className = 'bot-avatar';
+    avatar.innerHTML = '<i class="fas fa-robot"></i>';
+    
+    const content = document.createElement('div');
+    content.className = 'message-content';
+    messageElement.appendChild(avatar);
+    messageElement.appendChild(content);
+    
+    chatMessages.appendChild(messageElement);
+    scrollToBottom();
+    
+    return {
+        append(text) {
+            content.textContent += text;
+            scrollToBottom();
+        },
+        finish(message, replace) {
+            // Error and over-budget replies arrive whole, replacing any partial text
+            if (replace || !content.textContent) {
+                content.textContent = message;
+                scrollToBottom();
+            }
+            
+            // Save to conversation history
+            conversationState.messages.push({
+                role: 'assistant',
+                content: message
+            });
+        }
+    };
+}
+
 // Add user message to chat
 function addUserMessage(message) {
     const messageElement = document.createElement('div');
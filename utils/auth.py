@@ -0,0 +1,18 @@
+"""
+Token Checks for Beacon
+
+Shared by the admin and profiling endpoints of both Flask apps.
+"""
+
+import hmac
+
+
+def token_matches(supplied, expected):
+    """
+    True when a supplied token equals the configured one, compared in
+    constant time. Always False when no token is configured, so an unset
+    token disables the endpoints it guards.
+    """
+    if not expected or not supplied:
+        return False
+    return hmac.compare_digest(supplied.encode(), expected.encode())
@@ -0,0 +1,263 @@
+"""
+Request and Stage Metrics for Beacon
+
+Latency histograms, counters and gauges kept in process memory and
+exposed in the Prometheus text format, shared by property_api.py and
+scripts/app.py. Recording a sample is a bisect and a few additions under a
+lock, cheap enough to leave on for every request.
+
+Each process keeps its own numbers; under a preforking server every
+worker reports its own, so scrape the workers individually or read the
+metrics as a per-process sample.
+"""
+
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# Upper bounds, in seconds, of the latency histogram buckets
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram per label set"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """Record one sample for the given label values"""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, *labels):
+        """Observe the duration of a with block"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values[:-1]):
+                cumulative += count
+                yield '_bucket', self.labelnames + ('le',), labels + (format_value(bound),), cumulative
+            yield '_sum', self.labelnames, labels, values[-1]
+            yield '_count', self.labelnames, labels, cumulative
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield '', self.labelnames, labels, value
+
+
+class Gauge(Counter):
+    """Value that goes up and down per label set"""
+
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Callback:
+    """Counter or gauge read from a function at scrape time, for numbers kept elsewhere (cache counters)"""
+
+    def __init__(self, name, help_text, labelnames, read, kind='gauge'):
+        self.name = name
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.read = read   # () -> {label values: value}
+
+    def samples(self):
+        try:
+            values = self.read()
+        except Exception as e:
+            print(f"Error reading metric {self.name}: {e}")
+            return
+        for labels, value in sorted(values.items()):
+            yield '', self.labelnames, labels, value
+
+
+class Registry:
+    """The metrics of one process, rendered together for /metrics"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Add a metric, or return the one already registered under its name"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, labelnames, labels, value in metric.samples():
+                lines.append(f"{metric.name}{suffix}{format_labels(labelnames, labels)} {format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_value(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return repr(value)
+    return str(value)
+
+
+# Process-wide registry and the metrics every app shares
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'beacon_http_request_duration_seconds', 'Time to handle an HTTP request',
+    ('app', 'route', 'method', 'status')))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    'beacon_stage_duration_seconds', 'Time spent in one stage of handling a request',
+    ('app', 'stage')))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    'beacon_http_requests_in_flight', 'Requests currently being handled', ('app',)))
+
+# Set by instrument_app(); stage() labels its samples with it
+_app_name = {'name': 'beacon'}
+
+
+@contextmanager
+def stage(name):
+    """Time a with block as one stage of the current request ('filter', 'supabase', 'openai', ...)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, _app_name['name'], name)
+
+
+def observe_stage(name, seconds):
+    """Record a stage duration measured elsewhere"""
+    STAGE_SECONDS.observe(seconds, _app_name['name'], name)
+
+
+def register_cache(name, read):
+    """
+    Export a cache's counters. read() returns (hits, misses); hit, miss
+    and ratio gauges are derived from it at scrape time.
+    """
+    def values(kind):
+        def read_values():
+            hits, misses = read()
+            if kind == 'hits':
+                return {(name,): hits}
+            if kind == 'misses':
+                return {(name,): misses}
+            return {(name,): hits / (hits + misses) if hits + misses else 0.0}
+        return read_values
+
+    for kind, metric_name, metric_kind, help_text in (
+            ('hits', 'beacon_cache_hits_total', 'counter', 'Cache hits'),
+            ('misses', 'beacon_cache_misses_total', 'counter', 'Cache misses'),
+            ('hit_ratio', 'beacon_cache_hit_ratio', 'gauge', 'Cache hits as a fraction of lookups')):
+        read_values = values(kind)
+        metric = REGISTRY.register(Callback(metric_name, help_text, ('cache',), read_values, metric_kind))
+        if metric.read is not read_values:
+            # Several caches share one gauge; chain the readers
+            metric.read = merge_readers(metric.read, read_values)
+
+
+def merge_readers(first, second):
+    def read():
+        values = first()
+        values.update(second())
+        return values
+    return read
+
+
+def instrument_app(app, name):
+    """
+    Time every request of a Flask app by route, count requests in flight,
+    and serve the registry at /metrics.
+    """
+    from flask import request, g, Response
+
+    _app_name['name'] = name
+
+    @app.before_request
+    def start_timer():
+        g._metrics_started = time.perf_counter()
+        IN_FLIGHT.inc(name)
+
+    @app.teardown_request
+    def stop_timer(exception=None):
+        started = g.pop('_metrics_started', None)
+        if started is None:
+            return
+        IN_FLIGHT.dec(name)
+        # The route pattern, not the path, so ids don't explode the label set
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        status = getattr(g, '_metrics_status', 500 if exception else 200)
+        REQUEST_SECONDS.observe(time.perf_counter() - started, name, route, request.method, str(status))
+
+    @app.after_request
+    def record_status(response):
+        g._metrics_status = response.status_code
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus metrics for this process"""
+        return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+    return app
@@ -0,0 +1,265 @@
+"""
+Sampling Profiler for Beacon
+
+Finds where a slow request spends its time without restarting or
+redeploying anything. A request sent with an X-Profile header carrying
+PROFILE_TOKEN gets a sampler thread that records the handling thread's
+Python stack every PROFILE_INTERVAL seconds until the response is done.
+The samples are saved under PROFILE_DIR in collapsed-stack ("folded")
+form, which flamegraph.pl and speedscope read directly, and listed at
+/api/admin/profiles.
+
+With PROFILE_SAMPLE_HZ set, a background sampler also samples every
+thread that is handling a request, at that rate, for the life of the
+process. The counts accumulate in PROFILE_DIR/continuous-<pid>.folded,
+which is rewritten every PROFILE_FLUSH_SECONDS. Threads waiting between
+requests are not sampled, so the flame graph only shows request work.
+
+Sampling reads sys._current_frames() from another thread, so the code
+being profiled is not instrumented and runs at full speed. The sampler
+only runs when it holds the GIL, so CPU-bound code gets sampled less
+evenly than code that waits on I/O.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import threading
+from collections import Counter
+from utils.auth import token_matches
+
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN')
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', '0.002'))
+# Saved per-request profiles kept on disk, oldest removed first
+MAX_STORED_PROFILES = int(os.getenv('MAX_STORED_PROFILES', '200'))
+
+# Continuous sampling rate (0 disables it) and how often its totals are written
+PROFILE_SAMPLE_HZ = float(os.getenv('PROFILE_SAMPLE_HZ', '0'))
+PROFILE_FLUSH_SECONDS = float(os.getenv('PROFILE_FLUSH_SECONDS', '60'))
+
+# Idents of the threads currently handling a request
+active_threads = set()
+
+continuous_sampler = None
+
+
+def collapse(frame):
+    """A stack as one folded line: root first, frames joined by ';'"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def folded(stacks):
+    """Collapsed-stack text from {stack: count}, heaviest first"""
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def write_atomic(path, text):
+    """Write a file under a temporary name, then rename it into place"""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'w') as f:
+        f.write(text)
+    os.replace(temporary, path)
+
+
+class RequestProfile(threading.Thread):
+    """Samples one thread's stack until stopped"""
+
+    def __init__(self, thread_id, interval=PROFILE_INTERVAL):
+        super().__init__(name='request-profiler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.seconds = None
+        self.finished = threading.Event()
+
+    def run(self):
+        while not self.finished.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self.stacks[collapse(frame)] += 1
+                self.samples += 1
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.started
+        self.finished.set()
+        self.join()
+
+
+def new_profile_id(profile):
+    """Id that sorts by start time and is unique across worker processes"""
+    return f"{int(profile.started_at * 1000)}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def save_profile(profile, details, profile_id=None):
+    """Store a finished profile next to its metadata; returns the profile id"""
+    profile_id = profile_id or new_profile_id(profile)
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        write_atomic(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), folded(profile.stacks))
+        write_atomic(os.path.join(PROFILE_DIR, f"{profile_id}.json"), json.dumps(dict(
+            details,
+            id=profile_id,
+            started_at=profile.started_at,
+            duration_ms=round(profile.seconds * 1000, 3),
+            samples=profile.samples,
+            interval_ms=profile.interval * 1000
+        )))
+        prune_profiles()
+    except OSError as e:
+        print(f"Error saving profile: {e}")
+    return profile_id
+
+
+def prune_profiles():
+    """Remove the oldest saved profiles beyond MAX_STORED_PROFILES"""
+    ids = sorted(name[:-5] for name in os.listdir(PROFILE_DIR) if name.endswith('.json'))
+    for profile_id in ids[:max(0, len(ids) - MAX_STORED_PROFILES)]:
+        for extension in ('.json', '.folded'):
+            try:
+                os.remove(os.path.join(PROFILE_DIR, profile_id + extension))
+            except OSError:
+                pass
+
+
+def list_profiles():
+    """Metadata of the saved profiles, newest first"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    profiles = []
+    for name in sorted(os.listdir(PROFILE_DIR), reverse=True):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), 'r') as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def list_continuous():
+    """Names of the continuous sampling files, one per process that wrote one"""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    return sorted(name[:-len('.folded')] for name in os.listdir(PROFILE_DIR)
+                  if name.startswith('continuous-') and name.endswith('.folded'))
+
+
+def read_folded(name):
+    """Contents of a saved .folded file, or None; name is a profile id or continuous-<pid>"""
+    if os.path.basename(name) != name or name.startswith('.'):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{name}.folded"), 'r') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+class ContinuousSampler(threading.Thread):
+    """Samples every thread that is handling a request, aggregating stacks for the process's lifetime"""
+
+    def __init__(self, hz=PROFILE_SAMPLE_HZ, flush_seconds=PROFILE_FLUSH_SECONDS):
+        super().__init__(name='continuous-profiler', daemon=True)
+        self.interval = 1.0 / hz
+        self.flush_seconds = flush_seconds
+        self.stacks = Counter()
+        self.path = os.path.join(PROFILE_DIR, f"continuous-{os.getpid()}.folded")
+
+    def run(self):
+        next_flush = time.monotonic() + self.flush_seconds
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            for thread_id in list(active_threads):
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self.stacks[collapse(frame)] += 1
+            if time.monotonic() >= next_flush:
+                next_flush = time.monotonic() + self.flush_seconds
+                self.flush()
+
+    def flush(self):
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            write_atomic(self.path, folded(self.stacks))
+        except OSError as e:
+            print(f"Error writing continuous profile: {e}")
+
+
+def start_continuous_profiler():
+    """Start the continuous sampler when PROFILE_SAMPLE_HZ is set, once per process"""
+    global continuous_sampler
+    if PROFILE_SAMPLE_HZ <= 0 or continuous_sampler is not None:
+        return
+    continuous_sampler = ContinuousSampler()
+    continuous_sampler.start()
+
+
+def profile_authorized(token):
+    return token_matches(token, PROFILE_TOKEN)
+
+
+def instrument_profiling(app):
+    """
+    Profile Flask requests sent with X-Profile: <PROFILE_TOKEN>, and add
+    the /api/admin/profiles endpoints, which take the token the same way.
+    Without PROFILE_TOKEN, per-request profiling and the endpoints are off.
+    """
+    from flask import request, g, jsonify, Response
+
+    @app.before_request
+    def start_profile():
+        active_threads.add(threading.get_ident())
+        if profile_authorized(request.headers.get('X-Profile')):
+            g._profile = RequestProfile(threading.get_ident())
+            g._profile.start()
+
+    @app.after_request
+    def add_profile_header(response):
+        # The id is chosen now so the caller can find the profile once the request finishes
+        if getattr(g, '_profile', None) is not None:
+            g._profile_id = response.headers['X-Profile-Id'] = new_profile_id(g._profile)
+        return response
+
+    @app.teardown_request
+    def finish_profile(exception=None):
+        active_threads.discard(threading.get_ident())
+        profile = g.pop('_profile', None)
+        if profile is None:
+            return
+        profile.stop()
+        route = request.url_rule.rule if request.url_rule else None
+        save_profile(profile, {"method": request.method, "path": request.full_path.rstrip('?'),
+                               "route": route, "error": str(exception) if exception else None},
+                     g.pop('_profile_id', None))
+
+    @app.route('/api/admin/profiles', methods=['GET'])
+    def get_profiles():
+        """List saved request profiles and continuous sampling files"""
+        if not profile_authorized(request.headers.get('X-Profile')):
+            return jsonify({"error": "Profiling is not enabled"}), 404
+        return jsonify({"profiles": list_profiles(), "continuous": list_continuous()})
+
+    @app.route('/api/admin/profiles/<name>', methods=['GET'])
+    def get_profile(name):
+        """Collapsed stacks of one saved profile, for flamegraph.pl or speedscope"""
+        if not profile_authorized(request.headers.get('X-Profile')):
+            return jsonify({"error": "Profiling is not enabled"}), 404
+        stacks = read_folded(name)
+        if stacks is None:
+            return jsonify({"error": "Profile not found"}), 404
+        return Response(stacks, mimetype='text/plain')
+
+    return app